@@ -180,6 +180,38 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# PDF delivery (download/preview): "django" streams in blocks, "nginx" offloads with
+# X-Accel-Redirect to FILE_DELIVERY_ACCEL_PREFIX (an `internal` location), "sendfile" uses X-Sendfile.
+FILE_DELIVERY_BACKEND = os.environ.get('FILE_DELIVERY_BACKEND', 'django')
+FILE_DELIVERY_ACCEL_PREFIX = os.environ.get('FILE_DELIVERY_ACCEL_PREFIX', '/protected-media/')
+FILE_DELIVERY_BLOCK_SIZE = int(os.environ.get('FILE_DELIVERY_BLOCK_SIZE', str(64 * 1024)))
+# FILE_DELIVERY_BACKEND=signed: 302 to /secure-media/… links valid SIGNED_MEDIA_TTL seconds, checked by
+# nginx secure_link with the same secret (frontend/nginx.conf) and counted by `manage.py ingest_media_log`.
+SIGNED_MEDIA_SECRET = os.environ.get('SIGNED_MEDIA_SECRET', '')
+SIGNED_MEDIA_TTL = int(os.environ.get('SIGNED_MEDIA_TTL', '300'))
+# Page images (WebP, pdftoppm + Pillow): first-page thumbnail widths rendered after upload,
+# and the default width of on-demand page previews (/documents/<id>/pages/<n>.webp).
+THUMBNAIL_WIDTHS = tuple(int(w) for w in os.environ.get('THUMBNAIL_WIDTHS', '160,320,640').split(','))
+PAGE_IMAGE_WIDTH = int(os.environ.get('PAGE_IMAGE_WIDTH', '1024'))
+THUMBNAILS_ASYNC = os.environ.get('THUMBNAILS_ASYNC', 'True') == 'True'
+# User activity (IP, device, geolocation) is queued and recorded by a background thread;
+# False records it inline. Entries beyond USER_ACTIVITY_QUEUE_SIZE are dropped.
+USER_ACTIVITY_ASYNC = os.environ.get('USER_ACTIVITY_ASYNC', 'True') == 'True'
+USER_ACTIVITY_QUEUE_SIZE = int(os.environ.get('USER_ACTIVITY_QUEUE_SIZE', '1000'))
+# Geolocation: local MaxMind City database (.mmdb, needs `maxminddb`), memory-mapped; the online
+# geocoder is only used for IPs it does not know (or without database) when GEOIP_NETWORK_FALLBACK.
+GEOIP_DATABASE = os.environ.get('GEOIP_DATABASE', os.path.join(BASE_DIR, 'geoip', 'GeoLite2-City.mmdb'))
+GEOIP_NETWORK_FALLBACK = os.environ.get('GEOIP_NETWORK_FALLBACK', 'True') == 'True'
+GEOIP_CACHE_SIZE = int(os.environ.get('GEOIP_CACHE_SIZE', '4096'))
+# Download counters are buffered per worker and written every N seconds (0 = write each download).
+DOWNLOAD_COUNTER_FLUSH_SECONDS = float(os.environ.get('DOWNLOAD_COUNTER_FLUSH_SECONDS', '5'))
+# Download/preview event log (batched inserts) and trending scores (rollup_document_events).
+DOCUMENT_EVENTS_FLUSH_SECONDS = float(os.environ.get('DOCUMENT_EVENTS_FLUSH_SECONDS', '5'))
+DOCUMENT_EVENTS_RETENTION_DAYS = int(os.environ.get('DOCUMENT_EVENTS_RETENTION_DAYS', '90'))
+TRENDING_WINDOW_DAYS = int(os.environ.get('TRENDING_WINDOW_DAYS', '30'))
+TRENDING_HALF_LIFE_DAYS = float(os.environ.get('TRENDING_HALF_LIFE_DAYS', '7'))
+TRENDING_PREVIEW_WEIGHT = float(os.environ.get('TRENDING_PREVIEW_WEIGHT', '0.2'))
+
 # CORS settings
 #CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOW_CREDENTIALS = True
@@ -194,6 +226,29 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Cache (facet counts, Data API counts). Defaults to per-process memory;
+# set DJANGO_CACHE_BACKEND/DJANGO_CACHE_LOCATION (e.g. Redis) to share it across workers.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('DJANGO_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('DJANGO_CACHE_LOCATION', 'edushare'),
+    }
+}
+# Versioned response cache of the public read endpoints (courses, study levels,
+# stats, anonymous document listings). RESPONSE_CACHE_ALIAS picks the CACHES entry.
+RESPONSE_CACHE_ENABLED = os.environ.get('RESPONSE_CACHE_ENABLED', 'True') == 'True'
+RESPONSE_CACHE_ALIAS = os.environ.get('RESPONSE_CACHE_ALIAS', 'default')
+RESPONSE_CACHE_TIMEOUT = int(os.environ.get('RESPONSE_CACHE_TIMEOUT', '300'))
+RESPONSE_CACHE_MAX_AGE = int(os.environ.get('RESPONSE_CACHE_MAX_AGE', '60'))
+# Data API: TTL of the cached exact COUNT(*) per filter set (?count=exact).
+DATA_COUNT_CACHE_SECONDS = int(os.environ.get('DATA_COUNT_CACHE_SECONDS', '60'))
+# Data API: maximum number of PDFs in one ZIP bundle (/api/data/documents/bundle/).
+DATA_BUNDLE_MAX_DOCUMENTS = int(os.environ.get('DATA_BUNDLE_MAX_DOCUMENTS', '100'))
+# Data API: maximum number of documents in one NDJSON text export (/api/data/documents/text/).
+DATA_TEXT_MAX_DOCUMENTS = int(os.environ.get('DATA_TEXT_MAX_DOCUMENTS', '500'))
+# /api/stats/: counters are recomputed from the real tables when older than this.
+STATS_RECONCILE_SECONDS = int(os.environ.get('STATS_RECONCILE_SECONDS', str(6 * 3600)))
+
 # JWT settings
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
@@ -204,14 +259,52 @@ SIMPLE_JWT = {
 # File upload settings
 FILE_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
+# Same as Django's defaults, plus a SHA-256 computed while the upload streams in
+# (content-addressed PDF storage, see courses/storage.py).
+FILE_UPLOAD_HANDLERS = [
+    'courses.upload_handlers.HashingMemoryFileUploadHandler',
+    'courses.upload_handlers.HashingTemporaryFileUploadHandler',
+]
 
 # Groq (LLM)
 GROQ_API_KEY = os.environ.get("GROQ_API_KEY", "")
+# OpenAI-compatible base URL. Point it at `manage.py groq_standin` for offline load tests.
+GROQ_BASE_URL = os.environ.get("GROQ_BASE_URL", "https://api.groq.com/openai/v1")
 GROQ_MODELS = [
     "openai/gpt-oss-120b",
     "openai/gpt-oss-20b",
     "llama-3.3-70b-versatile",
 ]
+# Prompt token budget (system + history + context + question). The models above
+# all have a 128k context: the budget caps cost and latency, so one value fits
+# them all. A model with a smaller window can be capped on its own with
+# GROQ_PROMPT_TOKEN_BUDGETS = {"model": tokens}.
+GROQ_PROMPT_TOKEN_BUDGET = int(os.environ.get("GROQ_PROMPT_TOKEN_BUDGET", "6000"))
+# Keep only the best sentences (+ neighbours) of each retrieved chunk in the prompt.
+CHAT_CONTEXT_COMPRESSION = os.environ.get("CHAT_CONTEXT_COMPRESSION", "False") == "True"
+# Hedged requests: when the current model is slower than its recent latency
+# percentile, race the next model and keep the first answer.
+GROQ_HEDGE_ENABLED = os.environ.get("GROQ_HEDGE_ENABLED", "False") == "True"
+GROQ_HEDGE_PERCENTILE = float(os.environ.get("GROQ_HEDGE_PERCENTILE", "95"))
+GROQ_HEDGE_DEFAULT_DELAY = float(os.environ.get("GROQ_HEDGE_DEFAULT_DELAY", "8"))  # seconds, until enough samples
+GROQ_HEDGE_MIN_DELAY = float(os.environ.get("GROQ_HEDGE_MIN_DELAY", "1"))  # seconds
+GROQ_HEDGE_MIN_SAMPLES = 20
+GROQ_HEDGE_MAX_RATE = float(os.environ.get("GROQ_HEDGE_MAX_RATE", "0.1"))  # max share of calls hedged
+# Circuit breaker: after N consecutive failed completions, skip Groq for COOLDOWN seconds.
+GROQ_CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get("GROQ_CIRCUIT_FAILURE_THRESHOLD", "5"))
+GROQ_CIRCUIT_COOLDOWN = float(os.environ.get("GROQ_CIRCUIT_COOLDOWN", "30"))
+# Per-process cap on concurrent outbound Groq calls.
+GROQ_MAX_CONCURRENCY = int(os.environ.get("GROQ_MAX_CONCURRENCY", "8"))
+
+# Chat: time budget for the LLM, then extractive fallback (best passages, no LLM).
+CHAT_DEADLINE_SECONDS = float(os.environ.get("CHAT_DEADLINE_SECONDS", "25"))
+CHAT_EXTRACTIVE_FALLBACK = os.environ.get("CHAT_EXTRACTIVE_FALLBACK", "True") == "True"
+
+# Batch chat endpoint (/documents/<id>/chat/batch/)
+CHAT_BATCH_MAX_QUESTIONS = int(os.environ.get("CHAT_BATCH_MAX_QUESTIONS", "20"))
+CHAT_BATCH_CONCURRENCY = int(os.environ.get("CHAT_BATCH_CONCURRENCY", "4"))
+# Overall cap for a batch (each question also has CHAT_DEADLINE_SECONDS from when it starts)
+CHAT_BATCH_DEADLINE_SECONDS = float(os.environ.get("CHAT_BATCH_DEADLINE_SECONDS", "120"))
 
 
 # =========================
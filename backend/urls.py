@@ -20,13 +20,15 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from courses import views as course_views
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('courses.urls')),
+    # Expiring PDF links (FILE_DELIVERY_BACKEND=signed); nginx answers them itself in production
+    path('secure-media/<str:mode>/<str:document_id>/<path:name>', course_views.signed_media, name='signed_media'),
 ]
 
-urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
-
-# Serve media files during development
+# Serve media files during development (nginx serves them in production)
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -107,7 +107,7 @@ class TagAdmin(admin.ModelAdmin):
 
 @admin.register(APIPlan)
 class APIPlanAdmin(admin.ModelAdmin):
-    list_display = ["name", "code", "billing_period", "price_cents", "daily_requests_limit", "daily_download_limit", "max_page_size", "is_active"]
+    list_display = ["name", "code", "billing_period", "price_cents", "daily_requests_limit", "daily_download_limit", "daily_text_limit", "max_page_size", "is_active"]
     list_filter = ["billing_period", "is_active"]
     search_fields = ["name", "code", "description"]
     list_editable = ["is_active"]
@@ -132,10 +132,10 @@ class APIKeyAdmin(admin.ModelAdmin):
 
 @admin.register(APIUsageDaily)
 class APIUsageDailyAdmin(admin.ModelAdmin):
-    list_display = ["api_key", "date", "requests_count", "downloads_count", "updated_at"]
+    list_display = ["api_key", "date", "requests_count", "downloads_count", "texts_count", "updated_at"]
     list_filter = ["date"]
     search_fields = ["api_key__prefix", "api_key__user__username"]
-    readonly_fields = ["api_key", "date", "requests_count", "downloads_count", "updated_at"]
+    readonly_fields = ["api_key", "date", "requests_count", "downloads_count", "texts_count", "updated_at"]
 
 
 @admin.register(Advertisement)
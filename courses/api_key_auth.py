@@ -2,6 +2,8 @@ import logging
 from dataclasses import dataclass
 
 from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
 from django.utils import timezone
 from rest_framework.authentication import BaseAuthentication
 from rest_framework.exceptions import AuthenticationFailed, Throttled
@@ -114,3 +116,50 @@ class APIKeyAuthentication(BaseAuthentication):
         if is_download:
             usage.downloads_count += 1
         usage.save(update_fields=["requests_count", "downloads_count", "updated_at"])
+
+
+def _check(used: int, limit: int, count: int, label: str) -> None:
+    if used + count > limit:
+        remaining = max(limit - used, 0)
+        raise Throttled(
+            detail=f"Quota de {label} API dépassé ({remaining} restant(s) aujourd'hui).",
+            wait=None,
+        )
+
+
+@transaction.atomic
+def _consume(context: APIKeyContext, field: str, limit: int, count: int, label: str) -> None:
+    usage, _ = APIUsageDaily.objects.select_for_update().get_or_create(
+        api_key=context.api_key, date=timezone.localdate()
+    )
+    used = getattr(usage, field)
+    _check(used, limit, count, label)
+    setattr(usage, field, used + count)
+    usage.save(update_fields=[field, "updated_at"])
+
+
+def consume_downloads(context: APIKeyContext, count: int) -> None:
+    """
+    Count *count* downloads against the plan's daily_download_limit in one
+    transaction (bulk endpoints); all or nothing.
+    """
+    _consume(context, "downloads_count", context.plan.daily_download_limit, count, "téléchargements")
+
+
+def consume_texts(context: APIKeyContext, count: int) -> None:
+    """Same as consume_downloads for extracted texts (daily_text_limit, a separate quota)."""
+    _consume(context, "texts_count", context.plan.daily_text_limit, count, "textes extraits")
+
+
+def check_texts(context: APIKeyContext, count: int) -> None:
+    """Raise Throttled when *count* more texts do not fit in today's quota (nothing counted)."""
+    usage = APIUsageDaily.objects.filter(api_key=context.api_key, date=timezone.localdate()).first()
+    _check(usage.texts_count if usage else 0, context.plan.daily_text_limit, count, "textes extraits")
+
+
+def refund_texts(context: APIKeyContext, count: int) -> None:
+    """Give back *count* texts counted by consume_texts but not delivered."""
+    if count > 0:
+        APIUsageDaily.objects.filter(api_key=context.api_key, date=timezone.localdate()).update(
+            texts_count=Greatest(F("texts_count") - count, 0), updated_at=timezone.now()
+        )
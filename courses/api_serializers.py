@@ -16,6 +16,7 @@ class APIPlanPublicSerializer(serializers.ModelSerializer):
             "price_cents",
             "daily_requests_limit",
             "daily_download_limit",
+            "daily_text_limit",
             "max_page_size",
         ]
 
@@ -1,13 +1,22 @@
+from abc import ABC, abstractmethod
+
+from django.conf import settings
 from django.db.models import Q
-from django.http import FileResponse, Http404
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.views.decorators.gzip import gzip_page
 from rest_framework import generics, permissions, status
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 from rest_framework.views import APIView
 
-from courses.api_key_auth import APIKeyAuthentication
+from courses import document_events
+from courses.api_key_auth import APIKeyAuthentication, check_texts, consume_downloads, consume_texts, refund_texts
 from courses.api_serializers import (
     APIKeyCreateResponseSerializer,
     APIKeyCreateSerializer,
@@ -16,8 +25,15 @@ from courses.api_serializers import (
     DataPDFDocumentSerializer,
     UserSubscriptionSerializer,
 )
-from courses.models import APIKey, APIPlan, APIUsageDaily, PDFDocument, UserSubscription
+from courses.facets import cached_count, estimate_count
+from courses.file_delivery import counts_as_download, serve_pdf
+from courses.models import APIKey, APIPlan, APIUsageDaily, DocumentEvent, PDFDocument, UserSubscription
+from courses.pagination import KeysetPagination
+from courses.pdf_text import PDFTextExtractionError
+from courses.search_index import ordering, search_documents
+from courses.text_export import NDJSONRenderer, PlainTextRenderer, document_pages, ndjson_response, plain_text, text_payload
 from courses.utils import decrypt_id
+from courses.zip_bundle import bundle_response
 
 
 class PlanPagination(PageNumberPagination):
@@ -26,17 +42,114 @@ class PlanPagination(PageNumberPagination):
     max_page_size = 50
 
 
-class DataPagination(PageNumberPagination):
+COUNT_EXACT = "exact"
+COUNT_ESTIMATED = "estimated"
+COUNT_NONE = "none"
+COUNT_MODES = (COUNT_EXACT, COUNT_ESTIMATED, COUNT_NONE)
+
+
+def _plan_max_page_size(request) -> int:
+    try:
+        return request.api_context.plan.max_page_size
+    except Exception:
+        return 100
+
+
+class DataPageNumberPagination(PageNumberPagination):
+    """
+    Legacy ?page=N mode. Pages are sliced directly (size + 1 rows, no
+    Paginator), so the count is only computed when the client asks for it.
+    """
+
     page_size = 50
     page_size_query_param = "page_size"
 
     def get_page_size(self, request):
         size = super().get_page_size(request) or self.page_size
+        return min(size, _plan_max_page_size(request))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
         try:
-            max_size = request.api_context.plan.max_page_size
-        except Exception:
-            max_size = 100
-        return min(size, max_size)
+            self.page_number = int(request.query_params.get(self.page_query_param) or 1)
+        except (TypeError, ValueError):
+            self.page_number = 0
+        if self.page_number < 1:
+            raise NotFound("Page invalide.")
+
+        size = self.get_page_size(request)
+        offset = (self.page_number - 1) * size
+        rows = list(queryset[offset:offset + size + 1])
+        self.has_next = len(rows) > size
+        return rows[:size]
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.page_query_param, self.page_number + 1)
+
+    def get_previous_link(self):
+        if self.page_number <= 1:
+            return None
+        url = self.request.build_absolute_uri()
+        if self.page_number == 2:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.page_query_param, self.page_number - 1)
+
+
+class DataPagination(KeysetPagination):
+    """
+    Page-number pagination (?page=N, with count and previous) by default, as
+    existing clients expect; keyset pagination when asked for: ?cursor=
+    (empty for the first page) or ?count=… without ?page.
+
+    ?count=exact|estimated|none chooses how the total is reported:
+      - exact     : COUNT(*), cached per filter set (default in page mode)
+      - estimated : derived from the cached facet counts (no COUNT)
+      - none      : no total, `has_next` only (default in cursor mode)
+    """
+
+    def get_page_size(self, request):
+        self.max_page_size = _plan_max_page_size(request)
+        return super().get_page_size(request)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.legacy = None
+        params = request.query_params
+        mode = params.get("count")
+        keyset = "cursor" in params or (mode is not None and "page" not in params)
+        if not keyset:
+            self.legacy = DataPageNumberPagination()
+            rows = self.legacy.paginate_queryset(queryset, request, view)
+            mode = mode or COUNT_EXACT
+        else:
+            rows = super().paginate_queryset(queryset, request, view)
+            mode = mode or COUNT_NONE
+        if mode not in COUNT_MODES:
+            raise ValidationError({"count": f"Valeurs possibles : {', '.join(COUNT_MODES)}."})
+
+        self.count, self.count_estimated = None, False
+        if mode == COUNT_ESTIMATED:
+            self.count = estimate_count(request.query_params)
+            self.count_estimated = self.count is not None
+        if mode == COUNT_EXACT or (mode == COUNT_ESTIMATED and self.count is None):
+            self.count = cached_count(queryset, request.query_params)
+        return rows
+
+    def get_paginated_response(self, data):
+        pager = self.legacy or self
+        body = {}
+        if self.count is not None:
+            body["count"] = self.count
+            if self.count_estimated:
+                body["count_estimated"] = True
+        body["has_next"] = pager.has_next
+        body["next"] = pager.get_next_link()
+        if self.legacy is not None:
+            body["previous"] = self.legacy.get_previous_link()
+        body["results"] = data
+        return Response(body)
 
 
 class APIPlanListView(generics.ListAPIView):
@@ -114,6 +227,48 @@ class APIKeyRevokeView(APIView):
         return Response({"status": "revoked"})
 
 
+def data_documents(params):
+    """Active documents matching the Data API filters in *params* (domain, levels, tag, search)."""
+    qs = (
+        PDFDocument.objects.filter(is_active=True)
+        .select_related("course", "uploaded_by", "study_sublevel", "study_sublevel__level")
+        .prefetch_related("tags")
+    )
+
+    # Filters
+    course_domain = params.get("domain")
+    if course_domain:
+        qs = qs.filter(course__domain__icontains=course_domain)
+
+    study_level = params.get("study_level")
+    if study_level:
+        if str(study_level).isdigit():
+            qs = qs.filter(study_sublevel__level_id=int(study_level))
+        else:
+            qs = qs.filter(Q(study_sublevel__level__key=study_level) | Q(study_sublevel__level__name=study_level))
+
+    study_sublevel = params.get("study_sublevel")
+    if study_sublevel:
+        if str(study_sublevel).isdigit():
+            qs = qs.filter(study_sublevel_id=int(study_sublevel))
+        else:
+            qs = qs.filter(Q(study_sublevel__key=study_sublevel) | Q(study_sublevel__name=study_sublevel))
+
+    tag = params.get("tag")
+    if tag:
+        qs = qs.filter(
+            id__in=PDFDocument.tags.through.objects.filter(
+                Q(tag__key=tag) | Q(tag__name__iexact=tag)
+            ).values("pdfdocument_id")
+        )
+
+    search = params.get("search")
+    if search:
+        qs = search_documents(qs, search, ["title", "description", "tags__name", "course__name"])
+
+    return qs.order_by(*ordering(qs))
+
+
 class DataDocumentListView(generics.ListAPIView):
     """
     Data API: list documents metadata for bulk download workflows.
@@ -126,57 +281,128 @@ class DataDocumentListView(generics.ListAPIView):
     pagination_class = DataPagination
 
     def get_queryset(self):
-        qs = (
-            PDFDocument.objects.filter(is_active=True)
-            .select_related("course", "uploaded_by", "study_sublevel", "study_sublevel__level")
-            .prefetch_related("tags")
-        )
+        return data_documents(self.request.query_params)
 
-        # Filters
-        course_domain = self.request.query_params.get("domain")
-        if course_domain:
-            qs = qs.filter(course__domain__icontains=course_domain)
 
-        study_level = self.request.query_params.get("study_level")
-        if study_level:
-            if str(study_level).isdigit():
-                qs = qs.filter(study_sublevel__level_id=int(study_level))
-            else:
-                qs = qs.filter(Q(study_sublevel__level__key=study_level) | Q(study_sublevel__level__name=study_level))
+class DataDocumentDownloadView(APIView):
+    """
+    Data API: download the PDF file via API key.
+    """
+
+    authentication_classes = [APIKeyAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
 
-        study_sublevel = self.request.query_params.get("study_sublevel")
-        if study_sublevel:
-            if str(study_sublevel).isdigit():
-                qs = qs.filter(study_sublevel_id=int(study_sublevel))
+    def get(self, request, document_id: str):
+        # Decrypt ID if needed
+        resolved = document_id
+        if not str(resolved).isdigit():
+            decoded = decrypt_id(resolved)
+            if decoded:
+                resolved = decoded
             else:
-                qs = qs.filter(Q(study_sublevel__key=study_sublevel) | Q(study_sublevel__name=study_sublevel))
+                return Response({"detail": "document_id invalide."}, status=status.HTTP_400_BAD_REQUEST)
 
-        tag = self.request.query_params.get("tag")
-        if tag:
-            qs = qs.filter(Q(tags__key=tag) | Q(tags__name__iexact=tag))
+        document = get_object_or_404(PDFDocument, id=resolved, is_active=True)
 
-        search = self.request.query_params.get("search")
-        if search:
-            qs = qs.filter(
-                Q(title__icontains=search)
-                | Q(description__icontains=search)
-                | Q(tags__name__icontains=search)
-                | Q(course__name__icontains=search)
-            )
+        response = serve_pdf(request, document, as_attachment=True)
 
-        return qs.distinct().order_by("-created_at")
+        # Increment platform download count (optional but useful)
+        if counts_as_download(request, response):
+            document.increment_download_count()
+            document_events.record(document.id, DocumentEvent.DOWNLOAD)
 
+        return response
 
-class DataDocumentDownloadView(APIView):
+
+class DataDocumentBatchView(APIView, ABC):
     """
-    Data API: download the PDF file via API key.
+    Base of the Data API endpoints working on several documents at once:
+
+      - POST {"ids": [encrypted_id, …]}      : these documents
+      - GET  ?domain=…&tag=…&limit=N         : documents matching the list filters
+
+    At most `max_documents_setting` documents; subclasses build the response
+    in respond().
+    """
+
+    authentication_classes = [APIKeyAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+    max_documents_setting = ""
+    default_max_documents = 100
+    related: tuple[str, ...] = ("course",)
+
+    def _max_documents(self) -> int:
+        return int(getattr(settings, self.max_documents_setting, self.default_max_documents))
+
+    def get(self, request):
+        try:
+            limit = int(request.query_params.get("limit") or self._max_documents())
+        except ValueError:
+            raise ValidationError({"limit": "Entier attendu."})
+        limit = max(1, min(limit, self._max_documents()))
+        documents = data_documents(request.query_params).select_related(*self.related)
+        return self.respond(request, list(documents[:limit]))
+
+    def post(self, request):
+        ids = request.data.get("ids") if isinstance(request.data, dict) else None
+        if not isinstance(ids, list) or not ids:
+            raise ValidationError({"ids": "Liste d'identifiants (chiffrés) attendue."})
+        if len(ids) > self._max_documents():
+            raise ValidationError({"ids": f"{self._max_documents()} documents au maximum par requête."})
+
+        resolved = []
+        for value in ids:
+            document_id = int(value) if str(value).isdigit() else decrypt_id(str(value))
+            if not document_id:
+                raise ValidationError({"ids": f"document_id invalide : {value}"})
+            resolved.append(document_id)
+
+        found = PDFDocument.objects.filter(is_active=True, id__in=resolved).select_related(*self.related).in_bulk()
+        unknown = [value for value, document_id in zip(ids, resolved) if document_id not in found]
+        if unknown:
+            raise NotFound(f"Documents introuvables : {', '.join(map(str, unknown))}")
+        # Request order, duplicates dropped
+        return self.respond(request, [found[i] for i in dict.fromkeys(resolved)])
+
+    @abstractmethod
+    def respond(self, request, documents):
+        """Response for *documents* (active, with their `related` objects)."""
+
+
+class DataDocumentBundleView(DataDocumentBatchView):
+    """
+    Data API: several PDFs in one streamed ZIP (with a manifest.json).
+
+    At most DATA_BUNDLE_MAX_DOCUMENTS files; the whole bundle is counted
+    against the daily download quota at once (refused if it does not fit).
+    """
+
+    max_documents_setting = "DATA_BUNDLE_MAX_DOCUMENTS"
+
+    def respond(self, request, documents):
+        available = [d for d in documents if d.pdf_file and d.pdf_file.storage.exists(d.pdf_file.name)]
+        missing = [d for d in documents if d not in available]
+        consume_downloads(request.api_context, len(available))
+
+        for document in available:
+            document.increment_download_count()
+            document_events.record(document.id, DocumentEvent.DOWNLOAD)
+        return bundle_response(available, missing)
+
+
+@method_decorator(gzip_page, name="dispatch")
+class DataDocumentTextView(APIView):
+    """
+    Data API: extracted text of a PDF — per-page JSON, or plain text with
+    Accept: text/plain / ?format=txt (gzip with Accept-Encoding: gzip).
+    Counted against the daily text quota, not the download one.
     """
 
     authentication_classes = [APIKeyAuthentication]
     permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = [JSONRenderer, PlainTextRenderer]
 
     def get(self, request, document_id: str):
-        # Decrypt ID if needed
         resolved = document_id
         if not str(resolved).isdigit():
             decoded = decrypt_id(resolved)
@@ -185,18 +411,38 @@ class DataDocumentDownloadView(APIView):
             else:
                 return Response({"detail": "document_id invalide."}, status=status.HTTP_400_BAD_REQUEST)
 
-        document = get_object_or_404(PDFDocument, id=resolved, is_active=True)
+        document = get_object_or_404(PDFDocument.objects.select_related("course"), id=resolved, is_active=True)
+        # Over quota: refused before paying for the extraction
+        check_texts(request.api_context, 1)
+        try:
+            pages = document_pages(document)
+        except PDFTextExtractionError:
+            return Response({"detail": "Texte indisponible."}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        consume_texts(request.api_context, 1)
 
-        # Increment platform download count (optional but useful)
-        document.increment_download_count()
+        if request.accepted_renderer.format == PlainTextRenderer.format:
+            return Response(plain_text(pages))
+        return Response(text_payload(document, pages))
 
-        try:
-            response = FileResponse(open(document.pdf_file.path, "rb"), content_type="application/pdf")
-            safe_title = (document.title or "document").replace('"', "'")
-            response["Content-Disposition"] = f'attachment; filename="{safe_title}.pdf"'
-            return response
-        except FileNotFoundError:
-            raise Http404("Fichier non trouvé")
+
+@method_decorator(gzip_page, name="dispatch")
+class DataDocumentTextBulkView(DataDocumentBatchView):
+    """
+    Data API: extracted text of several documents as an NDJSON stream (one
+    line per document). At most DATA_TEXT_MAX_DOCUMENTS; all of them must
+    fit in the daily text quota, but only the texts actually sent are counted.
+    """
+
+    renderer_classes = [NDJSONRenderer, JSONRenderer]
+    max_documents_setting = "DATA_TEXT_MAX_DOCUMENTS"
+    default_max_documents = 500
+    related = ("course", "text_cache")
+
+    def respond(self, request, documents):
+        context = request.api_context
+        # Reserved up front (all or nothing), error lines given back at the end of the stream
+        consume_texts(context, len(documents))
+        return ndjson_response(documents, undelivered=lambda count: refund_texts(context, count))
 
 
 class DataWhoAmIView(APIView):
@@ -213,6 +459,7 @@ class DataWhoAmIView(APIView):
         usage = APIUsageDaily.objects.filter(api_key=ctx.api_key, date=today).first()
         requests_count = usage.requests_count if usage else 0
         downloads_count = usage.downloads_count if usage else 0
+        texts_count = usage.texts_count if usage else 0
 
         return Response(
             {
@@ -223,6 +470,7 @@ class DataWhoAmIView(APIView):
                     "billing_period": ctx.plan.billing_period,
                     "daily_requests_limit": ctx.plan.daily_requests_limit,
                     "daily_download_limit": ctx.plan.daily_download_limit,
+                    "daily_text_limit": ctx.plan.daily_text_limit,
                     "max_page_size": ctx.plan.max_page_size,
                 },
                 "today": {
@@ -231,6 +479,8 @@ class DataWhoAmIView(APIView):
                     "downloads_count": downloads_count,
                     "requests_remaining": max(ctx.plan.daily_requests_limit - requests_count, 0),
                     "downloads_remaining": max(ctx.plan.daily_download_limit - downloads_count, 0),
+                    "texts_count": texts_count,
+                    "texts_remaining": max(ctx.plan.daily_text_limit - texts_count, 0),
                 },
                 "api_key": {"prefix": ctx.api_key.prefix, "is_active": ctx.api_key.is_active},
             }
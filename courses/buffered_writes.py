@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+Buffered writes — in-process write coalescing shared by the hot-path counters.
+Developed by Marino ATOHOUN.
+
+A BufferedWriter keeps pending items in memory and writes them in one go:
+every <interval> seconds from a daemon timer started by the first item, on
+demand (flush()) and when the worker exits (atexit — gunicorn and uWSGI run
+it on graceful shutdown). A failed flush puts the items back for the next
+one. An interval <= 0 writes each item immediately.
+
+Subclasses choose the buffer (a Counter of increments, a list of rows, …)
+and how a batch is written. write() drops (and logs) items that can never
+be written, e.g. rows of a deleted document, so one bad item does not keep
+the whole batch failing.
+"""
+
+import atexit
+import logging
+import threading
+from abc import ABC, abstractmethod
+
+from django.conf import settings
+from django.db import connections
+
+
+class BufferedWriter(ABC):
+    interval_setting = ""          # settings name of the flush interval (seconds)
+    default_interval = 5.0
+    label = "items"                # for the logs
+
+    def __init__(self, logger: logging.Logger):
+        self.logger = logger
+        self._lock = threading.Lock()
+        self._pending = self.new_buffer()
+        self._timer: threading.Timer | None = None
+        atexit.register(self._flush_at_exit)
+
+    # ── Buffer (subclasses) ──────────────────────────────────────────────────
+
+    @abstractmethod
+    def new_buffer(self):
+        """An empty buffer."""
+
+    @abstractmethod
+    def add(self, buffer, item) -> None:
+        """Add *item* to *buffer*."""
+
+    @abstractmethod
+    def put_back(self, buffer, batch) -> None:
+        """Return a failed *batch* to *buffer* (ahead of what arrived since)."""
+
+    def size(self, batch) -> int:
+        return len(batch)
+
+    @abstractmethod
+    def write(self, batch) -> int:
+        """Write *batch*; returns the size actually written."""
+
+    # ── Buffering ─────────────────────────────────────────────────────────────
+
+    def interval(self) -> float:
+        return float(getattr(settings, self.interval_setting, self.default_interval))
+
+    def submit(self, item) -> None:
+        """Buffer *item*, or write it now when buffering is disabled."""
+        interval = self.interval()
+        if interval <= 0:
+            batch = self.new_buffer()
+            self.add(batch, item)
+            self.write(batch)
+            return
+        with self._lock:
+            self.add(self._pending, item)
+            if self._timer is None:
+                self._timer = threading.Timer(interval, self._flush_from_timer)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def pending(self):
+        """Copy of the buffered items not yet written."""
+        with self._lock:
+            batch = self.new_buffer()
+            self.put_back(batch, self._pending)
+            return batch
+
+    def flush(self) -> int:
+        """Write the buffered items now; returns the size written."""
+        with self._lock:
+            batch, self._pending = self._pending, self.new_buffer()
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not batch:
+            return 0
+        try:
+            return self.write(batch)
+        except Exception:
+            self.logger.exception("%s flush failed, %d kept for the next one", self.label, self.size(batch))
+            with self._lock:
+                self.put_back(self._pending, batch)
+            raise
+
+    def _flush_from_timer(self) -> None:
+        try:
+            self.flush()
+        except Exception:
+            # Already logged; retry on the next item or at shutdown
+            pass
+        finally:
+            # Timer threads get their own DB connections
+            connections.close_all()
+
+    def _flush_at_exit(self) -> None:
+        if self._pending:
+            self.flush()
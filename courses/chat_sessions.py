@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+Chat sessions — server-side conversation history with a rolling memo.
+Developed by Marino ATOHOUN.
+
+Clients send a conversation_id instead of resending the whole history.
+Only the last few messages are kept verbatim in the prompt; older turns are
+folded (extractively, no extra LLM call) into a compact memo.
+"""
+
+import re
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from courses.models import ChatConversation, ChatMessage, PDFDocument
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Configuration
+# ──────────────────────────────────────────────────────────────────────────────
+
+RECENT_MESSAGES_KEPT = 4        # messages kept verbatim (2 turns)
+SUMMARIZE_THRESHOLD = 8         # fold when more unsummarised messages than this
+MEMO_MAX_CHARS = 1500           # oldest memo lines are dropped beyond this
+QUESTION_MAX_CHARS = 160
+ANSWER_MAX_CHARS = 200
+
+_CITATION_RE = re.compile(r"\(p\.\s*(\d+)\)")
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+_MARKDOWN_RE = re.compile(r"[#*_`>]+")
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Loading
+# ──────────────────────────────────────────────────────────────────────────────
+
+def get_or_create_conversation(user, document: PDFDocument, conversation_id: str | None) -> ChatConversation | None:
+    """
+    Return the user's conversation for *document*, or a new (unsaved) one when
+    no id is given — it is only persisted by record_turn() once answered.
+    Returns None when the id is unknown / belongs to someone else.
+    """
+    if not conversation_id:
+        return ChatConversation(user=user, document=document)
+    try:
+        return ChatConversation.objects.filter(id=conversation_id, user=user, document=document).first()
+    except (ValueError, ValidationError):
+        # Malformed UUID
+        return None
+
+
+def recent_history(conversation: ChatConversation) -> list[dict]:
+    """Messages not yet folded into the memo, as OpenAI-style dicts."""
+    if conversation._state.adding:
+        return []
+    rows = conversation.messages.order_by("created_at", "id")[conversation.summarized_count:]
+    return [{"role": m.role, "content": m.content} for m in rows]
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Rolling memo
+# ──────────────────────────────────────────────────────────────────────────────
+
+def _shorten(text: str, limit: int) -> str:
+    text = " ".join(_MARKDOWN_RE.sub(" ", text or "").split())
+    if len(text) <= limit:
+        return text
+    return text[:limit].rsplit(" ", 1)[0] + "…"
+
+
+def _memo_line(question: str, answer: str) -> str:
+    pages = sorted({int(p) for p in _CITATION_RE.findall(answer or "")})
+    first_sentence = _SENTENCE_END_RE.split(_shorten(answer, 4 * ANSWER_MAX_CHARS), 1)[0]
+    line = f"- Q : {_shorten(question, QUESTION_MAX_CHARS)} → R : {_shorten(first_sentence, ANSWER_MAX_CHARS)}"
+    if pages:
+        line += " (p. " + ", ".join(str(p) for p in pages) + ")"
+    return line
+
+
+def _fold_old_messages(conversation: ChatConversation) -> None:
+    """Fold the oldest unsummarised turns into the memo (keeps the last few verbatim)."""
+    pending = list(conversation.messages.order_by("created_at", "id")[conversation.summarized_count:])
+    if len(pending) <= SUMMARIZE_THRESHOLD:
+        return
+
+    to_fold = pending[: len(pending) - RECENT_MESSAGES_KEPT]
+    lines = [line for line in conversation.summary.splitlines() if line.strip()]
+    question = ""
+    for m in to_fold:
+        if m.role == ChatMessage.ROLE_USER:
+            question = m.content
+        elif m.role == ChatMessage.ROLE_ASSISTANT:
+            lines.append(_memo_line(question, m.content))
+            question = ""
+
+    while lines and len("\n".join(lines)) > MEMO_MAX_CHARS:
+        lines.pop(0)
+
+    conversation.summary = "\n".join(lines)
+    conversation.summarized_count += len(to_fold)
+
+
+@transaction.atomic
+def record_turn(
+    conversation: ChatConversation,
+    question: str,
+    answer: str,
+    sources: list[dict],
+) -> None:
+    """Persist one question/answer turn, remember its chunks and roll the memo."""
+    if conversation._state.adding:
+        conversation.save()
+    ChatMessage.objects.create(conversation=conversation, role=ChatMessage.ROLE_USER, content=question)
+    ChatMessage.objects.create(
+        conversation=conversation,
+        role=ChatMessage.ROLE_ASSISTANT,
+        content=answer,
+        sources=sources,
+    )
+    conversation.last_chunk_ids = [s["chunk_id"] for s in sources if "chunk_id" in s]
+    _fold_old_messages(conversation)
+    conversation.save(update_fields=["summary", "summarized_count", "last_chunk_ids", "updated_at"])
+
+
+def remember_chunks(conversation: ChatConversation, sources: list[dict]) -> None:
+    """
+    Persist the conversation and the chunks shown for a turn that is not
+    recorded as history (degraded extractive answer).
+    """
+    conversation.last_chunk_ids = [s["chunk_id"] for s in sources if "chunk_id" in s]
+    if conversation._state.adding:
+        conversation.save()
+    else:
+        conversation.save(update_fields=["last_chunk_ids", "updated_at"])
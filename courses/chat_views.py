@@ -1,13 +1,67 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
 from rest_framework import permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from courses.document_chat import build_prompt
+from courses.chat_sessions import get_or_create_conversation, record_turn, recent_history, remember_chunks
+from courses.document_chat import build_prompt, load_document_index
+from courses.extractive import extractive_answer
 from courses.groq_llm import GroqError, groq_chat_completion
 from courses.models import PDFDocument
 from courses.utils import decrypt_id
 
 
+def _resolve_document(document_id: str) -> tuple[PDFDocument | None, Response | None]:
+    """Resolve an encrypted or plain document ID. Returns (document, error_response)."""
+    resolved = document_id
+    if not str(resolved).isdigit():
+        decoded = decrypt_id(resolved)
+        if decoded:
+            resolved = decoded
+        else:
+            return None, Response({"detail": "document_id invalide."}, status=status.HTTP_400_BAD_REQUEST)
+
+    document = PDFDocument.objects.select_related(
+        "course", "study_sublevel", "study_sublevel__level"
+    ).prefetch_related("tags").filter(id=resolved, is_active=True).first()
+
+    if not document:
+        return None, Response({"detail": "Document non trouvé."}, status=status.HTTP_404_NOT_FOUND)
+    return document, None
+
+
+def _is_config_error(e: GroqError) -> bool:
+    msg = (str(e) or "").lower()
+    return "missing groq" in msg or getattr(e, "status", None) in (401, 403)
+
+
+def _groq_error_payload(e: GroqError) -> dict:
+    """User-facing error body for a failed Groq call."""
+    msg = str(e) or ""
+    if "missing groq_api_key" in msg.lower() or "missing groq" in msg.lower():
+        return {"detail": "IA non configurée (GROQ_API_KEY manquante côté serveur)."}
+    if getattr(e, "status", None) in (401, 403):
+        return {"detail": "IA non configurée (clé GROQ invalide ou non autorisée)."}
+    return {"detail": "Erreur IA. Réessaie plus tard.", "error": str(e)}
+
+
+def _should_degrade(e: GroqError) -> bool:
+    """
+    Answer extractively instead of failing: Groq down, rate-limited, circuit
+    open or deadline spent. Configuration errors still surface as 503.
+    """
+    return bool(getattr(settings, "CHAT_EXTRACTIVE_FALLBACK", True)) and not _is_config_error(e)
+
+
+def _chat_deadline() -> float:
+    return time.monotonic() + float(getattr(settings, "CHAT_DEADLINE_SECONDS", 25))
+
+
 class DocumentChatView(APIView):
     """
     RAG-powered chat with a PDF document using Groq LLMs.
@@ -15,13 +69,19 @@ class DocumentChatView(APIView):
     POST body:
       {
         "message": "...",
-        "history": [{"role": "user|assistant", "content": "..."}, ...]
+        "conversation_id": "...",   # optional — server-side history (returned by the first call)
+        "history": [{"role": "user|assistant", "content": "..."}, ...]   # legacy, ignored with conversation_id
       }
 
+    Legacy calls (history, no conversation_id) keep their client-side history:
+    nothing is persisted and no conversation_id is returned.
+
     Response:
       {
         "answer": "...",        # Markdown-formatted LLM response
-        "model":  "...",        # Groq model used
+        "model":  "...",        # Groq model used ("extractive" in degraded mode)
+        "conversation_id": "...",   # absent for legacy calls
+        "degraded": true,       # only when the LLM was unavailable (extractive answer)
         "sources": [            # RAG source citations
           { "page": 3, "excerpt": "...", "chunk_id": 12 },
           ...
@@ -38,48 +98,144 @@ class DocumentChatView(APIView):
             return Response({"detail": "Message requis."}, status=status.HTTP_400_BAD_REQUEST)
 
         # Resolve encrypted or plain document ID
-        resolved = document_id
-        if not str(resolved).isdigit():
-            decoded = decrypt_id(resolved)
-            if decoded:
-                resolved = decoded
-            else:
-                return Response({"detail": "document_id invalide."}, status=status.HTTP_400_BAD_REQUEST)
+        document, error = _resolve_document(document_id)
+        if error:
+            return error
 
-        document = PDFDocument.objects.select_related(
-            "course", "study_sublevel", "study_sublevel__level"
-        ).prefetch_related("tags").filter(id=resolved, is_active=True).first()
+        conversation_id = request.data.get("conversation_id") or None
+        conversation = get_or_create_conversation(request.user, document, conversation_id)
+        if conversation is None:
+            return Response({"detail": "Conversation non trouvée."}, status=status.HTTP_404_NOT_FOUND)
 
-        if not document:
-            return Response({"detail": "Document non trouvé."}, status=status.HTTP_404_NOT_FOUND)
+        # Server-side history when continuing a conversation; legacy clients still send theirs.
+        legacy = not conversation_id and "history" in request.data
+        if conversation_id:
+            history_list = recent_history(conversation)
+        else:
+            history_list = history if isinstance(history, list) else None
+        session = {} if legacy else {"conversation_id": str(conversation.id)}
 
         # Build RAG prompt — returns both the messages list AND source metadata
-        history_list = history if isinstance(history, list) else None
-        messages, sources = build_prompt(document, message, history=history_list)
+        index = load_document_index(document)
+        messages, sources = build_prompt(
+            document,
+            message,
+            history=history_list,
+            memo=conversation.summary,
+            previous_chunk_ids=conversation.last_chunk_ids,
+            index=index,
+        )
 
         try:
-            result = groq_chat_completion(messages)
+            result = groq_chat_completion(messages, deadline=_chat_deadline())
         except GroqError as e:
-            msg = str(e) or ""
-            if "missing groq_api_key" in msg.lower() or "missing groq" in msg.lower():
-                return Response(
-                    {"detail": "IA non configurée (GROQ_API_KEY manquante côté serveur)."},
-                    status=status.HTTP_503_SERVICE_UNAVAILABLE,
-                )
-            if getattr(e, "status", None) in (401, 403):
-                return Response(
-                    {"detail": "IA non configurée (clé GROQ invalide ou non autorisée)."},
-                    status=status.HTTP_503_SERVICE_UNAVAILABLE,
-                )
-            return Response(
-                {"detail": "Erreur IA. Réessaie plus tard.", "error": str(e)},
-                status=status.HTTP_503_SERVICE_UNAVAILABLE,
-            )
+            if not _should_degrade(e):
+                return Response(_groq_error_payload(e), status=status.HTTP_503_SERVICE_UNAVAILABLE)
+            # Degraded mode: best passages with highlighted sentences, no LLM
+            fallback = extractive_answer(index, message, [s["chunk_id"] for s in sources])
+            if not legacy:
+                remember_chunks(conversation, fallback["sources"])
+            return Response({**fallback, **session, "degraded": True})
+
+        if not legacy:
+            record_turn(conversation, message, result["content"], sources)
 
         return Response(
             {
                 "answer": result["content"],
                 "model": result["model"],
+                **session,
                 "sources": sources,   # <-- new field: RAG citations
             }
         )
+
+
+class DocumentChatBatchView(APIView):
+    """
+    Ask several questions about one document in a single request.
+
+    The document text cache and BM25 index are loaded once and shared by all
+    questions; LLM calls run concurrently (bounded by CHAT_BATCH_CONCURRENCY
+    and the Groq outbound limiter). Each question has the single-question
+    time budget, counted from when it starts.
+
+    POST body:
+      {
+        "questions": ["...", "..."],    # max CHAT_BATCH_MAX_QUESTIONS
+        "stream": false                 # true → NDJSON, one line per answer as it completes
+      }
+
+    Response (stream=false):
+      {
+        "results": [
+          { "index": 0, "question": "...", "answer": "...", "model": "...", "sources": [...] },
+          { "index": 1, "question": "...", "error": {"detail": "..."} },
+          ...
+        ]
+      }
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, document_id: str):
+        raw = request.data.get("questions")
+        if not isinstance(raw, list):
+            return Response({"detail": "questions doit être une liste."}, status=status.HTTP_400_BAD_REQUEST)
+        questions = [str(q).strip() for q in raw if str(q or "").strip()]
+        if not questions:
+            return Response({"detail": "Au moins une question requise."}, status=status.HTTP_400_BAD_REQUEST)
+
+        max_questions = int(getattr(settings, "CHAT_BATCH_MAX_QUESTIONS", 20))
+        if len(questions) > max_questions:
+            return Response(
+                {"detail": f"{max_questions} questions maximum par lot."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        document, error = _resolve_document(document_id)
+        if error:
+            return error
+
+        # One cache load + one index for the whole batch; prompts are built here
+        # (DB access stays on the request thread), only LLM calls go to the pool.
+        index = load_document_index(document)
+        prepared = [(i, q, *build_prompt(document, q, index=index)) for i, q in enumerate(questions)]
+
+        # Each question gets its own budget from when a worker picks it up; the
+        # batch as a whole is capped by CHAT_BATCH_DEADLINE_SECONDS.
+        batch_deadline = time.monotonic() + float(getattr(settings, "CHAT_BATCH_DEADLINE_SECONDS", 120))
+
+        def _answer(item) -> dict:
+            i, question, messages, sources = item
+            try:
+                result = groq_chat_completion(messages, deadline=min(_chat_deadline(), batch_deadline))
+            except GroqError as e:
+                if not _should_degrade(e):
+                    return {"index": i, "question": question, "error": _groq_error_payload(e)}
+                fallback = extractive_answer(index, question, [s["chunk_id"] for s in sources])
+                return {"index": i, "question": question, **fallback, "degraded": True}
+            return {
+                "index": i,
+                "question": question,
+                "answer": result["content"],
+                "model": result["model"],
+                "sources": sources,
+            }
+
+        workers = max(1, min(int(getattr(settings, "CHAT_BATCH_CONCURRENCY", 4)), len(prepared)))
+        stream = str(request.data.get("stream", "")).lower() in ("1", "true")
+
+        if stream:
+            def _lines():
+                with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chat-batch") as pool:
+                    futures = [pool.submit(_answer, item) for item in prepared]
+                    for fut in as_completed(futures):
+                        yield json.dumps(fut.result(), ensure_ascii=False) + "\n"
+
+            response = StreamingHttpResponse(_lines(), content_type="application/x-ndjson")
+            response["X-Accel-Buffering"] = "no"
+            return response
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chat-batch") as pool:
+            results = list(pool.map(_answer, prepared))
+        return Response({"results": results})
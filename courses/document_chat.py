@@ -4,11 +4,36 @@ Document Chat — prompt building with BM25 RAG retrieval.
 Developed by Marino ATOHOUN.
 """
 
+import logging
 import os
+import re
 
+from django.conf import settings
+
+from courses.extractive import compress_chunks
 from courses.models import PDFDocument, PDFDocumentText
 from courses.pdf_text import extract_pdf_pages
-from courses.rag_engine import Chunk, retrieve_relevant_chunks
+from courses.prompt_packer import estimate_tokens, pack_prompt, prompt_token_budget, render_context
+from courses.rag_engine import BM25Index, Chunk, build_chunks
+
+
+_log = logging.getLogger("courses.chat")
+
+_PAGE_REF_RE = re.compile(r"\b(?:p\.|pages?)\s*(\d+)", re.IGNORECASE)
+
+SYSTEM_PROMPT = (
+    "Tu es un assistant pédagogique expert. Réponds UNIQUEMENT en français.\n\n"
+    "RÈGLES STRICTES :\n"
+    "1. Appuie-toi EXCLUSIVEMENT sur le CONTEXTE fourni (extraits de pages du PDF).\n"
+    "2. Si l'information est absente du contexte, dis-le clairement et propose une "
+    "reformulation de la question.\n"
+    "3. Cite systématiquement les pages sources sous la forme **(p. X)** après chaque "
+    "affirmation clé.\n"
+    "4. Si plusieurs pages traitent du sujet, cite toutes les pages concernées.\n"
+    "5. Formatte ta réponse en Markdown clair (titres ##, listes, gras **…**).\n"
+    "6. Pour les mathématiques, utilise LaTeX inline $…$ ou display $$…$$.\n"
+    "7. Termine par une section **Sources** listant les pages utilisées.\n"
+)
 
 
 # ──────────────────────────────────────────────────────────────────────────────
@@ -37,6 +62,48 @@ def ensure_document_text_cache(document: PDFDocument) -> PDFDocumentText:
     return cache
 
 
+# ──────────────────────────────────────────────────────────────────────────────
+# Retrieval (with follow-up reuse)
+# ──────────────────────────────────────────────────────────────────────────────
+
+def load_document_index(document: PDFDocument) -> BM25Index:
+    """Chunk the cached text of *document* and build its BM25 index."""
+    cache = ensure_document_text_cache(document)
+    return BM25Index(build_chunks(cache.pages or []))
+
+
+def select_chunks(
+    index: BM25Index,
+    question: str,
+    previous_chunk_ids: list[int] | None = None,
+) -> tuple[list[Chunk], bool]:
+    """
+    Return (chunks ordered by BM25 score, reused).
+
+    When *previous_chunk_ids* is given (conversation session) the previous
+    turn's chunks are reused for follow-ups that cannot be retrieved on their
+    own: explicit page references already covered, or questions with no
+    document term ("et pourquoi ?"). Any other question gets a fresh ranking.
+    """
+    previous: list[Chunk] = []
+    if previous_chunk_ids:
+        by_id = {c.chunk_id: c for c in index.chunks}
+        previous = [by_id[i] for i in previous_chunk_ids if i in by_id]
+
+    if previous:
+        previous_pages = {c.page for c in previous}
+        referenced = {int(p) for p in _PAGE_REF_RE.findall(question)}
+        if referenced:
+            if referenced <= previous_pages:
+                return previous, True
+        elif not index.matched_terms(question):
+            return previous, True
+
+    results = index.retrieve(question)
+    results.sort(key=lambda x: x[1], reverse=True)
+    return [chunk for chunk, _score in results], False
+
+
 # ──────────────────────────────────────────────────────────────────────────────
 # Prompt builder
 # ──────────────────────────────────────────────────────────────────────────────
@@ -45,10 +112,25 @@ def build_prompt(
     document: PDFDocument,
     question: str,
     history: list[dict] | None = None,
+    model: str | None = None,
+    memo: str = "",
+    previous_chunk_ids: list[int] | None = None,
+    index: BM25Index | None = None,
+    compress: bool | None = None,
 ) -> tuple[list[dict], list[dict]]:
     """
     Build the LLM messages list and return the source metadata.
 
+    Pass a prebuilt *index* (load_document_index) to share one text-cache load
+    and chunking pass across several questions on the same document.
+
+    The prompt is packed against the token budget of *model* (or the smallest
+    budget of the configured models): question first, then the best chunks,
+    then the conversation *memo* and the most recent history.
+
+    With *compress* (default: settings.CHAT_CONTEXT_COMPRESSION) each chunk is
+    reduced to its best sentences and their neighbours before packing.
+
     Returns:
         (messages, sources)
 
@@ -56,60 +138,60 @@ def build_prompt(
         sources  : list of source dicts — [{"page": int, "excerpt": str, "chunk_id": int}, …]
                    to be forwarded to the frontend for citation display.
     """
-    cache = ensure_document_text_cache(document)
-    pages: list[str] = cache.pages or []
-
-    # ── BM25 retrieval ────────────────────────────────────────────────────────
-    top_chunks: list[Chunk] = retrieve_relevant_chunks(pages, question)
-
-    # Build the context block injected into the user message
-    context_parts: list[str] = []
-    for chunk in top_chunks:
-        context_parts.append(f"[Page {chunk.page}]\n{chunk.text}")
-    context = "\n\n---\n\n".join(context_parts)
+    if index is None:
+        index = load_document_index(document)
+
+    # ── BM25 retrieval (best score first) ─────────────────────────────────────
+    ranked_chunks, reused = select_chunks(index, question, previous_chunk_ids)
+
+    # ── Optional sentence-level compression ──────────────────────────────────
+    if compress is None:
+        compress = bool(getattr(settings, "CHAT_CONTEXT_COMPRESSION", False))
+    context_chunks = ranked_chunks
+    ratio = 1.0
+    if compress and ranked_chunks:
+        context_chunks = compress_chunks(index, ranked_chunks, question)
+        before = estimate_tokens(render_context(ranked_chunks))
+        ratio = estimate_tokens(render_context(context_chunks)) / max(before, 1)
+
+    def render_user(context: str) -> str:
+        return (
+            f"CONTEXTE (extraits du PDF \"{document.title}\") :\n\n"
+            f"{context}\n\n"
+            f"---\n\n"
+            f"QUESTION :\n{question}"
+        )
+
+    # ── Budgeted packing: chunks (merged per page) + recent history ──────────
+    packed = pack_prompt(
+        system=SYSTEM_PROMPT,
+        ranked_chunks=context_chunks,
+        history=history,
+        render_user=render_user,
+        budget=prompt_token_budget(model),
+        memo=memo,
+    )
+    _log.info(
+        "Prompt packed doc=%s chunks=%d/%d reused=%s compression=%.2f tokens~%d budget=%d",
+        document.pk,
+        len(packed.chunks),
+        len(ranked_chunks),
+        reused,
+        ratio,
+        packed.estimated_tokens,
+        packed.budget,
+    )
 
-    # Build the sources list for the UI
+    # Build the sources list for the UI (only chunks actually sent to the LLM;
+    # excerpts come from the original, uncompressed chunks)
+    by_id = {chunk.chunk_id: chunk for chunk in ranked_chunks}
     sources: list[dict] = [
         {
             "page": chunk.page,
-            "excerpt": chunk.excerpt,
+            "excerpt": by_id[chunk.chunk_id].excerpt,
             "chunk_id": chunk.chunk_id,
         }
-        for chunk in top_chunks
+        for chunk in packed.chunks
     ]
 
-    # ── System prompt ─────────────────────────────────────────────────────────
-    system = (
-        "Tu es un assistant pédagogique expert. Réponds UNIQUEMENT en français.\n\n"
-        "RÈGLES STRICTES :\n"
-        "1. Appuie-toi EXCLUSIVEMENT sur le CONTEXTE fourni (extraits de pages du PDF).\n"
-        "2. Si l'information est absente du contexte, dis-le clairement et propose une "
-        "reformulation de la question.\n"
-        "3. Cite systématiquement les pages sources sous la forme **(p. X)** après chaque "
-        "affirmation clé.\n"
-        "4. Si plusieurs pages traitent du sujet, cite toutes les pages concernées.\n"
-        "5. Formatte ta réponse en Markdown clair (titres ##, listes, gras **…**).\n"
-        "6. Pour les mathématiques, utilise LaTeX inline $…$ ou display $$…$$.\n"
-        "7. Termine par une section **Sources** listant les pages utilisées.\n"
-    )
-
-    messages: list[dict] = [{"role": "system", "content": system}]
-
-    # ── Conversation history (keep last 8 turns) ──────────────────────────────
-    if history:
-        for m in history[-8:]:
-            role = m.get("role")
-            content = m.get("content")
-            if role in ("user", "assistant") and isinstance(content, str):
-                messages.append({"role": role, "content": content})
-
-    # ── User message with injected context ────────────────────────────────────
-    user_content = (
-        f"CONTEXTE (extraits du PDF \"{document.title}\") :\n\n"
-        f"{context}\n\n"
-        f"---\n\n"
-        f"QUESTION :\n{question}"
-    )
-    messages.append({"role": "user", "content": user_content})
-
-    return messages, sources
+    return packed.messages, sources
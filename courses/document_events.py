@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""
+Document events — download / preview log, daily rollups and trending scores.
+Developed by Marino ATOHOUN.
+
+  - record(): buffers an event in the worker; the buffer is bulk-inserted
+    into DocumentEvent every DOCUMENT_EVENTS_FLUSH_SECONDS and at exit.
+  - rollup(): recomputes the DocumentDailyStats rows of the last days from
+    the raw events (idempotent), then the DocumentTrendingScore table
+    (time-decayed sum of the daily rows) — run by rollup_document_events.
+  - trending_documents(): the precomputed scores, best first; no scan of
+    the raw events at request time.
+"""
+
+import logging
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from courses import response_cache
+from courses.buffered_writes import BufferedWriter
+from courses.models import DocumentDailyStats, DocumentEvent, DocumentTrendingScore, PDFDocument
+
+logger = logging.getLogger("courses.document_events")
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Configuration
+# ──────────────────────────────────────────────────────────────────────────────
+
+DEFAULT_FLUSH_SECONDS = 5.0
+DEFAULT_RETENTION_DAYS = 90
+DEFAULT_TRENDING_WINDOW_DAYS = 30
+DEFAULT_TRENDING_HALF_LIFE_DAYS = 7.0
+DEFAULT_PREVIEW_WEIGHT = 0.2
+
+
+def _setting(name: str, default):
+    return type(default)(getattr(settings, name, default))
+
+
+def _start_of(day):
+    # Datetime bound rather than created_at__date: keeps the created_at index usable
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Event log
+# ──────────────────────────────────────────────────────────────────────────────
+
+class _EventLog(BufferedWriter):
+    """DocumentEvent rows, bulk-inserted."""
+
+    interval_setting = "DOCUMENT_EVENTS_FLUSH_SECONDS"
+    default_interval = DEFAULT_FLUSH_SECONDS
+    label = "Document events"
+
+    def new_buffer(self) -> list:
+        return []
+
+    def add(self, buffer: list, item: DocumentEvent) -> None:
+        buffer.append(item)
+
+    def put_back(self, buffer: list, batch: list) -> None:
+        buffer[:0] = batch
+
+    def write(self, batch: list) -> int:
+        # Documents deleted while their events were buffered would fail the whole insert
+        existing = set(
+            PDFDocument.objects.filter(pk__in={e.document_id for e in batch}).values_list("pk", flat=True)
+        )
+        events = [e for e in batch if e.document_id in existing]
+        if len(events) < len(batch):
+            logger.warning("%d document events of deleted documents dropped", len(batch) - len(events))
+        DocumentEvent.objects.bulk_create(events, batch_size=500)
+        return len(events)
+
+
+_writer = _EventLog(logger)
+
+
+def record(document_id: int, kind: str) -> None:
+    """Log a DocumentEvent.DOWNLOAD / PREVIEW of a document (buffered)."""
+    _writer.submit(DocumentEvent(document_id=document_id, kind=kind, created_at=timezone.now()))
+
+
+def flush() -> int:
+    """Insert the buffered events now; returns the number written."""
+    return _writer.flush()
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Rollups
+# ──────────────────────────────────────────────────────────────────────────────
+
+def rollup_days(since) -> int:
+    """Rebuild the DocumentDailyStats rows dated *since* or later; returns the row count."""
+    rows = (
+        DocumentEvent.objects.filter(created_at__gte=_start_of(since))
+        .annotate(date=TruncDate("created_at"))
+        .values("document_id", "document__course_id", "date")
+        .annotate(
+            downloads=Count("id", filter=Q(kind=DocumentEvent.DOWNLOAD)),
+            previews=Count("id", filter=Q(kind=DocumentEvent.PREVIEW)),
+        )
+        .order_by()
+    )
+    daily = [
+        DocumentDailyStats(
+            document_id=row["document_id"],
+            course_id=row["document__course_id"],
+            date=row["date"],
+            downloads=row["downloads"],
+            previews=row["previews"],
+        )
+        for row in rows
+    ]
+    with transaction.atomic():
+        DocumentDailyStats.objects.filter(date__gte=since).delete()
+        DocumentDailyStats.objects.bulk_create(daily, batch_size=500)
+    return len(daily)
+
+
+def compute_trending(today=None) -> int:
+    """
+    Recompute every trending score from the daily rows of the window:
+    Σ (downloads + w·previews) · 0.5^(age in days / half-life).
+    """
+    today = today or timezone.localdate()
+    window = _setting("TRENDING_WINDOW_DAYS", DEFAULT_TRENDING_WINDOW_DAYS)
+    half_life = _setting("TRENDING_HALF_LIFE_DAYS", DEFAULT_TRENDING_HALF_LIFE_DAYS)
+    preview_weight = _setting("TRENDING_PREVIEW_WEIGHT", DEFAULT_PREVIEW_WEIGHT)
+
+    scores: dict[int, float] = defaultdict(float)
+    courses: dict[int, int] = {}
+    rows = DocumentDailyStats.objects.filter(
+        date__gt=today - timedelta(days=window), document__is_active=True
+    ).values_list("document_id", "document__course_id", "date", "downloads", "previews")
+    for document_id, course_id, date, downloads, previews in rows:
+        age = (today - date).days
+        scores[document_id] += (downloads + preview_weight * previews) * 0.5 ** (age / half_life)
+        courses[document_id] = course_id
+
+    now = timezone.now()
+    with transaction.atomic():
+        DocumentTrendingScore.objects.all().delete()
+        DocumentTrendingScore.objects.bulk_create(
+            [
+                DocumentTrendingScore(document_id=d, course_id=courses[d], score=score, computed_at=now)
+                for d, score in scores.items()
+                if score > 0
+            ],
+            batch_size=500,
+        )
+    response_cache.bump("trending")
+    return len(scores)
+
+
+def prune_events(today=None) -> int:
+    """Delete raw events older than DOCUMENT_EVENTS_RETENTION_DAYS (already rolled up)."""
+    today = today or timezone.localdate()
+    retention = _setting("DOCUMENT_EVENTS_RETENTION_DAYS", DEFAULT_RETENTION_DAYS)
+    deleted, _ = DocumentEvent.objects.filter(created_at__lt=_start_of(today - timedelta(days=retention))).delete()
+    return deleted
+
+
+def rollup(days: int = 2) -> dict:
+    """Periodic job: daily rows of the last *days* days, trending scores, raw events pruning."""
+    today = timezone.localdate()
+    return {
+        "daily_rows": rollup_days(today - timedelta(days=days - 1)),
+        "trending": compute_trending(today),
+        "pruned_events": prune_events(today),
+    }
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Trending
+# ──────────────────────────────────────────────────────────────────────────────
+
+def trending_documents(queryset, course_id: int | None = None):
+    """Documents of *queryset* that have a trending score, best first (`trending_score` annotation)."""
+    queryset = queryset.filter(trending__isnull=False)
+    if course_id is not None:
+        queryset = queryset.filter(trending__course_id=course_id)
+    return queryset.annotate(trending_score=F("trending__score")).order_by("-trending__score", "-id")
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Download counters — write-coalescing PDFDocument.download_count updates.
+Developed by Marino ATOHOUN.
+
+Downloads are added to an in-process buffer ({document id: count}) and
+flushed every DOWNLOAD_COUNTER_FLUSH_SECONDS by a daemon timer: one atomic
+`download_count = download_count + n` UPDATE per document touched, plus one
+platform counters update, whatever the number of downloads in between.
+The buffer is also flushed when the worker exits and a failed flush puts
+the counts back (see courses.buffered_writes).
+
+DOWNLOAD_COUNTER_FLUSH_SECONDS = 0 writes each download immediately (still
+as an F() increment, no read-modify-write).
+"""
+
+import logging
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import F
+
+from courses.buffered_writes import BufferedWriter
+
+logger = logging.getLogger("courses.download_counters")
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Configuration
+# ──────────────────────────────────────────────────────────────────────────────
+
+DEFAULT_FLUSH_SECONDS = 5.0
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Writes
+# ──────────────────────────────────────────────────────────────────────────────
+
+def _apply(counts: dict[int, int]) -> None:
+    from courses import platform_stats, response_cache
+    from courses.models import PDFDocument
+
+    with transaction.atomic():
+        for document_id, count in sorted(counts.items()):
+            PDFDocument.objects.filter(pk=document_id).update(download_count=F("download_count") + count)
+        platform_stats.record_download(sum(counts.values()))
+    response_cache.bump("stats")
+
+
+class _DownloadCounts(BufferedWriter):
+    """{document id: downloads} buffer."""
+
+    interval_setting = "DOWNLOAD_COUNTER_FLUSH_SECONDS"
+    default_interval = DEFAULT_FLUSH_SECONDS
+    label = "Download counters"
+
+    def new_buffer(self) -> Counter:
+        return Counter()
+
+    def add(self, buffer: Counter, item: tuple[int, int]) -> None:
+        document_id, count = item
+        buffer[document_id] += count
+
+    def put_back(self, buffer: Counter, batch: Counter) -> None:
+        buffer.update(batch)
+
+    def size(self, batch: Counter) -> int:
+        return sum(batch.values())
+
+    def write(self, batch: Counter) -> int:
+        # Counts of deleted documents update no row: nothing to drop
+        _apply(dict(batch))
+        return self.size(batch)
+
+
+_writer = _DownloadCounts(logger)
+
+
+def record_download(document_id: int, count: int = 1) -> None:
+    """Count *count* downloads of a document (buffered unless flushing is disabled)."""
+    _writer.submit((document_id, count))
+
+
+def pending_downloads() -> dict[int, int]:
+    """Buffered counts not yet written."""
+    return dict(_writer.pending())
+
+
+def flush() -> int:
+    """Write the buffered counts now; returns the number of downloads written."""
+    return _writer.flush()
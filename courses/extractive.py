@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+Extractive helpers — sentence-level selection with the BM25 statistics.
+Developed by Marino ATOHOUN.
+
+  - extractive_answer(): degraded chat mode when the LLM is unavailable —
+    the best chunks with the sentences that best match the question,
+    formatted like a normal answer (Markdown + (p. X) citations).
+  - compress_chunks(): optional context compression before prompt packing —
+    each retrieved chunk keeps only its best sentences and their neighbours.
+"""
+
+from dataclasses import replace
+
+from courses.rag_engine import BM25Index, Chunk, split_sentences
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Configuration
+# ──────────────────────────────────────────────────────────────────────────────
+
+SENTENCES_PER_CHUNK = 2
+SENTENCE_MAX_CHARS = 400
+EXTRACTIVE_MODEL_NAME = "extractive"
+
+COMPRESSION_SENTENCES_PER_CHUNK = 3     # best sentences kept per chunk
+COMPRESSION_NEIGHBOURS = 1              # sentences kept on each side of a hit
+COMPRESSION_GAP = "[…]"                 # marks removed sentences
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Sentence selection
+# ──────────────────────────────────────────────────────────────────────────────
+
+def best_sentences(index: BM25Index, chunk: Chunk, question: str, limit: int = SENTENCES_PER_CHUNK) -> list[str]:
+    """The *limit* sentences of *chunk* scoring highest against *question*, in text order."""
+    # Dedupe repeated sentences (headers/footers, copy-pasted paragraphs)
+    sentences = list(dict.fromkeys(split_sentences(chunk.text)))
+    scored = [(i, index.score_text(s, question)) for i, s in enumerate(sentences)]
+    top = [item for item in sorted(scored, key=lambda x: x[1], reverse=True)[:limit] if item[1] > 0]
+    if not top:
+        # Nothing matches: lead with the chunk's opening sentence
+        top = scored[:1]
+    return [_clip(sentences[i]) for i, _score in sorted(top)]
+
+
+def _clip(sentence: str) -> str:
+    if len(sentence) <= SENTENCE_MAX_CHARS:
+        return sentence
+    return sentence[:SENTENCE_MAX_CHARS].rsplit(" ", 1)[0] + "…"
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Answer
+# ──────────────────────────────────────────────────────────────────────────────
+
+def extractive_answer(index: BM25Index, question: str, chunk_ids: list[int]) -> dict:
+    """
+    Build a degraded answer from the retrieved chunks *chunk_ids*.
+
+    Returns {answer, model, sources} — the same shape as the LLM path, with
+    the highlighted sentences added to each source.
+    """
+    by_id = {c.chunk_id: c for c in index.chunks}
+    chunks = [by_id[i] for i in chunk_ids if i in by_id]
+    chunks.sort(key=lambda c: (c.page, c.chunk_id))
+
+    lines = [
+        "> ⚠️ L'assistant IA est momentanément indisponible. Voici les passages du document "
+        "qui correspondent le mieux à ta question.",
+        "",
+    ]
+    sources: list[dict] = []
+    pages: list[int] = []
+    for chunk in chunks:
+        highlights = best_sentences(index, chunk, question)
+        sources.append(
+            {
+                "page": chunk.page,
+                "excerpt": chunk.excerpt,
+                "chunk_id": chunk.chunk_id,
+                "highlights": highlights,
+            }
+        )
+        if chunk.page not in pages:
+            pages.append(chunk.page)
+            lines.append(f"## Page {chunk.page}")
+        lines.extend(f"- {sentence} **(p. {chunk.page})**" for sentence in highlights)
+        lines.append("")
+
+    if not chunks:
+        lines.append("Aucun passage pertinent trouvé dans le document.")
+    else:
+        lines.append("**Sources**")
+        lines.append("")
+        lines.extend(f"- p. {p}" for p in pages)
+
+    return {"answer": "\n".join(lines).strip(), "model": EXTRACTIVE_MODEL_NAME, "sources": sources}
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Context compression
+# ──────────────────────────────────────────────────────────────────────────────
+
+def _kept_positions(scores: list[float], limit: int, neighbours: int) -> list[int]:
+    hits = [i for i, score in sorted(enumerate(scores), key=lambda x: x[1], reverse=True)[:limit] if score > 0]
+    kept = set()
+    for i in hits:
+        kept.update(range(max(i - neighbours, 0), min(i + neighbours + 1, len(scores))))
+    return sorted(kept)
+
+
+def compress_chunks(
+    index: BM25Index,
+    chunks: list[Chunk],
+    question: str,
+    limit: int = COMPRESSION_SENTENCES_PER_CHUNK,
+    neighbours: int = COMPRESSION_NEIGHBOURS,
+) -> list[Chunk]:
+    """
+    Return *chunks* (same order, ids and pages) with their text reduced to the
+    *limit* best-scoring sentences plus *neighbours* on each side.
+
+    Sentences already kept for an earlier chunk of the same page (the
+    overlap window) are not repeated. A chunk with no matching sentence
+    (e.g. a follow-up like "et pourquoi ?") is kept whole.
+    """
+    compressed: list[Chunk] = []
+    seen: set[tuple[int, str]] = set()
+    for chunk in chunks:
+        sentences = split_sentences(chunk.text)
+        scores = [index.score_text(s, question) for s in sentences]
+        positions = _kept_positions(scores, limit, neighbours)
+        if not positions:
+            compressed.append(chunk)
+            continue
+
+        parts: list[str] = []
+        previous = -1
+        for i in positions:
+            key = (chunk.page, sentences[i])
+            if key in seen:
+                continue
+            seen.add(key)
+            if parts and i != previous + 1:
+                parts.append(COMPRESSION_GAP)
+            parts.append(sentences[i])
+            previous = i
+        if parts:
+            compressed.append(replace(chunk, text=" ".join(parts)))
+    return compressed
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""
+Document facets & counts — grouped counts of active documents, cached.
+Developed by Marino ATOHOUN.
+
+  - document_facets(): documents per course, study level, sub-level and tag
+    (one GROUP BY query each) for a filter set, cached until a document,
+    tag or course changes.
+  - estimate_count(): cheap count estimate for a Data API filter set, derived
+    from the facets (independence assumption) instead of a COUNT(*).
+  - cached_count(): exact COUNT(*) cached per filter signature (short TTL).
+"""
+
+import hashlib
+from collections.abc import Callable
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, QuerySet
+
+from courses.models import Course, PDFDocument, StudyLevel, StudySubLevel, Tag
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Configuration
+# ──────────────────────────────────────────────────────────────────────────────
+
+FACETS_CACHE_PREFIX = "edushare:facets:"
+FACETS_VERSION_KEY = "edushare:facets:version"
+FACETS_CACHE_SECONDS = 15 * 60        # safety net — signals invalidate on change
+COUNT_CACHE_PREFIX = "edushare:data-count:"
+DEFAULT_COUNT_CACHE_SECONDS = 60
+
+# Query parameters that do not change the result set
+NON_FILTER_PARAMS = frozenset({"page", "page_size", "cursor", "count", "format"})
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Facets
+# ──────────────────────────────────────────────────────────────────────────────
+
+def _grouped(queryset, field: str) -> dict[int, int]:
+    rows = (
+        queryset.filter(**{f"{field}__isnull": False})
+        .values(field)
+        .annotate(n=Count("id"))
+        .order_by()
+    )
+    return {row[field]: row["n"] for row in rows}
+
+
+def _active_documents():
+    return PDFDocument.objects.filter(is_active=True)
+
+
+def compute_document_facets(queryset_for: Callable[[str | None], QuerySet] | None = None) -> dict:
+    """
+    Grouped document counts, uncached.
+
+    *queryset_for(dimension)* returns the documents to count for a facet
+    dimension ("course", "study_level", "study_sublevel", "tag"; None for the
+    total) — typically the current filters minus that dimension's own filter,
+    so the other options of a menu keep their counts. Defaults to all active
+    documents.
+    """
+    if queryset_for is None:
+        def queryset_for(dimension):
+            return _active_documents()
+
+    per_course = _grouped(queryset_for("course"), "course_id")
+    per_level = _grouped(queryset_for("study_level"), "study_sublevel__level_id")
+    per_sublevel = _grouped(queryset_for("study_sublevel"), "study_sublevel_id")
+    per_tag = _grouped(queryset_for("tag"), "tags")
+
+    return {
+        "total": queryset_for(None).order_by().count(),
+        "courses": [
+            {"id": c.id, "domain": c.domain, "name": c.name, "count": per_course[c.id]}
+            for c in Course.objects.filter(id__in=per_course).order_by("name")
+        ],
+        "study_levels": [
+            {"id": lv.id, "key": lv.key, "name": lv.name, "count": per_level[lv.id]}
+            for lv in StudyLevel.objects.filter(id__in=per_level)
+        ],
+        "study_sublevels": [
+            {"id": s.id, "level_id": s.level_id, "key": s.key, "name": s.name, "count": per_sublevel[s.id]}
+            for s in StudySubLevel.objects.filter(id__in=per_sublevel)
+        ],
+        "tags": [
+            {"id": t.id, "key": t.key, "name": t.name, "count": per_tag[t.id]}
+            for t in Tag.objects.filter(id__in=per_tag)
+        ],
+    }
+
+
+def _facets_version() -> int:
+    version = cache.get(FACETS_VERSION_KEY)
+    if version is None:
+        version = 1
+        cache.add(FACETS_VERSION_KEY, version, None)
+    return version
+
+
+def document_facets(params=None, queryset_for=None) -> dict:
+    """
+    Cached compute_document_facets() for the filter set *params* (query
+    parameters; None = no filter). Entries are keyed by a version number
+    that invalidate_facets() bumps, so every filter set is dropped at once.
+    """
+    signature = filter_signature(params) if params else "all"
+    key = f"{FACETS_CACHE_PREFIX}{_facets_version()}:{signature}"
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_document_facets(queryset_for)
+        cache.set(key, facets, FACETS_CACHE_SECONDS)
+    return facets
+
+
+def invalidate_facets() -> None:
+    try:
+        cache.incr(FACETS_VERSION_KEY)
+    except ValueError:
+        # Version key evicted/never set: any stale entry is under an older version
+        cache.set(FACETS_VERSION_KEY, 2, None)
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Count estimation
+# ──────────────────────────────────────────────────────────────────────────────
+
+def _matches_ref(item: dict, value: str) -> bool:
+    """id / key / name reference, as accepted by the study_level & study_sublevel filters."""
+    if value.isdigit():
+        return item["id"] == int(value)
+    return value in (item["key"], item["name"])
+
+
+def estimate_count(params) -> int | None:
+    """
+    Estimate the number of documents matching the Data API filters in
+    *params* from the cached facets. Returns None when a filter cannot be
+    estimated (full-text search).
+    """
+    if params.get("search"):
+        return None
+
+    facets = document_facets()
+    total = facets["total"]
+    if not total:
+        return 0
+
+    matched: list[int] = []
+    domain = params.get("domain")
+    if domain:
+        matched.append(sum(c["count"] for c in facets["courses"] if domain.lower() in c["domain"].lower()))
+    level = params.get("study_level")
+    if level:
+        matched.append(sum(lv["count"] for lv in facets["study_levels"] if _matches_ref(lv, level)))
+    sublevel = params.get("study_sublevel")
+    if sublevel:
+        matched.append(sum(s["count"] for s in facets["study_sublevels"] if _matches_ref(s, sublevel)))
+    tag = params.get("tag")
+    if tag:
+        matched.append(
+            max([t["count"] for t in facets["tags"] if t["key"] == tag or t["name"].lower() == tag.lower()] or [0])
+        )
+
+    # Independent filters: total × Π selectivity (exact for a single filter)
+    estimate = float(total)
+    for count in matched:
+        estimate *= min(count, total) / total
+    return int(round(estimate))
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Exact counts (cached)
+# ──────────────────────────────────────────────────────────────────────────────
+
+def filter_signature(params) -> str:
+    """Stable hash of the filtering query parameters (pagination params ignored)."""
+    items = sorted(
+        (key, value)
+        for key in params
+        if key not in NON_FILTER_PARAMS
+        for value in params.getlist(key)
+    )
+    return hashlib.sha1(repr(items).encode("utf-8")).hexdigest()
+
+
+def cached_count(queryset, params) -> int:
+    """COUNT(*) of *queryset*, cached per filter signature for DATA_COUNT_CACHE_SECONDS."""
+    key = COUNT_CACHE_PREFIX + filter_signature(params)
+    count = cache.get(key)
+    if count is None:
+        count = queryset.order_by().count()
+        cache.set(key, count, int(getattr(settings, "DATA_COUNT_CACHE_SECONDS", DEFAULT_COUNT_CACHE_SECONDS)))
+    return count
@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+"""
+File delivery — streamed or web-server-offloaded PDF responses.
+Developed by Marino ATOHOUN.
+
+Shared by download_pdf, preview_pdf and the Data API download. Once the
+view has done its permission checks and counter updates, the file goes out
+through FILE_DELIVERY_BACKEND:
+  - "django"   : FileResponse streamed in FILE_DELIVERY_BLOCK_SIZE blocks
+                 (never the whole file in worker memory)
+  - "nginx"    : empty response + X-Accel-Redirect to an `internal` location
+                 (FILE_DELIVERY_ACCEL_PREFIX) serving MEDIA_ROOT
+  - "sendfile" : empty response + X-Sendfile with the absolute path
+                 (Apache mod_xsendfile, lighttpd)
+  - "signed"   : 302 to an expiring signed URL that nginx serves directly
+                 (courses.signed_media); counted from the nginx access log
+
+Every backend answers conditional requests (strong ETag from size + mtime,
+Last-Modified, If-None-Match / If-Modified-Since → 304). Byte ranges
+(RFC 7233: single range → 206, several → multipart/byteranges, If-Range)
+are served by Django in "django" mode; nginx and X-Sendfile servers handle
+Range themselves.
+"""
+
+import logging
+import os
+import re
+import secrets
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    HttpResponseNotModified,
+    HttpResponseRedirect,
+    StreamingHttpResponse,
+)
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+
+from courses.signed_media import signed_url
+
+logger = logging.getLogger("courses.file_delivery")
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Configuration
+# ──────────────────────────────────────────────────────────────────────────────
+
+BACKENDS = ("django", "nginx", "sendfile", "signed")
+DEFAULT_BLOCK_SIZE = 64 * 1024
+DEFAULT_ACCEL_PREFIX = "/protected-media/"
+MAX_RANGES = 16                        # more than this: Range ignored, full 200
+
+_RANGE_SPEC_RE = re.compile(r"^(\d*)-(\d*)$")
+
+
+def _backend() -> str:
+    backend = getattr(settings, "FILE_DELIVERY_BACKEND", "django")
+    if backend not in BACKENDS:
+        logger.warning("Unknown FILE_DELIVERY_BACKEND %r, streaming from Django", backend)
+        return "django"
+    return backend
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Validators & conditional requests
+# ──────────────────────────────────────────────────────────────────────────────
+
+def file_validators(field) -> tuple[int, str, int]:
+    """(size, strong ETag, Last-Modified timestamp) of the stored file."""
+    size = field.storage.size(field.name)
+    modified = field.storage.get_modified_time(field.name)
+    mtime_ns = int(modified.timestamp() * 1_000_000_000)
+    return size, f'"{size:x}-{mtime_ns:x}"', int(modified.timestamp())
+
+
+def _etag_list(header: str) -> list[str]:
+    return [tag.strip() for tag in header.split(",") if tag.strip()]
+
+
+def _not_modified(request, etag: str, last_modified: int) -> bool:
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match:
+        # Weak comparison (RFC 7232 §3.2); If-Modified-Since is then ignored
+        tags = [t.removeprefix("W/") for t in _etag_list(if_none_match)]
+        return "*" in tags or etag in tags
+    since = parse_http_date_safe(request.headers.get("If-Modified-Since", ""))
+    return since is not None and last_modified <= since
+
+
+def _range_applies(request, etag: str, last_modified: int) -> bool:
+    """If-Range: serve the range only if the validator still matches (strong comparison)."""
+    if_range = request.headers.get("If-Range")
+    if not if_range:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith(("\"", "W/")):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def parse_range(header: str | None, size: int) -> list[tuple[int, int]] | None:
+    """
+    Inclusive (start, end) byte ranges requested by a `Range: bytes=…` header.
+    None when the header is absent, malformed or should be ignored (full
+    response); [] when no range is satisfiable (416).
+    """
+    if not header or not header.startswith("bytes="):
+        return None
+    specs = [spec.strip() for spec in header[len("bytes="):].split(",")]
+    if not specs or len(specs) > MAX_RANGES:
+        return None
+    ranges = []
+    for spec in specs:
+        match = _RANGE_SPEC_RE.match(spec)
+        if not match or match.groups() == ("", ""):
+            return None
+        first, last = match.groups()
+        if first:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+            if last and int(last) < start:
+                return None
+        else:
+            # Suffix range: the last N bytes
+            start, end = max(size - int(last), 0), size - 1
+        if start < size and end >= start:
+            ranges.append((start, end))
+    return ranges
+
+
+def range_start(request, size: int | None = None) -> int:
+    """First byte the client asked for (0 without a Range header)."""
+    ranges = parse_range(request.headers.get("Range"), size if size is not None else 2**63)
+    return min(start for start, _ in ranges) if ranges else 0
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Responses
+# ──────────────────────────────────────────────────────────────────────────────
+
+def _filename(document) -> str:
+    return f"{(document.title or 'document').strip()}.pdf"
+
+
+def _offloaded(header: str, value: str) -> HttpResponse:
+    response = HttpResponse(content_type="application/pdf")
+    response[header] = value
+    return response
+
+
+def _block_size() -> int:
+    return int(getattr(settings, "FILE_DELIVERY_BLOCK_SIZE", DEFAULT_BLOCK_SIZE))
+
+
+def _read_range(handle, start: int, end: int):
+    handle.seek(start)
+    remaining = end - start + 1
+    while remaining > 0:
+        block = handle.read(min(_block_size(), remaining))
+        if not block:
+            break
+        remaining -= len(block)
+        yield block
+
+
+def _single_range(field, start: int, end: int, size: int) -> StreamingHttpResponse:
+    def body():
+        with field.open("rb") as handle:
+            yield from _read_range(handle, start, end)
+
+    response = StreamingHttpResponse(body(), status=206, content_type="application/pdf")
+    response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    response["Content-Length"] = str(end - start + 1)
+    return response
+
+
+def _multi_range(field, ranges: list[tuple[int, int]], size: int) -> StreamingHttpResponse:
+    boundary = secrets.token_hex(16)
+    heads = [
+        (f"--{boundary}\r\nContent-Type: application/pdf\r\n"
+         f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n").encode("ascii")
+        for start, end in ranges
+    ]
+    tail = f"\r\n--{boundary}--\r\n".encode("ascii")
+    length = sum(len(h) for h in heads) + sum(e - s + 1 for s, e in ranges) + 2 * (len(ranges) - 1) + len(tail)
+
+    def body():
+        with field.open("rb") as handle:
+            for i, ((start, end), head) in enumerate(zip(ranges, heads)):
+                yield (b"\r\n" if i else b"") + head
+                yield from _read_range(handle, start, end)
+        yield tail
+
+    response = StreamingHttpResponse(body(), status=206, content_type=f"multipart/byteranges; boundary={boundary}")
+    response["Content-Length"] = str(length)
+    return response
+
+
+def _streamed(request, field, size: int, etag: str, last_modified: int) -> HttpResponse:
+    ranges = None
+    if _range_applies(request, etag, last_modified):
+        ranges = parse_range(request.headers.get("Range"), size)
+    if ranges == []:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        return response
+    if ranges and len(ranges) == 1:
+        return _single_range(field, *ranges[0], size)
+    if ranges:
+        return _multi_range(field, ranges, size)
+    response = FileResponse(field.open("rb"), content_type="application/pdf")
+    response.block_size = _block_size()
+    return response
+
+
+def serve_pdf(request, document, as_attachment: bool = True, backend: str | None = None) -> HttpResponse:
+    """
+    Response delivering the PDF of *document* (inline when *as_attachment*
+    is False) through *backend* (FILE_DELIVERY_BACKEND by default): 304 when
+    the client copy is current, 206/416 for byte ranges.
+    Raises Http404 when the file is missing from storage.
+    """
+    field = document.pdf_file
+    if not field or not field.storage.exists(field.name):
+        raise Http404("Fichier non trouvé")
+
+    backend = backend or _backend()
+    if backend == "signed":
+        response = HttpResponseRedirect(signed_url(document, as_attachment))
+        response["Cache-Control"] = "no-store"
+        return response
+
+    size, etag, last_modified = file_validators(field)
+    if _not_modified(request, etag, last_modified):
+        response = HttpResponseNotModified()
+    else:
+        if backend == "nginx":
+            prefix = getattr(settings, "FILE_DELIVERY_ACCEL_PREFIX", DEFAULT_ACCEL_PREFIX)
+            response = _offloaded("X-Accel-Redirect", prefix.rstrip("/") + "/" + quote(field.name))
+        elif backend == "sendfile":
+            response = _offloaded("X-Sendfile", os.path.abspath(field.path))
+        else:
+            response = _streamed(request, field, size, etag, last_modified)
+        response["Content-Disposition"] = content_disposition_header(as_attachment, _filename(document))
+
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    response["Accept-Ranges"] = "bytes"
+    return response
+
+
+def counts_as_download(request, response) -> bool:
+    """
+    True when *response* starts a new transfer of the file: not a HEAD, a
+    304/416, nor the continuation of a ranged download (resume, viewer page
+    fetch).
+    """
+    return request.method == "GET" and response.status_code in (200, 206) and range_start(request) == 0
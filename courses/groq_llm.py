@@ -1,10 +1,14 @@
+import http.client
 import json
 import os
+import socket
 import threading
 import time
 import urllib.error
 import urllib.request
 import logging
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
 from django.conf import settings
 
@@ -15,11 +19,39 @@ class GroqError(RuntimeError):
         self.status = status
 
 
+class GroqCancelled(GroqError):
+    """Raised by a hedged call whose result is no longer needed."""
+
+
+class GroqUnavailable(GroqError):
+    """Raised without calling Groq while the circuit breaker is open."""
+
+
+class GroqDeadlineExceeded(GroqError):
+    """Raised when the caller's deadline budget is spent before an answer."""
+
+
+class GroqDeadlineSpent(GroqDeadlineExceeded):
+    """Raised when the deadline passes before a request reaches Groq (not a Groq outage)."""
+
+
+class GroqSaturated(GroqDeadlineSpent):
+    """Raised when no outbound slot frees up in time (local saturation, not a Groq outage)."""
+
+
+DEFAULT_BASE_URL = "https://api.groq.com/openai/v1"
+
 _lock = threading.Lock()
 _rr_index = 0
 _log = logging.getLogger("courses.groq")
 
 
+def _base_url() -> str:
+    """OpenAI-compatible base URL (override with GROQ_BASE_URL, e.g. the local stand-in)."""
+    url = getattr(settings, "GROQ_BASE_URL", "") or os.environ.get("GROQ_BASE_URL", "") or DEFAULT_BASE_URL
+    return url.rstrip("/")
+
+
 def _choose_start_model(models: list[str]) -> int:
     global _rr_index
     with _lock:
@@ -28,11 +60,146 @@ def _choose_start_model(models: list[str]) -> int:
     return idx
 
 
-def _post_json(url: str, payload: dict, headers: dict, timeout: int = 45) -> dict:
+# ──────────────────────────────────────────────────────────────────────────────
+# Cancellable HTTP (hedged requests)
+# ──────────────────────────────────────────────────────────────────────────────
+
+class CancelToken:
+    """
+    Lets another thread abort an in-flight _post_json call: cancel() shuts the
+    socket down, so the blocked read returns immediately instead of running to
+    the timeout.
+    """
+
+    def __init__(self) -> None:
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._conns: list[http.client.HTTPConnection] = []
+        # When the call actually started sending (after any queueing); hedge delays count from here
+        self.started_at: float | None = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def mark_started(self) -> None:
+        if self.started_at is None:
+            self.started_at = time.monotonic()
+
+    def register(self, conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            self._conns.append(conn)
+        # Checked after registering: either cancel() sees this connection or we see the flag.
+        if self.cancelled:
+            raise GroqCancelled("Groq call cancelled")
+
+    def cancel(self) -> None:
+        self._event.set()
+        with self._lock:
+            conns = list(self._conns)
+        for conn in conns:
+            sock = getattr(conn, "sock", None)
+            if sock is None:
+                continue
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+class _CancellableConnectionMixin:
+    def __init__(self, token: CancelToken, *args, **kwargs):
+        self._cancel_token = token
+        super().__init__(*args, **kwargs)
+
+    def connect(self):
+        super().connect()
+        self._cancel_token.register(self)
+
+
+class _CancellableHTTPConnection(_CancellableConnectionMixin, http.client.HTTPConnection):
+    pass
+
+
+class _CancellableHTTPSConnection(_CancellableConnectionMixin, http.client.HTTPSConnection):
+    pass
+
+
+class _CancellableHTTPHandler(urllib.request.HTTPHandler):
+    def __init__(self, token: CancelToken):
+        super().__init__()
+        self._token = token
+
+    def http_open(self, req):
+        return self.do_open(lambda *a, **kw: _CancellableHTTPConnection(self._token, *a, **kw), req)
+
+
+class _CancellableHTTPSHandler(urllib.request.HTTPSHandler):
+    def __init__(self, token: CancelToken):
+        super().__init__()
+        self._token = token
+
+    def https_open(self, req):
+        return self.do_open(
+            lambda *a, **kw: _CancellableHTTPSConnection(self._token, *a, **kw),
+            req,
+            context=self._context,
+        )
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Outbound limiter
+# ──────────────────────────────────────────────────────────────────────────────
+
+_outbound: threading.BoundedSemaphore | None = None
+_outbound_lock = threading.Lock()
+
+
+def _outbound_semaphore() -> threading.BoundedSemaphore:
+    """Per-process cap on concurrent Groq HTTP calls (GROQ_MAX_CONCURRENCY)."""
+    global _outbound
+    with _outbound_lock:
+        if _outbound is None:
+            _outbound = threading.BoundedSemaphore(int(getattr(settings, "GROQ_MAX_CONCURRENCY", 8)))
+        return _outbound
+
+
+def _acquire_outbound(cancel: CancelToken | None, deadline: float) -> threading.BoundedSemaphore:
+    """Wait for an outbound slot until *deadline* (monotonic); the caller then falls back."""
+    sem = _outbound_semaphore()
+    while not sem.acquire(timeout=max(min(0.1, deadline - time.monotonic()), 0)):
+        if cancel is not None and cancel.cancelled:
+            raise GroqCancelled("Groq call cancelled")
+        if time.monotonic() >= deadline:
+            raise GroqSaturated("No outbound Groq slot before the deadline", status=504)
+    return sem
+
+
+def _post_json(
+    url: str,
+    payload: dict,
+    headers: dict,
+    timeout: float = 45,
+    cancel: CancelToken | None = None,
+    deadline: float | None = None,
+) -> dict:
     data = json.dumps(payload).encode("utf-8")
     req = urllib.request.Request(url, data=data, headers=headers, method="POST")
+    if cancel is not None:
+        if cancel.cancelled:
+            raise GroqCancelled("Groq call cancelled")
+        opener = urllib.request.build_opener(_CancellableHTTPHandler(cancel), _CancellableHTTPSHandler(cancel))
+        open_url = opener.open
+    else:
+        open_url = urllib.request.urlopen
+    # Without a call deadline, waiting for a slot is bounded by the HTTP timeout
+    sem = _acquire_outbound(cancel, deadline if deadline is not None else time.monotonic() + timeout)
+    if deadline is not None:
+        timeout = min(timeout, max(deadline - time.monotonic(), 0.001))
+    if cancel is not None:
+        cancel.mark_started()
     try:
-        with urllib.request.urlopen(req, timeout=timeout) as resp:
+        with open_url(req, timeout=timeout) as resp:
             body = resp.read().decode("utf-8")
             return json.loads(body)
     except urllib.error.HTTPError as e:
@@ -41,8 +208,12 @@ def _post_json(url: str, payload: dict, headers: dict, timeout: int = 45) -> dic
         except Exception:
             body = ""
         raise GroqError(body or str(e), status=getattr(e, "code", None)) from e
-    except urllib.error.URLError as e:
+    except (urllib.error.URLError, OSError, http.client.HTTPException) as e:
+        if cancel is not None and cancel.cancelled:
+            raise GroqCancelled("Groq call cancelled") from e
         raise GroqError(str(e), status=None) from e
+    finally:
+        sem.release()
 
 
 def _extract_output_text(data: dict) -> str:
@@ -109,15 +280,320 @@ def _messages_to_responses_input(messages: list[dict]) -> str:
     return "\n\n".join(chunks).strip()
 
 
-def groq_chat_completion(messages: list[dict], temperature: float = 0.2) -> dict:
+# ──────────────────────────────────────────────────────────────────────────────
+# Latency tracking + hedge budget
+# ──────────────────────────────────────────────────────────────────────────────
+
+_LATENCY_WINDOW = 200
+_latencies: dict[str, deque] = {}
+_latency_lock = threading.Lock()
+
+_hedge_lock = threading.Lock()
+_hedge_tokens = 0.0
+_HEDGE_TOKENS_MAX = 10.0
+
+_hedge_pool: ThreadPoolExecutor | None = None
+_hedge_pool_lock = threading.Lock()
+
+
+def _record_latency(model: str, seconds: float) -> None:
+    with _latency_lock:
+        _latencies.setdefault(model, deque(maxlen=_LATENCY_WINDOW)).append(seconds)
+
+
+def model_latency_percentile(model: str, pct: float) -> float | None:
+    """Recent successful-call latency percentile for *model* (None without enough samples)."""
+    min_samples = int(getattr(settings, "GROQ_HEDGE_MIN_SAMPLES", 20))
+    with _latency_lock:
+        samples = sorted(_latencies.get(model) or ())
+    if len(samples) < max(min_samples, 1):
+        return None
+    idx = min(int(round((len(samples) - 1) * pct / 100.0)), len(samples) - 1)
+    return samples[idx]
+
+
+def _hedge_delay(model: str) -> float:
+    pct = float(getattr(settings, "GROQ_HEDGE_PERCENTILE", 95))
+    default = float(getattr(settings, "GROQ_HEDGE_DEFAULT_DELAY", 8.0))
+    floor = float(getattr(settings, "GROQ_HEDGE_MIN_DELAY", 1.0))
+    observed = model_latency_percentile(model, pct)
+    return max(observed if observed is not None else default, floor)
+
+
+def _earn_hedge_budget() -> None:
+    """Every call earns GROQ_HEDGE_MAX_RATE of a hedge: hedges stay <= that share of calls."""
+    global _hedge_tokens
+    rate = float(getattr(settings, "GROQ_HEDGE_MAX_RATE", 0.1))
+    with _hedge_lock:
+        _hedge_tokens = min(_hedge_tokens + rate, _HEDGE_TOKENS_MAX)
+
+
+def _take_hedge_budget() -> bool:
+    global _hedge_tokens
+    with _hedge_lock:
+        if _hedge_tokens >= 1.0:
+            _hedge_tokens -= 1.0
+            return True
+    return False
+
+
+def _get_hedge_pool() -> ThreadPoolExecutor:
+    global _hedge_pool
+    with _hedge_pool_lock:
+        if _hedge_pool is None:
+            # A primary and a hedge per outbound slot: the pool never caps below GROQ_MAX_CONCURRENCY
+            _hedge_pool = ThreadPoolExecutor(
+                max_workers=2 * int(getattr(settings, "GROQ_MAX_CONCURRENCY", 8)),
+                thread_name_prefix="groq-hedge",
+            )
+        return _hedge_pool
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Circuit breaker
+# ──────────────────────────────────────────────────────────────────────────────
+
+_circuit_lock = threading.Lock()
+_circuit_failures = 0
+_circuit_open_until = 0.0
+
+
+def circuit_is_open() -> bool:
+    """True while Groq calls are short-circuited after repeated failures."""
+    with _circuit_lock:
+        return time.monotonic() < _circuit_open_until
+
+
+def _circuit_success() -> None:
+    global _circuit_failures, _circuit_open_until
+    with _circuit_lock:
+        _circuit_failures = 0
+        _circuit_open_until = 0.0
+
+
+def _circuit_failure() -> None:
+    """Count a failed completion; open the circuit past the threshold.
+
+    After the cooldown the next call goes through (half-open): one more failure
+    re-opens the circuit immediately, a success closes it.
+    """
+    global _circuit_failures, _circuit_open_until
+    threshold = int(getattr(settings, "GROQ_CIRCUIT_FAILURE_THRESHOLD", 5))
+    cooldown = float(getattr(settings, "GROQ_CIRCUIT_COOLDOWN", 30))
+    with _circuit_lock:
+        _circuit_failures += 1
+        if _circuit_failures >= threshold:
+            _circuit_open_until = time.monotonic() + cooldown
+            _log.warning("Groq circuit open for %.0fs after %d failures", cooldown, _circuit_failures)
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Completion
+# ──────────────────────────────────────────────────────────────────────────────
+
+def _remaining(deadline: float | None, sent: bool = False) -> float | None:
+    """
+    Seconds left before *deadline* (monotonic), raising once it has passed:
+    GroqDeadlineExceeded while a request is *sent* and unanswered (Groq too
+    slow), GroqDeadlineSpent otherwise.
+    """
+    if deadline is None:
+        return None
+    left = deadline - time.monotonic()
+    if left <= 0:
+        if sent:
+            raise GroqDeadlineExceeded("Groq deadline exceeded", status=504)
+        raise GroqDeadlineSpent("Groq deadline spent before the request", status=504)
+    return left
+
+
+def _http_timeout(deadline: float | None) -> float:
+    left = _remaining(deadline)
+    return 60 if left is None else min(60, left)
+
+def _is_retryable(e: GroqError) -> bool:
+    """Whether the relay should move on to the next model after *e*."""
+    # Retry next model on rate limit / server errors.
+    if e.status in (429, 500, 502, 503, 504):
+        return True
+    # Some free tiers may not have access to a given model.
+    if e.status == 400:
+        msg = (str(e) or "").lower()
+        if "model" in msg or "not_found" in msg or "not found" in msg:
+            return True
+    return False
+
+
+def _call_model(
+    model: str,
+    messages: list[dict],
+    temperature: float,
+    headers: dict,
+    base_url: str,
+    cancel: CancelToken | None = None,
+    deadline: float | None = None,
+) -> dict:
+    """One model, Responses API first then Chat Completions. Returns {content, model, raw}."""
+    started = time.monotonic()
+    # Prefer the Responses API (matches Groq examples) and fall back to Chat Completions.
+    try:
+        url = f"{base_url}/responses"
+        payload = {
+            "model": model,
+            "input": _messages_to_responses_input(messages),
+            "temperature": temperature,
+        }
+        data = _post_json(
+            url, payload, headers=headers, timeout=_http_timeout(deadline), cancel=cancel, deadline=deadline
+        )
+        content = _extract_output_text(data)
+        if content:
+            _record_latency(model, time.monotonic() - started)
+            return {"content": content, "model": model, "raw": data}
+    except GroqError as e:
+        # If the endpoint isn't available or payload isn't accepted, try chat completions.
+        if isinstance(e, (GroqCancelled, GroqDeadlineExceeded)) or e.status not in (400, 404, 405):
+            raise
+        _log.info("Responses API fallback to chat.completions (model=%s status=%s)", model, e.status)
+
+    url = f"{base_url}/chat/completions"
+    payload = {"model": model, "messages": messages, "temperature": temperature}
+    data = _post_json(
+        url, payload, headers=headers, timeout=_http_timeout(deadline), cancel=cancel, deadline=deadline
+    )
+    content = _extract_output_text(data)
+    _record_latency(model, time.monotonic() - started)
+    return {"content": content or "", "model": model, "raw": data}
+
+
+def _min_timeout(*values: float | None) -> float | None:
+    present = [v for v in values if v is not None]
+    return min(present) if present else None
+
+
+_START_POLL = 0.05  # seconds between checks while a call waits for a worker / an outbound slot
+
+
+def _hedge_wait(model: str, token: CancelToken) -> float:
+    """Seconds before *model* is late enough to hedge, counted from when its call started sending."""
+    if token.started_at is None:
+        # Still queued: queueing time must not trigger a hedge
+        return _START_POLL
+    return _hedge_delay(model) - (time.monotonic() - token.started_at)
+
+
+def _hedged_relay(ordered: list[str], call, deadline: float | None = None) -> dict:
+    """
+    Relay over *ordered* models with hedging: when the in-flight model has not
+    answered after its hedge delay (latency percentile, counted from when
+    its request actually started), the next model is raced against it (if
+    the hedge budget allows). First success wins; losers are cancelled.
+    """
+    pool = _get_hedge_pool()
+    in_flight: dict = {}  # future -> (model, CancelToken)
+    next_idx = 0
+    hedged = False
+    last_err: GroqError | None = None
+
+    def _launch() -> None:
+        nonlocal next_idx
+        model = ordered[next_idx]
+        next_idx += 1
+        token = CancelToken()
+        in_flight[pool.submit(call, model, token)] = (model, token)
+
+    def _sent() -> bool:
+        return any(token.started_at is not None for _model, token in in_flight.values())
+
+    def _cancel_all() -> None:
+        for fut, (_model, token) in in_flight.items():
+            token.cancel()
+            fut.cancel()
+        in_flight.clear()
+
+    _launch()
+    try:
+        while in_flight:
+            # At most one hedge in flight next to the primary call.
+            can_hedge = next_idx < len(ordered) and len(in_flight) < 2
+            timeout = None
+            if can_hedge:
+                newest_model, newest_token = list(in_flight.values())[-1]
+                timeout = max(_hedge_wait(newest_model, newest_token), 0)
+            left = _remaining(deadline, _sent())
+            done, _ = wait(list(in_flight), timeout=_min_timeout(timeout, left), return_when=FIRST_COMPLETED)
+
+            if not done:
+                _remaining(deadline, _sent())
+                if can_hedge and _hedge_wait(newest_model, newest_token) > 0:
+                    continue
+                if can_hedge and _take_hedge_budget():
+                    hedged = True
+                    _log.info("Hedging Groq call: %s slow, racing %s", newest_model, ordered[next_idx])
+                    _launch()
+                else:
+                    # No budget: wait for the in-flight call(s) without hedging further.
+                    done, _ = wait(list(in_flight), timeout=_remaining(deadline, _sent()), return_when=FIRST_COMPLETED)
+                if not done:
+                    continue
+
+            for fut in done:
+                model, _token = in_flight.pop(fut)
+                try:
+                    result = fut.result()
+                except GroqError as e:
+                    if isinstance(e, GroqCancelled):
+                        continue
+                    last_err = e
+                    if isinstance(e, GroqDeadlineExceeded) or not _is_retryable(e):
+                        _cancel_all()
+                        raise
+                    if not in_flight and next_idx < len(ordered):
+                        _launch()
+                    continue
+                _cancel_all()
+                result["hedged"] = hedged
+                return result
+    finally:
+        _cancel_all()
+
+    raise last_err or GroqError("Groq call failed")
+
+
+def _counts_as_outage(e: GroqError) -> bool:
+    """Errors that say Groq itself is unhealthy (feed the circuit breaker)."""
+    if isinstance(e, GroqDeadlineSpent):
+        # No request reached Groq (deadline spent in queues, no outbound slot)
+        return False
+    return isinstance(e, GroqDeadlineExceeded) or e.status is None or e.status in (429, 500, 502, 503, 504)
+
+
+def groq_chat_completion(
+    messages: list[dict],
+    temperature: float = 0.2,
+    hedge: bool | None = None,
+    deadline: float | None = None,
+) -> dict:
     """
     Calls Groq Chat Completions with model relay + basic load balancing.
+
+    With hedging (hedge=True, default settings.GROQ_HEDGE_ENABLED) a slow model
+    is raced against the next one in the order once it exceeds its latency
+    percentile; the hedge rate is capped by GROQ_HEDGE_MAX_RATE.
+
+    *deadline* (time.monotonic() value) bounds the whole relay and raises
+    GroqDeadlineExceeded; while the circuit breaker is open, GroqUnavailable
+    is raised without any network call.
+
     Returns: {content, model, usage?}
     """
     api_key = getattr(settings, "GROQ_API_KEY", "") or os.environ.get("GROQ_API_KEY", "")
     if not api_key:
         raise GroqError("Missing GROQ_API_KEY")
 
+    if circuit_is_open():
+        raise GroqUnavailable("Groq circuit open", status=503)
+
     models = list(getattr(settings, "GROQ_MODELS", [])) or [
         "openai/gpt-oss-120b",
         "openai/gpt-oss-20b",
@@ -132,45 +608,60 @@ def groq_chat_completion(messages: list[dict], temperature: float = 0.2) -> dict
         "User-Agent": "EduShare/1.0",
     }
 
+    base_url = _base_url()
     start_idx = _choose_start_model(models)
     ordered = models[start_idx:] + models[:start_idx]
 
+    if hedge is None:
+        hedge = bool(getattr(settings, "GROQ_HEDGE_ENABLED", False))
+
+    try:
+        if hedge and len(ordered) > 1:
+            _earn_hedge_budget()
+            result = _hedged_relay(
+                ordered,
+                lambda model, token: _call_model(
+                    model, messages, temperature, headers, base_url, cancel=token, deadline=deadline
+                ),
+                deadline=deadline,
+            )
+        else:
+            result = _relay(ordered, messages, temperature, headers, base_url, deadline)
+    except GroqError as e:
+        if deadline is not None and time.monotonic() >= deadline and not isinstance(e, GroqDeadlineExceeded):
+            # A socket timeout cut short by the deadline
+            _circuit_failure()
+            raise GroqDeadlineExceeded(str(e) or "Groq deadline exceeded", status=504) from e
+        if _counts_as_outage(e):
+            _circuit_failure()
+        raise
+
+    _circuit_success()
+    return result
+
+
+def _relay(
+    ordered: list[str],
+    messages: list[dict],
+    temperature: float,
+    headers: dict,
+    base_url: str,
+    deadline: float | None,
+) -> dict:
+    """Sequential relay: try each model in order until one answers."""
     last_err: GroqError | None = None
     for model in ordered:
         try:
-            # Prefer the Responses API (matches Groq examples) and fall back to Chat Completions.
-            try:
-                url = "https://api.groq.com/openai/v1/responses"
-                payload = {
-                    "model": model,
-                    "input": _messages_to_responses_input(messages),
-                    "temperature": temperature,
-                }
-                data = _post_json(url, payload, headers=headers, timeout=60)
-                content = _extract_output_text(data)
-                if content:
-                    return {"content": content, "model": model, "raw": data}
-            except GroqError as e:
-                # If the endpoint isn't available or payload isn't accepted, try chat completions.
-                if e.status not in (400, 404, 405):
-                    raise
-                _log.info("Responses API fallback to chat.completions (model=%s status=%s)", model, e.status)
-
-            url = "https://api.groq.com/openai/v1/chat/completions"
-            payload = {"model": model, "messages": messages, "temperature": temperature}
-            data = _post_json(url, payload, headers=headers, timeout=60)
-            content = _extract_output_text(data)
-            return {"content": content or "", "model": model, "raw": data}
+            return _call_model(model, messages, temperature, headers, base_url, deadline=deadline)
+        except GroqDeadlineSpent:
+            # Out of time before the next model: the previous failure is what to report
+            if last_err is None:
+                raise
+            break
         except GroqError as e:
             last_err = e
-            # Retry next model on rate limit / server errors.
-            if e.status in (429, 500, 502, 503, 504):
+            if not isinstance(e, GroqDeadlineExceeded) and _is_retryable(e):
                 continue
-            # Some free tiers may not have access to a given model.
-            if e.status == 400:
-                msg = (str(e) or "").lower()
-                if "model" in msg or "not_found" in msg or "not found" in msg:
-                    continue
             break
 
     raise last_err or GroqError("Groq call failed")
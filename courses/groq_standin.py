@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+"""
+Groq stand-in — local OpenAI-compatible server for offline chat load tests.
+Developed by Marino ATOHOUN.
+
+Mimics the endpoints used by groq_llm:
+  - POST /openai/v1/responses
+  - POST /openai/v1/chat/completions
+  - GET  /openai/v1/models
+
+With configurable latency (base + jitter + long tail, per model), error
+injection (429 / 5xx) and SSE streaming when the payload has "stream": true.
+Point the backend at it with GROQ_BASE_URL=http://127.0.0.1:8787/openai/v1.
+"""
+
+import json
+import logging
+import random
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_log = logging.getLogger("courses.groq_standin")
+
+_PAGE_RE = re.compile(r"\[Page (\d+)\]")
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Configuration
+# ──────────────────────────────────────────────────────────────────────────────
+
+@dataclass
+class StandinConfig:
+    """Behaviour knobs of the stand-in server."""
+    latency_ms: int = 800                 # base latency per call
+    jitter_ms: int = 400                  # uniform jitter added on top
+    tail_rate: float = 0.0                # share of calls hitting the long tail
+    tail_ms: int = 15000                  # extra latency for tail calls
+    model_latency_ms: dict[str, int] = field(default_factory=dict)  # per-model base override
+    rate_429: float = 0.0                 # share of calls answered with 429
+    rate_5xx: float = 0.0                 # share of calls answered with 503
+    disable_responses: bool = False       # answer 404 on /responses (forces fallback)
+    stream_chunk_words: int = 8           # words per SSE delta
+    seed: int | None = None
+
+
+class _Stats:
+    """Thread-safe counters exposed on GET /stats."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.counts: dict[str, int] = {}
+
+    def incr(self, key: str) -> None:
+        with self._lock:
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def snapshot(self) -> dict[str, int]:
+        with self._lock:
+            return dict(self.counts)
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Fake completions
+# ──────────────────────────────────────────────────────────────────────────────
+
+def _prompt_text(payload: dict) -> str:
+    if isinstance(payload.get("input"), str):
+        return payload["input"]
+    parts = []
+    for m in payload.get("messages") or []:
+        if isinstance(m, dict) and isinstance(m.get("content"), str):
+            parts.append(m["content"])
+    return "\n".join(parts)
+
+
+def fake_answer(prompt: str, model: str) -> str:
+    """Deterministic Markdown answer citing the pages present in the prompt."""
+    pages = sorted({int(p) for p in _PAGE_RE.findall(prompt)})
+    cites = ", ".join(f"**(p. {p})**" for p in pages) or "aucune page"
+    return (
+        "## Réponse simulée\n\n"
+        f"Cette réponse est générée localement par le stand-in Groq ({model}). "
+        f"Les passages pertinents se trouvent {cites}.\n\n"
+        "**Sources**\n\n"
+        + ("\n".join(f"- p. {p}" for p in pages) or "- aucune")
+    )
+
+
+def _usage(prompt: str, answer: str) -> dict:
+    prompt_tokens = max(len(prompt) // 4, 1)
+    completion_tokens = max(len(answer) // 4, 1)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "input_tokens": prompt_tokens,
+        "output_tokens": completion_tokens,
+    }
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# HTTP handler
+# ──────────────────────────────────────────────────────────────────────────────
+
+class StandinHandler(BaseHTTPRequestHandler):
+    server_version = "GroqStandin/1.0"
+    protocol_version = "HTTP/1.1"
+
+    # Set by make_server()
+    config: StandinConfig
+    stats: _Stats
+    rng: random.Random
+
+    def log_message(self, fmt, *args):
+        # Route access logs to our logger instead of stderr
+        _log.debug("%s - %s", self.address_string(), fmt % args)
+
+    # ── helpers ───────────────────────────────────────────────────────────────
+    def _send_json(self, status: int, body: dict) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_error(self, status: int, message: str, err_type: str) -> None:
+        self.stats.incr(f"status_{status}")
+        self._send_json(status, {"error": {"message": message, "type": err_type}})
+
+    def _read_payload(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        try:
+            return json.loads(raw.decode("utf-8") or "{}")
+        except ValueError:
+            return {}
+
+    def _sleep_latency(self, model: str) -> None:
+        cfg = self.config
+        with self.server.rng_lock:
+            base = cfg.model_latency_ms.get(model, cfg.latency_ms)
+            delay = base + self.rng.uniform(0, cfg.jitter_ms)
+            if cfg.tail_rate and self.rng.random() < cfg.tail_rate:
+                delay += cfg.tail_ms
+        time.sleep(max(delay, 0) / 1000.0)
+
+    def _injected_error(self) -> int | None:
+        cfg = self.config
+        with self.server.rng_lock:
+            roll = self.rng.random()
+        if roll < cfg.rate_429:
+            return 429
+        if roll < cfg.rate_429 + cfg.rate_5xx:
+            return 503
+        return None
+
+    # ── routes ────────────────────────────────────────────────────────────────
+    def do_GET(self):
+        if self.path.rstrip("/") == "/openai/v1/models":
+            models = sorted(set(self.config.model_latency_ms) | {"openai/gpt-oss-120b"})
+            return self._send_json(200, {"object": "list", "data": [{"id": m, "object": "model"} for m in models]})
+        if self.path.rstrip("/") == "/stats":
+            return self._send_json(200, self.stats.snapshot())
+        return self._send_error(404, "Not found", "not_found")
+
+    def do_POST(self):
+        path = self.path.rstrip("/")
+        if path not in ("/openai/v1/responses", "/openai/v1/chat/completions"):
+            return self._send_error(404, "Not found", "not_found")
+
+        is_responses = path.endswith("/responses")
+        payload = self._read_payload()
+        model = payload.get("model") or ""
+        self.stats.incr(f"calls_{'responses' if is_responses else 'chat'}")
+
+        if is_responses and self.config.disable_responses:
+            return self._send_error(404, "Responses API disabled on stand-in", "not_found")
+        if not model:
+            return self._send_error(400, "model is required", "invalid_request_error")
+
+        self._sleep_latency(model)
+
+        injected = self._injected_error()
+        if injected == 429:
+            return self._send_error(429, "Rate limit reached (stand-in)", "rate_limit_exceeded")
+        if injected:
+            return self._send_error(injected, "Service unavailable (stand-in)", "server_error")
+
+        prompt = _prompt_text(payload)
+        answer = fake_answer(prompt, model)
+        self.stats.incr("status_200")
+
+        if payload.get("stream"):
+            return self._stream(answer, model, is_responses)
+
+        usage = _usage(prompt, answer)
+        if is_responses:
+            body = {
+                "id": f"resp_{uuid.uuid4().hex}",
+                "object": "response",
+                "model": model,
+                "output": [
+                    {
+                        "type": "message",
+                        "role": "assistant",
+                        "content": [{"type": "output_text", "text": answer}],
+                    }
+                ],
+                "usage": usage,
+            }
+        else:
+            body = {
+                "id": f"chatcmpl-{uuid.uuid4().hex}",
+                "object": "chat.completion",
+                "model": model,
+                "choices": [
+                    {"index": 0, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop"}
+                ],
+                "usage": usage,
+            }
+        return self._send_json(200, body)
+
+    def _stream(self, answer: str, model: str, is_responses: bool) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        words = answer.split(" ")
+        step = max(self.config.stream_chunk_words, 1)
+        for i in range(0, len(words), step):
+            piece = " ".join(words[i:i + step]) + (" " if i + step < len(words) else "")
+            if is_responses:
+                event = {"type": "response.output_text.delta", "delta": piece}
+            else:
+                event = {
+                    "object": "chat.completion.chunk",
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+                }
+            self.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            time.sleep(0.02)
+
+        if is_responses:
+            done = {"type": "response.completed", "response": {"model": model, "output_text": answer}}
+            self.wfile.write(f"data: {json.dumps(done)}\n\n".encode("utf-8"))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Public API
+# ──────────────────────────────────────────────────────────────────────────────
+
+def make_server(host: str, port: int, config: StandinConfig) -> ThreadingHTTPServer:
+    """Build (but do not start) a stand-in server bound to host:port."""
+    handler = type(
+        "ConfiguredStandinHandler",
+        (StandinHandler,),
+        {"config": config, "stats": _Stats(), "rng": random.Random(config.seed)},
+    )
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.rng_lock = threading.Lock()
+    return server
@@ -0,0 +1,163 @@
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+# Realistic question mix (short factual, explanation, summary, follow-up style).
+DEFAULT_QUESTIONS = [
+    "Résume ce document en 5 points.",
+    "Quelle est la définition principale donnée dans le cours ?",
+    "Explique la notion la plus importante du chapitre 1.",
+    "Donne un exemple concret tiré du document.",
+    "Quelles sont les formules à retenir ?",
+    "Peux-tu reformuler plus simplement le passage de la page 2 ?",
+    "Quelles questions d'examen pourrait-on poser sur ce cours ?",
+    "Quelle est la différence entre les deux méthodes présentées ?",
+    "Liste les mots-clés du document avec leur définition.",
+    "Explique-moi comme si j'avais 12 ans.",
+]
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def _post_json(url: str, payload: dict, headers: dict, timeout: float) -> tuple[int, dict]:
+    data = json.dumps(payload).encode("utf-8")
+    req = urllib.request.Request(url, data=data, headers=headers, method="POST")
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return resp.status, json.loads(resp.read().decode("utf-8") or "{}")
+    except urllib.error.HTTPError as e:
+        try:
+            body = json.loads(e.read().decode("utf-8") or "{}")
+        except ValueError:
+            body = {}
+        return e.code, body
+
+
+class Command(BaseCommand):
+    help = "Load-test POST /api/documents/<id>/chat/ and report throughput + latency percentiles."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--base-url", default="http://127.0.0.1:8000", help="Backend base URL.")
+        parser.add_argument("--document", required=True, help="Document id (plain or encrypted).")
+        parser.add_argument("--token", default="", help="JWT access token (else --email/--password).")
+        parser.add_argument("--email", default="")
+        parser.add_argument("--password", default="")
+        parser.add_argument("--requests", type=int, default=50, help="Total chat requests.")
+        parser.add_argument("--concurrency", type=int, default=5)
+        parser.add_argument("--questions-file", default="", help="One question per line (else built-in mix).")
+        parser.add_argument(
+            "--follow-up-rate",
+            type=float,
+            default=0.3,
+            help="Share of requests sent with a short history (follow-up questions).",
+        )
+        parser.add_argument("--timeout", type=float, default=120.0)
+        parser.add_argument("--seed", type=int, default=None)
+
+    def _login(self, base_url: str, email: str, password: str, timeout: float) -> str:
+        status, body = _post_json(
+            f"{base_url}/api/auth/login/",
+            {"email": email, "password": password},
+            {"Content-Type": "application/json"},
+            timeout,
+        )
+        if status != 200 or not body.get("access"):
+            raise CommandError(f"Connexion impossible ({status}): {body}")
+        return body["access"]
+
+    def handle(self, *args, **options):
+        base_url = options["base_url"].rstrip("/")
+        timeout = options["timeout"]
+        rng = random.Random(options["seed"])
+
+        token = options["token"]
+        if not token:
+            if not (options["email"] and options["password"]):
+                raise CommandError("Fournir --token ou --email/--password.")
+            token = self._login(base_url, options["email"], options["password"], timeout)
+
+        questions = DEFAULT_QUESTIONS
+        if options["questions_file"]:
+            with open(options["questions_file"], encoding="utf-8") as fh:
+                questions = [line.strip() for line in fh if line.strip()]
+            if not questions:
+                raise CommandError("Fichier de questions vide.")
+
+        url = f"{base_url}/api/documents/{options['document']}/chat/"
+        headers = {
+            "Content-Type": "application/json",
+            "Accept": "application/json",
+            "Authorization": f"Bearer {token}",
+        }
+
+        total = max(options["requests"], 1)
+        plan = []
+        for _ in range(total):
+            question = rng.choice(questions)
+            history = []
+            if rng.random() < options["follow_up_rate"]:
+                history = [
+                    {"role": "user", "content": rng.choice(questions)},
+                    {"role": "assistant", "content": "Réponse précédente (p. 1)."},
+                ]
+            plan.append({"message": question, "history": history})
+
+        latencies: list[float] = []
+        statuses: dict[int, int] = {}
+        models: dict[str, int] = {}
+        lock = threading.Lock()
+
+        def _one(payload: dict) -> None:
+            start = time.monotonic()
+            try:
+                status, body = _post_json(url, payload, headers, timeout)
+            except Exception:
+                status, body = 0, {}
+            elapsed = time.monotonic() - start
+            with lock:
+                latencies.append(elapsed)
+                statuses[status] = statuses.get(status, 0) + 1
+                model = body.get("model") if isinstance(body, dict) else None
+                if model:
+                    models[model] = models.get(model, 0) + 1
+
+        self.stdout.write(f"{total} requêtes, concurrence {options['concurrency']} → {url}")
+        wall_start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=max(options["concurrency"], 1)) as pool:
+            list(pool.map(_one, plan))
+        wall = time.monotonic() - wall_start
+
+        ok = statuses.get(200, 0)
+        self.stdout.write("")
+        self.stdout.write(f"Durée totale   : {wall:.2f}s")
+        self.stdout.write(f"Débit          : {total / wall:.2f} req/s ({ok / wall:.2f} réussies/s)")
+        self.stdout.write(
+            "Latence (s)    : "
+            f"p50={_percentile(latencies, 50):.3f} "
+            f"p90={_percentile(latencies, 90):.3f} "
+            f"p95={_percentile(latencies, 95):.3f} "
+            f"p99={_percentile(latencies, 99):.3f} "
+            f"max={max(latencies):.3f}"
+        )
+        self.stdout.write("Statuts        : " + ", ".join(f"{k}×{v}" for k, v in sorted(statuses.items())))
+        if models:
+            self.stdout.write("Modèles        : " + ", ".join(f"{k}×{v}" for k, v in sorted(models.items())))
+        if ok == total:
+            self.stdout.write(self.style.SUCCESS("Toutes les requêtes ont réussi."))
+        else:
+            self.stdout.write(self.style.WARNING(f"{total - ok} requête(s) en échec."))
@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.groq_standin import StandinConfig, make_server
+
+
+class Command(BaseCommand):
+    help = "Run a local Groq-compatible stand-in server (offline chat load tests)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8787)
+        parser.add_argument("--latency-ms", type=int, default=800, help="Base latency per call.")
+        parser.add_argument("--jitter-ms", type=int, default=400, help="Uniform jitter added to the latency.")
+        parser.add_argument("--tail-rate", type=float, default=0.0, help="Share of calls hitting the long tail (0-1).")
+        parser.add_argument("--tail-ms", type=int, default=15000, help="Extra latency for long-tail calls.")
+        parser.add_argument(
+            "--model-latency",
+            action="append",
+            default=[],
+            metavar="MODEL=MS",
+            help="Per-model base latency override (repeatable).",
+        )
+        parser.add_argument("--rate-429", type=float, default=0.0, help="Share of calls answered with 429 (0-1).")
+        parser.add_argument("--rate-5xx", type=float, default=0.0, help="Share of calls answered with 503 (0-1).")
+        parser.add_argument(
+            "--disable-responses",
+            action="store_true",
+            help="Answer 404 on /responses to exercise the chat.completions fallback.",
+        )
+        parser.add_argument("--seed", type=int, default=None, help="Random seed (reproducible runs).")
+
+    def handle(self, *args, **options):
+        model_latency = {}
+        for item in options["model_latency"]:
+            model, sep, ms = item.rpartition("=")
+            if not sep or not model or not ms.isdigit():
+                raise CommandError(f"--model-latency attend MODEL=MS, reçu: {item!r}")
+            model_latency[model] = int(ms)
+
+        config = StandinConfig(
+            latency_ms=options["latency_ms"],
+            jitter_ms=options["jitter_ms"],
+            tail_rate=options["tail_rate"],
+            tail_ms=options["tail_ms"],
+            model_latency_ms=model_latency,
+            rate_429=options["rate_429"],
+            rate_5xx=options["rate_5xx"],
+            disable_responses=options["disable_responses"],
+            seed=options["seed"],
+        )
+        server = make_server(options["host"], options["port"], config)
+        base_url = f"http://{options['host']}:{options['port']}/openai/v1"
+        self.stdout.write(self.style.SUCCESS(f"Groq stand-in prêt sur {base_url}"))
+        self.stdout.write(f"Lancer le backend avec GROQ_BASE_URL={base_url} GROQ_API_KEY=standin")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
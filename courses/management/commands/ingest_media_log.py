@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.signed_media import ingest, read_new_lines, save_state
+
+
+class Command(BaseCommand):
+    help = "Count the PDF transfers served by nginx from signed URLs (edushare_media access log, cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("log_file", help="nginx log written with the edushare_media format")
+        parser.add_argument(
+            "--state-file",
+            help="Where the position already read is kept (default: <log_file>.pos)",
+        )
+
+    def handle(self, *args, **options):
+        log_file = options["log_file"]
+        state_file = options["state_file"] or f"{log_file}.pos"
+        try:
+            lines, state = read_new_lines(log_file, state_file)
+        except OSError as exc:
+            raise CommandError(f"Lecture impossible de {log_file} : {exc}") from exc
+
+        downloads, events = ingest(lines)
+        save_state(state_file, state)
+        self.stdout.write(
+            self.style.SUCCESS(f"{len(lines)} lignes lues, {downloads} téléchargements, {events} événements.")
+        )
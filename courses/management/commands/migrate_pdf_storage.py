@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from courses.models import PDFDocument, PdfBlob
+from courses.storage import blob_name, file_digest, pdf_storage
+
+
+class Command(BaseCommand):
+    help = "Move legacy PDFs (pdfs/<domain>/<file>) to content-addressed storage, deduplicating identical files."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Report without moving anything")
+
+    def handle(self, *args, **options):
+        storage = pdf_storage()
+        moved = shared = missing = freed = 0
+        seen = set()
+
+        for document in PDFDocument.objects.filter(blob__isnull=True).exclude(pdf_file="").iterator():
+            old_name = document.pdf_file.name
+            if not storage.exists(old_name):
+                missing += 1
+                continue
+            with storage.open(old_name, "rb") as content:
+                digest = file_digest(content)
+                size = content.size
+                is_new = digest not in seen and not storage.exists(blob_name(digest))
+                seen.add(digest)
+                if options["dry_run"]:
+                    moved += 1
+                    shared += not is_new
+                    freed += size if not is_new else 0
+                    continue
+                if is_new:
+                    storage.save(blob_name(digest), content)
+
+            with transaction.atomic():
+                PdfBlob.objects.get_or_create(sha256=digest, defaults={"size": size})
+                PDFDocument.objects.filter(pk=document.pk).update(blob_id=digest, pdf_file=blob_name(digest))
+            moved += 1
+            if not is_new:
+                shared += 1
+                freed += size
+            # Legacy files are per-document unless copied by hand: keep any still referenced
+            if not PDFDocument.objects.filter(pdf_file=old_name).exists():
+                storage.delete(old_name)
+
+        verb = "à migrer" if options["dry_run"] else "migré(s)"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{moved} document(s) {verb}, {shared} doublon(s) dédupliqué(s) "
+                f"({freed / (1024 * 1024):.1f} Mo libérés), {missing} fichier(s) introuvable(s)."
+            )
+        )
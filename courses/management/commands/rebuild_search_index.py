@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from courses import search_index
+from courses.models import PDFDocument
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index of documents (FTS5 / tsvector)."
+
+    def handle(self, *args, **options):
+        if not search_index.is_supported():
+            self.stdout.write(self.style.WARNING(f"Base {connection.vendor} : pas d'index plein texte (recherche icontains)."))
+            return
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(f"DELETE FROM {search_index.TABLE}")
+            count = search_index.reindex_documents(PDFDocument.objects.all())
+        self.stdout.write(self.style.SUCCESS(f"{count} document(s) indexé(s)."))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from courses.platform_stats import reconcile
+
+
+class Command(BaseCommand):
+    help = "Recompute the platform statistics counters from the real aggregates (cron)."
+
+    def handle(self, *args, **options):
+        stats = reconcile()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Statistiques recalculées : {stats.total_documents} documents, {stats.total_courses} cours, "
+                f"{stats.total_users} utilisateurs, {stats.total_downloads} téléchargements."
+            )
+        )
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from courses.response_cache import cache_metrics, reset_metrics
+
+
+class Command(BaseCommand):
+    help = "Show the hit rate of the public response cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true", help="Reset the counters after printing them.")
+
+    def handle(self, *args, **options):
+        metrics = cache_metrics()
+        self.stdout.write(
+            f"Hits: {metrics['hit']}  304: {metrics['not_modified']}  Misses: {metrics['miss']}  "
+            f"Taux de succès: {metrics['hit_rate']:.1%}"
+        )
+        if options["reset"]:
+            reset_metrics()
+            self.stdout.write(self.style.SUCCESS("Compteurs remis à zéro."))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from courses.document_events import rollup
+
+
+class Command(BaseCommand):
+    help = "Roll up download/preview events into daily stats and recompute trending scores (cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=2,
+            help="Number of recent days to recompute from the raw events (default: 2)",
+        )
+
+    def handle(self, *args, **options):
+        result = rollup(days=max(1, options["days"]))
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{result['daily_rows']} lignes journalières, {result['trending']} scores tendance, "
+                f"{result['pruned_events']} événements purgés."
+            )
+        )
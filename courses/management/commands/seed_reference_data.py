@@ -87,6 +87,7 @@ REFERENCE_API_PLANS = [
         "price_cents": 0,
         "daily_requests_limit": 500,
         "daily_download_limit": 50,
+        "daily_text_limit": 200,
         "max_page_size": 100,
     },
     {
@@ -97,6 +98,7 @@ REFERENCE_API_PLANS = [
         "price_cents": 990,
         "daily_requests_limit": 5000,
         "daily_download_limit": 500,
+        "daily_text_limit": 2000,
         "max_page_size": 500,
     },
     {
@@ -107,6 +109,7 @@ REFERENCE_API_PLANS = [
         "price_cents": 9900,
         "daily_requests_limit": 5000,
         "daily_download_limit": 500,
+        "daily_text_limit": 2000,
         "max_page_size": 500,
     },
     {
@@ -117,6 +120,7 @@ REFERENCE_API_PLANS = [
         "price_cents": 4990,
         "daily_requests_limit": 50000,
         "daily_download_limit": 5000,
+        "daily_text_limit": 20000,
         "max_page_size": 1000,
     },
     {
@@ -127,6 +131,7 @@ REFERENCE_API_PLANS = [
         "price_cents": 49900,
         "daily_requests_limit": 50000,
         "daily_download_limit": 5000,
+        "daily_text_limit": 20000,
         "max_page_size": 1000,
     },
 ]
@@ -228,6 +233,7 @@ class Command(BaseCommand):
                     "price_cents": plan_item["price_cents"],
                     "daily_requests_limit": plan_item["daily_requests_limit"],
                     "daily_download_limit": plan_item["daily_download_limit"],
+                    "daily_text_limit": plan_item["daily_text_limit"],
                     "max_page_size": plan_item["max_page_size"],
                     "is_active": True,
                 },
@@ -245,6 +251,7 @@ class Command(BaseCommand):
                     "price_cents",
                     "daily_requests_limit",
                     "daily_download_limit",
+                    "daily_text_limit",
                     "max_page_size",
                 ]:
                     if getattr(plan, k) != plan_item[k]:
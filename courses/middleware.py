@@ -14,6 +14,7 @@ class UserActivityMiddleware:
         
         # After response is generated, record activity if user is authenticated
         # We do it after to ensure authentication middleware has run
+        # (only queued here: geolocation and insert happen in a background worker)
         if hasattr(request, 'user') and request.user.is_authenticated:
             try:
                 record_user_activity(request.user, request)
@@ -0,0 +1,24 @@
+from django.db import migrations
+
+from courses import search_index
+
+
+def create_index(apps, schema_editor):
+    search_index.create_schema(schema_editor)
+    PDFDocument = apps.get_model("courses", "PDFDocument")
+    search_index.reindex_documents(PDFDocument.objects.all())
+
+
+def drop_index(apps, schema_editor):
+    search_index.drop_schema(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0015_chat_conversations'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
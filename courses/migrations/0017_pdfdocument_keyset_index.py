@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0016_document_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pdfdocument',
+            index=models.Index(fields=['is_active', '-created_at', '-id'], name='pdfdoc_active_created_idx'),
+        ),
+    ]
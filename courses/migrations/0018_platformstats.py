@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0017_pdfdocument_keyset_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlatformStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_documents', models.PositiveIntegerField(default=0)),
+                ('total_courses', models.PositiveIntegerField(default=0)),
+                ('total_users', models.PositiveIntegerField(default=0)),
+                ('total_downloads', models.PositiveBigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('reconciled_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Statistiques de la plateforme',
+                'verbose_name_plural': 'Statistiques de la plateforme',
+            },
+        ),
+    ]
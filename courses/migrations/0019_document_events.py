@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0018_platformstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('download', 'Téléchargement'), ('preview', 'Prévisualisation')], max_length=10)),
+                ('created_at', models.DateTimeField(db_index=True)),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='courses.pdfdocument')),
+            ],
+            options={
+                'verbose_name': 'Événement document',
+                'verbose_name_plural': 'Événements documents',
+            },
+        ),
+        migrations.CreateModel(
+            name='DocumentDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(db_index=True)),
+                ('downloads', models.PositiveIntegerField(default=0)),
+                ('previews', models.PositiveIntegerField(default=0)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_document_stats', to='courses.course')),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='courses.pdfdocument')),
+            ],
+            options={
+                'verbose_name': 'Statistiques document (jour)',
+                'verbose_name_plural': 'Statistiques documents (jour)',
+                'indexes': [models.Index(fields=['course', 'date'], name='docdaily_course_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('document', 'date'), name='uniq_document_date')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DocumentTrendingScore',
+            fields=[
+                ('document', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trending', serialize=False, to='courses.pdfdocument')),
+                ('score', models.FloatField()),
+                ('computed_at', models.DateTimeField()),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='courses.course')),
+            ],
+            options={
+                'verbose_name': 'Score tendance',
+                'verbose_name_plural': 'Scores tendance',
+                'indexes': [models.Index(fields=['-score'], name='trending_score_idx'), models.Index(fields=['course', '-score'], name='trending_course_score_idx')],
+            },
+        ),
+    ]
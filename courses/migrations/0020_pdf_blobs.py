@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:37
+
+import courses.models
+import courses.storage
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0019_document_events'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PdfBlob',
+            fields=[
+                ('sha256', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('size', models.PositiveBigIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Fichier PDF stocké',
+                'verbose_name_plural': 'Fichiers PDF stockés',
+            },
+        ),
+        migrations.AlterField(
+            model_name='pdfdocument',
+            name='pdf_file',
+            field=models.FileField(storage=courses.storage.pdf_storage, upload_to=courses.models.pdf_upload_path, validators=[django.core.validators.FileExtensionValidator(allowed_extensions=['pdf'])], verbose_name='Fichier PDF'),
+        ),
+        migrations.AddField(
+            model_name='pdfdocument',
+            name='blob',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='documents', to='courses.pdfblob'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0020_pdf_blobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='apiplan',
+            name='daily_text_limit',
+            field=models.PositiveIntegerField(default=200, verbose_name='Limite textes extraits/jour'),
+        ),
+        migrations.AddField(
+            model_name='apiusagedaily',
+            name='texts_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:10
+
+import courses.models
+import courses.storage
+import django.core.validators
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0021_api_text_quota'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='pdfdocument',
+            name='pdf_file',
+            field=courses.models.PdfFileField(storage=courses.storage.pdf_storage, upload_to=courses.models.pdf_upload_path, validators=[django.core.validators.FileExtensionValidator(allowed_extensions=['pdf'])], verbose_name='Fichier PDF'),
+        ),
+    ]
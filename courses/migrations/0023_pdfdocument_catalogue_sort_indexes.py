@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:37
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0022_pdf_file_content_addressed'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pdfdocument',
+            index=models.Index(fields=['is_active', '-download_count', '-id'], name='pdfdoc_active_popular_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pdfdocument',
+            index=models.Index(fields=['is_active', 'title', 'id'], name='pdfdoc_active_title_idx'),
+        ),
+    ]
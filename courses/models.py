@@ -4,20 +4,52 @@ Models for PDF Course Sharing Platform
 Developed by Marino ATOHOUN
 """
 
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.core.validators import FileExtensionValidator
+from django.db.models.fields.files import FieldFile
 import os
 import hashlib
 import secrets
+import uuid
 from django.utils import timezone
 
+from courses.storage import blob_name, file_digest, pdf_storage
+from courses.thumbnails import delete_images, schedule_thumbnails
+
 
 def pdf_upload_path(instance, filename):
-    """Generate upload path for PDF files"""
+    """Generate upload path for PDF files (content-addressed once the blob is known)"""
+    if instance.blob_id:
+        return blob_name(instance.blob_id)
     return f'pdfs/{instance.course.domain}/{filename}'
 
 
+class PdfFieldFile(FieldFile):
+    """
+    Stores every new PDF under its digest, whatever the path: model save
+    (pre_save), document.pdf_file.save(…), admin or management commands.
+    """
+
+    def save(self, name, content, save=True):
+        digest = file_digest(content)
+        document = self.instance
+        previous = None
+        if document.pk:
+            previous = type(document).objects.filter(pk=document.pk).values_list("blob_id", flat=True).first()
+        with transaction.atomic():
+            # Row lock until the document references the blob: a concurrent release() cannot drop it
+            PdfBlob.objects.select_for_update().get_or_create(sha256=digest, defaults={"size": content.size})
+            document.blob_id = digest
+            # Picked up by PDFDocument.save: thumbnails, release of the replaced blob
+            document._stored_blob = previous
+            super().save(name, content, save)
+
+
+class PdfFileField(models.FileField):
+    attr_class = PdfFieldFile
+
+
 class Course(models.Model):
     """Model for course categories/domains"""
     name = models.CharField(max_length=200, verbose_name="Nom du cours")
@@ -104,6 +136,7 @@ class APIPlan(models.Model):
     # Quotas
     daily_requests_limit = models.PositiveIntegerField(default=500, verbose_name="Limite requêtes/jour")
     daily_download_limit = models.PositiveIntegerField(default=50, verbose_name="Limite téléchargements/jour")
+    daily_text_limit = models.PositiveIntegerField(default=200, verbose_name="Limite textes extraits/jour")
     max_page_size = models.PositiveIntegerField(default=100, verbose_name="Taille max page")
 
     created_at = models.DateTimeField(auto_now_add=True)
@@ -206,6 +239,7 @@ class APIUsageDaily(models.Model):
     date = models.DateField(db_index=True)
     requests_count = models.PositiveIntegerField(default=0)
     downloads_count = models.PositiveIntegerField(default=0)
+    texts_count = models.PositiveIntegerField(default=0)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
@@ -216,6 +250,39 @@ class APIUsageDaily(models.Model):
         ]
 
 
+class PdfBlob(models.Model):
+    """One stored PDF content (content-addressed), shared by every document with identical bytes."""
+
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    size = models.PositiveBigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Fichier PDF stocké"
+        verbose_name_plural = "Fichiers PDF stockés"
+
+    def __str__(self):
+        return self.sha256
+
+    @property
+    def name(self):
+        return blob_name(self.sha256)
+
+    @classmethod
+    def release(cls, sha256):
+        """Drop a blob (row and file) once no document references it any more."""
+        with transaction.atomic():
+            blob = cls.objects.select_for_update().filter(pk=sha256).first()
+            if blob is None or PDFDocument.objects.filter(blob_id=sha256).exists():
+                return False
+            name = blob.name
+            blob.delete()
+            # Still under the row lock: a document saving the same content waits, then writes the file again
+            pdf_storage().delete(name)
+            delete_images(sha256)
+        return True
+
+
 class PDFDocument(models.Model):
     """Model for PDF documents"""
     title = models.CharField(max_length=300, verbose_name="Titre")
@@ -232,11 +299,15 @@ class PDFDocument(models.Model):
     )
     tags = models.ManyToManyField(Tag, blank=True, related_name="documents", verbose_name="Tags")
 
-    pdf_file = models.FileField(
+    pdf_file = PdfFileField(
         upload_to=pdf_upload_path,
+        storage=pdf_storage,
         validators=[FileExtensionValidator(allowed_extensions=['pdf'])],
         verbose_name="Fichier PDF"
     )
+    blob = models.ForeignKey(
+        PdfBlob, on_delete=models.PROTECT, null=True, blank=True, related_name="documents", editable=False
+    )
     file_size = models.PositiveIntegerField(default=0, verbose_name="Taille du fichier (bytes)")
     download_count = models.PositiveIntegerField(default=0, verbose_name="Nombre de téléchargements")
     created_at = models.DateTimeField(auto_now_add=True)
@@ -247,6 +318,13 @@ class PDFDocument(models.Model):
         verbose_name = "Document PDF"
         verbose_name_plural = "Documents PDF"
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination of the listings: WHERE is_active ORDER BY created_at DESC, id DESC
+            models.Index(fields=["is_active", "-created_at", "-id"], name="pdfdoc_active_created_idx"),
+            # Catalogue sorted by popularity / title (?sort=popular, ?sort=title)
+            models.Index(fields=["is_active", "-download_count", "-id"], name="pdfdoc_active_popular_idx"),
+            models.Index(fields=["is_active", "title", "id"], name="pdfdoc_active_title_idx"),
+        ]
 
     def __str__(self):
         return self.title
@@ -254,7 +332,16 @@ class PDFDocument(models.Model):
     def save(self, *args, **kwargs):
         if self.pdf_file:
             self.file_size = self.pdf_file.size
-        super().save(*args, **kwargs)
+        # New files are stored under their digest by PdfFieldFile.save (pre_save),
+        # inside this transaction so the blob stays locked until the row is written
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+        if "_stored_blob" not in self.__dict__:
+            return
+        previous = self.__dict__.pop("_stored_blob")
+        if previous and previous != self.blob_id:
+            PdfBlob.release(previous)
+        schedule_thumbnails(self)
 
     @property
     def file_size_mb(self):
@@ -262,9 +349,10 @@ class PDFDocument(models.Model):
         return round(self.file_size / (1024 * 1024), 2)
 
     def increment_download_count(self):
-        """Increment download counter"""
-        self.download_count += 1
-        self.save(update_fields=['download_count'])
+        """Increment download counter (buffered atomic increment, see courses.download_counters)"""
+        from courses.download_counters import record_download
+
+        record_download(self.pk)
 
 
 class PDFDocumentText(models.Model):
@@ -282,6 +370,129 @@ class PDFDocumentText(models.Model):
         verbose_name_plural = "Textes PDF (cache)"
 
 
+class ChatConversation(models.Model):
+    """Server-side chat session with a document (recent turns + rolling memo)."""
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="chat_conversations")
+    document = models.ForeignKey(PDFDocument, on_delete=models.CASCADE, related_name="chat_conversations")
+
+    summary = models.TextField(blank=True, default="")  # compact memo of older turns
+    summarized_count = models.PositiveIntegerField(default=0)  # messages folded into the memo
+    last_chunk_ids = models.JSONField(default=list, blank=True)  # chunks retrieved for the last turn
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Conversation (chat)"
+        verbose_name_plural = "Conversations (chat)"
+        ordering = ["-updated_at"]
+
+
+class ChatMessage(models.Model):
+    """One message of a ChatConversation."""
+
+    ROLE_USER = "user"
+    ROLE_ASSISTANT = "assistant"
+    ROLE_CHOICES = [
+        (ROLE_USER, "Utilisateur"),
+        (ROLE_ASSISTANT, "Assistant"),
+    ]
+
+    conversation = models.ForeignKey(ChatConversation, on_delete=models.CASCADE, related_name="messages")
+    role = models.CharField(max_length=16, choices=ROLE_CHOICES)
+    content = models.TextField()
+    sources = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Message (chat)"
+        verbose_name_plural = "Messages (chat)"
+        ordering = ["created_at", "id"]
+
+
+class PlatformStats(models.Model):
+    """
+    Single-row platform counters for /api/stats/, kept up to date by signals
+    (F() increments) and periodically reconciled against real aggregates.
+    """
+
+    SINGLETON_ID = 1
+
+    total_documents = models.PositiveIntegerField(default=0)
+    total_courses = models.PositiveIntegerField(default=0)
+    total_users = models.PositiveIntegerField(default=0)
+    total_downloads = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    reconciled_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Statistiques de la plateforme"
+        verbose_name_plural = "Statistiques de la plateforme"
+
+    def __str__(self):
+        return f"{self.total_documents} documents, {self.total_downloads} téléchargements"
+
+
+class DocumentEvent(models.Model):
+    """Append-only download / preview log (written in batches, see courses.document_events)."""
+
+    DOWNLOAD = "download"
+    PREVIEW = "preview"
+    KINDS = [
+        (DOWNLOAD, "Téléchargement"),
+        (PREVIEW, "Prévisualisation"),
+    ]
+
+    document = models.ForeignKey(PDFDocument, on_delete=models.CASCADE, related_name="events")
+    kind = models.CharField(max_length=10, choices=KINDS)
+    created_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        verbose_name = "Événement document"
+        verbose_name_plural = "Événements documents"
+
+
+class DocumentDailyStats(models.Model):
+    """Daily downloads / previews per document (rollup of DocumentEvent; per course = GROUP BY course)."""
+
+    document = models.ForeignKey(PDFDocument, on_delete=models.CASCADE, related_name="daily_stats")
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name="daily_document_stats")
+    date = models.DateField(db_index=True)
+    downloads = models.PositiveIntegerField(default=0)
+    previews = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Statistiques document (jour)"
+        verbose_name_plural = "Statistiques documents (jour)"
+        constraints = [
+            models.UniqueConstraint(fields=["document", "date"], name="uniq_document_date"),
+        ]
+        indexes = [
+            models.Index(fields=["course", "date"], name="docdaily_course_date_idx"),
+        ]
+
+
+class DocumentTrendingScore(models.Model):
+    """Precomputed time-decayed popularity, recomputed by the rollup job."""
+
+    document = models.OneToOneField(
+        PDFDocument, on_delete=models.CASCADE, primary_key=True, related_name="trending"
+    )
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name="+")
+    score = models.FloatField()
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "Score tendance"
+        verbose_name_plural = "Scores tendance"
+        indexes = [
+            models.Index(fields=["-score"], name="trending_score_idx"),
+            models.Index(fields=["course", "-score"], name="trending_course_score_idx"),
+        ]
+
+
 class UserProfile(models.Model):
     """Extended user profile"""
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
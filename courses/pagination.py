@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+Keyset pagination — constant-time pages on the queryset's own ordering.
+Developed by Marino ATOHOUN.
+
+The cursor is an opaque token holding the ordering values of the last row
+of the page; the next page is a `WHERE (k1, k2, …) < (v1, v2, …)` seek on an
+index instead of an OFFSET, so page 500 costs the same as page 1. No COUNT.
+"""
+
+import base64
+import datetime
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class _CursorEncoder(DjangoJSONEncoder):
+    """DjangoJSONEncoder cuts datetimes to milliseconds: rows of the same millisecond would be skipped."""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def _encode_cursor(values: list) -> str:
+    raw = json.dumps(values, cls=_CursorEncoder, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(token: str) -> list:
+    padded = token + "=" * (-len(token) % 4)
+    values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8"))
+    if not isinstance(values, list):
+        raise ValueError("cursor must be a list")
+    return values
+
+
+class KeysetPagination(BasePagination):
+    """
+    Forward keyset pagination on the queryset ordering (which must end with a
+    unique key, e.g. ("-created_at", "-id")).
+
+    Response: {"next": url | null, "results": […]}.
+    """
+
+    page_size = 50
+    max_page_size = 100
+    page_size_query_param = "page_size"
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Curseur invalide."
+
+    def get_page_size(self, request) -> int:
+        try:
+            size = int(request.query_params.get(self.page_size_query_param) or self.page_size)
+        except (TypeError, ValueError):
+            size = self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def _ordering(self, queryset) -> list[str]:
+        ordering = list(queryset.query.order_by) or list(queryset.model._meta.ordering)
+        if not ordering or ordering[-1].lstrip("-") not in ("id", "pk"):
+            ordering.append("-id")
+        return ordering
+
+    def _to_python(self, queryset, name: str, value):
+        try:
+            return queryset.model._meta.get_field(name).to_python(value)
+        except FieldDoesNotExist:
+            # Annotation (e.g. search_rank)
+            return value
+
+    def _seek(self, queryset, ordering: list[str], values: list) -> Q:
+        """Rows strictly after *values* in *ordering*: OR of progressively longer equal prefixes."""
+        condition = Q()
+        for i, field in enumerate(ordering):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            term = Q(**{f"{name}__{lookup}": values[i]})
+            for prev_field, prev_value in zip(ordering[:i], values[:i]):
+                term &= Q(**{prev_field.lstrip("-"): prev_value})
+            condition |= term
+        return condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size_value = self.get_page_size(request)
+        ordering = self._ordering(queryset)
+        queryset = queryset.order_by(*ordering)
+
+        token = request.query_params.get(self.cursor_query_param)
+        if token:
+            try:
+                raw = _decode_cursor(token)
+                if len(raw) != len(ordering):
+                    raise ValueError("cursor/ordering mismatch")
+                values = [self._to_python(queryset, f.lstrip("-"), v) for f, v in zip(ordering, raw)]
+            except (ValueError, TypeError, UnicodeDecodeError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+            queryset = queryset.filter(self._seek(queryset, ordering, values))
+
+        rows = list(queryset[: self.page_size_value + 1])
+        self.has_next = len(rows) > self.page_size_value
+        rows = rows[: self.page_size_value]
+        self.next_cursor = None
+        if self.has_next and rows:
+            last = rows[-1]
+            self.next_cursor = _encode_cursor([getattr(last, f.lstrip("-")) for f in ordering])
+        return rows
+
+    def get_next_link(self) -> str | None:
+        if not self.next_cursor:
+            return None
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, "page")
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Platform statistics — single-row counters behind /api/stats/.
+Developed by Marino ATOHOUN.
+
+Counters move with atomic F() increments from courses.signals (upload,
+deactivation/deletion, download, registration) and are periodically
+reconciled against the real aggregates (reconcile_stats command, or lazily
+when the last reconciliation is older than STATS_RECONCILE_SECONDS).
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import F, Sum
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from courses.models import Course, PDFDocument, PlatformStats
+
+DEFAULT_RECONCILE_SECONDS = 6 * 3600
+
+FIELDS = ("total_documents", "total_courses", "total_users", "total_downloads")
+
+
+def bump(**deltas: int) -> None:
+    """
+    Apply counter deltas (e.g. bump(total_documents=1)) in a single UPDATE.
+    Decrements stop at 0: a drifted counter must not make the delete fail.
+    """
+    changes = {
+        field: F(field) + delta if delta > 0 else Greatest(F(field) + delta, 0)
+        for field, delta in deltas.items()
+        if delta
+    }
+    if not changes:
+        return
+    updated = PlatformStats.objects.filter(pk=PlatformStats.SINGLETON_ID).update(**changes)
+    if not updated:
+        # No row yet: the reconciliation counts the change we were applying
+        reconcile()
+
+
+def record_download(count: int = 1) -> None:
+    bump(total_downloads=count)
+
+
+def document_deltas(download_count: int, sign: int) -> dict:
+    """Counter deltas for an active document appearing (+1) or disappearing (-1)."""
+    return {"total_documents": sign, "total_downloads": sign * download_count}
+
+
+@transaction.atomic
+def reconcile() -> PlatformStats:
+    """Recompute every counter from the source tables."""
+    active = PDFDocument.objects.filter(is_active=True)
+    values = {
+        "total_documents": active.count(),
+        "total_courses": Course.objects.count(),
+        "total_users": User.objects.count(),
+        "total_downloads": active.aggregate(n=Sum("download_count"))["n"] or 0,
+        "reconciled_at": timezone.now(),
+    }
+    stats, _ = PlatformStats.objects.select_for_update().update_or_create(
+        pk=PlatformStats.SINGLETON_ID, defaults=values
+    )
+    return stats
+
+
+def get_stats() -> PlatformStats:
+    """The counters row (one query), reconciled first when missing or stale."""
+    stats = PlatformStats.objects.filter(pk=PlatformStats.SINGLETON_ID).first()
+    max_age = int(getattr(settings, "STATS_RECONCILE_SECONDS", DEFAULT_RECONCILE_SECONDS))
+    if stats is None or stats.reconciled_at is None or stats.reconciled_at < timezone.now() - timedelta(seconds=max_age):
+        stats = reconcile()
+    return stats
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""
+Prompt Packer — token-budget-aware assembly of the chat prompt.
+Developed by Marino ATOHOUN.
+
+Implements:
+  - Cheap token estimation (no tokenizer dependency)
+  - Per-model prompt budgets (settings.GROQ_PROMPT_TOKEN_BUDGETS)
+  - Priority filling: question → best chunks → most recent history
+  - Merging of adjacent overlapping chunks from the same page
+"""
+
+import math
+from collections.abc import Callable
+from dataclasses import dataclass, field
+
+from django.conf import settings
+
+from courses.rag_engine import CHUNK_OVERLAP_WORDS, Chunk
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Configuration
+# ──────────────────────────────────────────────────────────────────────────────
+
+CHARS_PER_TOKEN = 3.5           # conservative average for French/English text
+MESSAGE_OVERHEAD_TOKENS = 4     # role + separators per chat message
+DEFAULT_PROMPT_TOKEN_BUDGET = 6000
+MAX_HISTORY_MESSAGES = 8        # hard cap, even if the budget allows more
+
+CONTEXT_SEPARATOR = "\n\n---\n\n"
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Token estimation
+# ──────────────────────────────────────────────────────────────────────────────
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for *text* (over-estimates slightly on purpose)."""
+    if not text:
+        return 0
+    return int(math.ceil(len(text) / CHARS_PER_TOKEN))
+
+
+def estimate_message_tokens(message: dict) -> int:
+    """Token estimate for one OpenAI-style chat message."""
+    return estimate_tokens(message.get("content") or "") + MESSAGE_OVERHEAD_TOKENS
+
+
+def prompt_token_budget(model: str | None = None) -> int:
+    """
+    Return the prompt token budget for *model*.
+
+    When no model is given (the relay picks it later), the smallest budget of
+    the configured models is used so the prompt fits whichever one answers.
+    """
+    budgets: dict = getattr(settings, "GROQ_PROMPT_TOKEN_BUDGETS", {}) or {}
+    default = int(getattr(settings, "GROQ_PROMPT_TOKEN_BUDGET", DEFAULT_PROMPT_TOKEN_BUDGET))
+
+    if model:
+        return int(budgets.get(model, default))
+
+    models = list(getattr(settings, "GROQ_MODELS", []) or [])
+    if not models:
+        return default
+    return min(int(budgets.get(m, default)) for m in models)
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Chunk merging
+# ──────────────────────────────────────────────────────────────────────────────
+
+@dataclass
+class ContextBlock:
+    """One block of the context section (one or more merged chunks)."""
+    page: int
+    text: str
+    chunks: list[Chunk] = field(default_factory=list)
+
+    def render(self) -> str:
+        return f"[Page {self.page}]\n{self.text}"
+
+
+def _strip_overlap(previous: str, following: str) -> str:
+    """
+    Remove from *following* the words it repeats from the end of *previous*
+    (the CHUNK_OVERLAP_WORDS window emitted by build_chunks).
+    """
+    prev_words = previous.split()
+    next_words = following.split()
+    max_k = min(CHUNK_OVERLAP_WORDS, len(prev_words), len(next_words))
+    for k in range(max_k, 0, -1):
+        if prev_words[-k:] == next_words[:k]:
+            prefix = " ".join(next_words[:k])
+            if following.startswith(prefix):
+                return following[len(prefix):].lstrip()
+            return " ".join(next_words[k:])
+    return following
+
+
+def merge_adjacent_chunks(chunks: list[Chunk]) -> list[ContextBlock]:
+    """
+    Group chunks into context blocks, merging consecutive chunks of the same
+    page so their shared overlap is only sent once. Output is in page order.
+    """
+    blocks: list[ContextBlock] = []
+    for chunk in sorted(chunks, key=lambda c: (c.page, c.chunk_id)):
+        last = blocks[-1] if blocks else None
+        if last and last.page == chunk.page and last.chunks[-1].chunk_id == chunk.chunk_id - 1:
+            rest = _strip_overlap(last.chunks[-1].text, chunk.text)
+            if rest:
+                last.text = f"{last.text} {rest}"
+            last.chunks.append(chunk)
+            continue
+        blocks.append(ContextBlock(page=chunk.page, text=chunk.text, chunks=[chunk]))
+    return blocks
+
+
+def render_context(chunks: list[Chunk]) -> str:
+    """Format chunks as the [Page X] context section of the user message."""
+    return CONTEXT_SEPARATOR.join(b.render() for b in merge_adjacent_chunks(chunks))
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Packing
+# ──────────────────────────────────────────────────────────────────────────────
+
+@dataclass
+class PackedPrompt:
+    """Result of pack_prompt()."""
+    messages: list[dict]
+    chunks: list[Chunk]          # chunks that made it into the context
+    estimated_tokens: int
+    budget: int
+
+
+def pack_prompt(
+    system: str,
+    ranked_chunks: list[Chunk],
+    history: list[dict] | None,
+    render_user: Callable[[str], str],
+    budget: int,
+    memo: str = "",
+) -> PackedPrompt:
+    """
+    Fill *budget* in priority order:
+
+      1. system prompt + question (always kept)
+      2. retrieved chunks, best score first (*ranked_chunks* is score-ordered)
+      3. conversation memo (summary of older turns), if any
+      4. conversation history, most recent first
+
+    *render_user(context)* builds the final user message (context + question).
+    """
+    system_msg = {"role": "system", "content": system}
+    used = estimate_message_tokens(system_msg) + estimate_message_tokens(
+        {"content": render_user("")}
+    )
+
+    # ── Chunks ────────────────────────────────────────────────────────────────
+    selected: list[Chunk] = []
+    context_tokens = 0
+    for chunk in ranked_chunks:
+        candidate = selected + [chunk]
+        candidate_tokens = estimate_tokens(render_context(candidate))
+        if used + candidate_tokens > budget:
+            continue
+        selected = candidate
+        context_tokens = candidate_tokens
+    used += context_tokens
+
+    # ── Memo of older turns ───────────────────────────────────────────────────
+    memo_msgs: list[dict] = []
+    if memo:
+        memo_msg = {"role": "system", "content": f"RÉSUMÉ DE LA CONVERSATION PRÉCÉDENTE :\n{memo}"}
+        cost = estimate_message_tokens(memo_msg)
+        if used + cost <= budget:
+            memo_msgs.append(memo_msg)
+            used += cost
+
+    # ── History (newest first, then restored to chronological order) ─────────
+    kept_history: list[dict] = []
+    for m in reversed((history or [])[-MAX_HISTORY_MESSAGES:]):
+        role = m.get("role") if isinstance(m, dict) else None
+        content = m.get("content") if isinstance(m, dict) else None
+        if role not in ("user", "assistant") or not isinstance(content, str):
+            continue
+        msg = {"role": role, "content": content}
+        cost = estimate_message_tokens(msg)
+        if used + cost > budget:
+            break
+        kept_history.append(msg)
+        used += cost
+    kept_history.reverse()
+
+    user_msg = {"role": "user", "content": render_user(render_context(selected))}
+    messages = [system_msg, *memo_msgs, *kept_history, user_msg]
+    return PackedPrompt(
+        messages=messages,
+        chunks=sorted(selected, key=lambda c: (c.page, c.chunk_id)),
+        estimated_tokens=sum(estimate_message_tokens(m) for m in messages),
+        budget=budget,
+    )
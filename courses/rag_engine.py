@@ -11,6 +11,7 @@ Implements:
 
 import math
 import re
+from collections import Counter
 from dataclasses import dataclass
 
 # ──────────────────────────────────────────────────────────────────────────────
@@ -28,6 +29,7 @@ BM25_B = 0.75
 
 # Tokenisation
 _WORD_RE = re.compile(r"[\wÀ-ÿ\-']{2,}", re.UNICODE)
+_SENTENCE_RE = re.compile(r"(?<=[.!?…])\s+|\n{2,}")
 
 # Stopwords (French + English) — filtered from query tokens only
 _STOPWORDS = frozenset(
@@ -83,6 +85,16 @@ def _query_tokens(query: str) -> list[str]:
     return [t for t in _tokenize(query) if t not in _STOPWORDS] or _tokenize(query)
 
 
+def split_sentences(text: str) -> list[str]:
+    """Split *text* into sentences (punctuation or paragraph breaks), whitespace-normalised."""
+    sentences = []
+    for part in _SENTENCE_RE.split(text or ""):
+        sentence = " ".join(part.split())
+        if sentence:
+            sentences.append(sentence)
+    return sentences
+
+
 # ──────────────────────────────────────────────────────────────────────────────
 # Chunking
 # ──────────────────────────────────────────────────────────────────────────────
@@ -173,9 +185,10 @@ class BM25Index:
             self._df: dict[str, int] = {}
             return
 
-        # Document lengths
+        # Document lengths + term frequencies (computed once, reused by every query)
         self._dl = [len(c.tokens) for c in chunks]
         self._avgdl = sum(self._dl) / self.n
+        self._tf = [Counter(c.tokens) for c in chunks]
 
         # Document frequency per term
         self._df: dict[str, int] = {}
@@ -200,6 +213,49 @@ class BM25Index:
             score += idf * tf_norm
         return score
 
+    def _score_at(self, i: int, query_tokens: list[str]) -> float:
+        """BM25 score of chunk *i* using the precomputed term frequencies."""
+        tf_counts = self._tf[i]
+        dl = self._dl[i]
+        score = 0.0
+        for term in query_tokens:
+            tf = tf_counts.get(term, 0)
+            if tf == 0:
+                continue
+            df = self._df.get(term, 0)
+            idf = math.log((self.n - df + 0.5) / (df + 0.5) + 1.0)
+            tf_norm = (tf * (BM25_K1 + 1)) / (
+                tf + BM25_K1 * (1 - BM25_B + BM25_B * dl / max(self._avgdl, 1))
+            )
+            score += idf * tf_norm
+        return score
+
+    def score_text(self, text: str, query: str) -> float:
+        """
+        BM25 score of an arbitrary passage (e.g. one sentence of a chunk) using
+        this index's document frequencies and average length.
+        """
+        if self.n == 0:
+            return 0.0
+        tf_counts = Counter(_tokenize(text))
+        dl = sum(tf_counts.values())
+        score = 0.0
+        for term in _query_tokens(query):
+            tf = tf_counts.get(term, 0)
+            df = self._df.get(term, 0)
+            if tf == 0 or df == 0:
+                continue
+            idf = math.log((self.n - df + 0.5) / (df + 0.5) + 1.0)
+            tf_norm = (tf * (BM25_K1 + 1)) / (
+                tf + BM25_K1 * (1 - BM25_B + BM25_B * dl / max(self._avgdl, 1))
+            )
+            score += idf * tf_norm
+        return score
+
+    def matched_terms(self, query: str) -> list[str]:
+        """Query tokens (stop-words removed) that occur in at least one chunk."""
+        return [t for t in _query_tokens(query) if self._df.get(t)]
+
     def retrieve(self, query: str, top_k: int = MAX_CHUNKS_RETURNED) -> list[tuple[Chunk, float]]:
         """
         Return the top-k chunks most relevant to *query*, sorted by score desc.
@@ -213,7 +269,7 @@ class BM25Index:
             q_tokens = _tokenize(query)
 
         scored = [
-            (chunk, self.score(chunk, q_tokens, self._dl[i]))
+            (chunk, self._score_at(i, q_tokens))
             for i, chunk in enumerate(self.chunks)
         ]
         # Sort by score descending
@@ -249,3 +305,4 @@ def retrieve_relevant_chunks(
     index = BM25Index(chunks)
     results = index.retrieve(query, top_k=top_k)
     return [chunk for chunk, _score in results]
+
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+Response cache — versioned cache for the public read endpoints.
+Developed by Marino ATOHOUN.
+
+Each cached endpoint depends on one or more *resources* ("courses",
+"documents", …). Every resource has a version number in the cache, bumped
+by courses.signals when one of its models changes; cache keys and ETags
+embed those versions, so a change makes every dependent entry unreachable
+at once (no key scanning) and clients revalidate with If-None-Match → 304.
+
+Hit / miss / 304 counters are kept in the cache (see cache_metrics()).
+"""
+
+import functools
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpRequest, HttpResponseNotModified
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Configuration
+# ──────────────────────────────────────────────────────────────────────────────
+
+KEY_PREFIX = "edushare:resp:"
+VERSION_PREFIX = "edushare:resp-version:"
+METRICS_PREFIX = "edushare:resp-metrics:"
+DEFAULT_TIMEOUT = 300
+DEFAULT_MAX_AGE = 60
+
+RESOURCES = ("courses", "documents", "study_levels", "stats", "trending")
+
+
+def _cache():
+    return caches[getattr(settings, "RESPONSE_CACHE_ALIAS", "default")]
+
+
+def _enabled() -> bool:
+    return bool(getattr(settings, "RESPONSE_CACHE_ENABLED", True))
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Versions
+# ──────────────────────────────────────────────────────────────────────────────
+
+def resource_versions(resources: tuple[str, ...]) -> tuple[int, ...]:
+    keys = [VERSION_PREFIX + r for r in resources]
+    cache = _cache()
+    found = cache.get_many(keys)
+    missing = {k: 1 for k in keys if k not in found}
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    return tuple(found[k] for k in keys)
+
+
+def bump(*resources: str) -> None:
+    """Invalidate every cached response depending on *resources*."""
+    cache = _cache()
+    for resource in resources:
+        key = VERSION_PREFIX + resource
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Unknown version: start above the implicit 1 so old entries are never reused
+            cache.set(key, 2, None)
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Metrics
+# ──────────────────────────────────────────────────────────────────────────────
+
+def _count(event: str) -> None:
+    cache = _cache()
+    key = METRICS_PREFIX + event
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def cache_metrics() -> dict:
+    """Hit / miss / 304 counters and the hit rate (304s count as hits)."""
+    cache = _cache()
+    events = ("hit", "miss", "not_modified")
+    found = cache.get_many([METRICS_PREFIX + e for e in events])
+    counts = {e: int(found.get(METRICS_PREFIX + e, 0)) for e in events}
+    served = counts["hit"] + counts["not_modified"]
+    total = served + counts["miss"]
+    counts["hit_rate"] = round(served / total, 4) if total else 0.0
+    return counts
+
+
+def reset_metrics() -> None:
+    _cache().delete_many([METRICS_PREFIX + e for e in ("hit", "miss", "not_modified")])
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Decorator
+# ──────────────────────────────────────────────────────────────────────────────
+
+def _find_request(args) -> Request | HttpRequest:
+    # Function views get (request, …); view methods get (self, request, …)
+    return args[0] if isinstance(args[0], (Request, HttpRequest)) else args[1]
+
+
+def _request_key(request, versions: tuple[int, ...]) -> str:
+    query = sorted(request.GET.lists())
+    # Responses embed absolute URLs: one entry per host and scheme
+    raw = repr((request.scheme, request.get_host(), request.path, query, versions))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison of *etag* with the entity tags of an If-None-Match header."""
+    tags = parse_etags(if_none_match)
+    if tags == ["*"]:
+        return True
+    return etag.removeprefix("W/") in {tag.removeprefix("W/") for tag in tags}
+
+
+def _finalize(response, etag: str, anonymous_only: bool, status: str):
+    response["ETag"] = etag
+    response["X-Cache"] = status
+    patch_cache_control(response, public=True, max_age=int(getattr(settings, "RESPONSE_CACHE_MAX_AGE", DEFAULT_MAX_AGE)))
+    if anonymous_only:
+        patch_vary_headers(response, ["Authorization"])
+    return response
+
+
+def cached_response(*resources: str, anonymous_only: bool = False):
+    """
+    Cache successful GET responses of a DRF view (function or method) under
+    the versions of *resources*. With *anonymous_only*, authenticated
+    requests bypass the cache.
+    """
+    unknown = set(resources) - set(RESOURCES)
+    if unknown:
+        raise ValueError(f"Unknown cached resources: {sorted(unknown)}")
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            request = _find_request(args)
+            if (
+                not _enabled()
+                or request.method not in ("GET", "HEAD")
+                or (anonymous_only and request.user.is_authenticated)
+            ):
+                return func(*args, **kwargs)
+
+            key = _request_key(request, resource_versions(resources))
+            etag = f'W/"{key[:20]}"'
+
+            if _etag_matches(request.headers.get("If-None-Match", ""), etag):
+                _count("not_modified")
+                return _finalize(HttpResponseNotModified(), etag, anonymous_only, "REVALIDATED")
+
+            cache = _cache()
+            cached = cache.get(KEY_PREFIX + key)
+            if cached is not None:
+                _count("hit")
+                status_code, data = cached
+                return _finalize(Response(data, status=status_code), etag, anonymous_only, "HIT")
+
+            _count("miss")
+            response = func(*args, **kwargs)
+            if response.status_code == 200 and isinstance(response, Response):
+                cache.set(
+                    KEY_PREFIX + key,
+                    (response.status_code, response.data),
+                    int(getattr(settings, "RESPONSE_CACHE_TIMEOUT", DEFAULT_TIMEOUT)),
+                )
+                _finalize(response, etag, anonymous_only, "MISS")
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+Document search index — full-text search for document listings.
+Developed by Marino ATOHOUN.
+
+One row per PDFDocument (title, description, tag names, course name):
+  - SQLite     : FTS5 virtual table, rowid = document id, ranked with bm25()
+  - PostgreSQL : weighted tsvector column + GIN index, ranked with ts_rank()
+
+Kept in sync by courses.signals. Other backends fall back to icontains.
+"""
+
+import re
+
+from django.db import connection
+from django.db.models import Q, QuerySet
+from django.db.models.expressions import RawSQL
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Configuration
+# ──────────────────────────────────────────────────────────────────────────────
+
+TABLE = "courses_pdfdocument_fts"
+PG_CONFIG = "french"
+MAX_QUERY_TERMS = 8
+
+_TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def is_supported() -> bool:
+    """True when the current database backend has a full-text index."""
+    return connection.vendor in ("sqlite", "postgresql")
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Schema (used by the migration)
+# ──────────────────────────────────────────────────────────────────────────────
+
+def create_schema(schema_editor) -> None:
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5("
+            "title, description, tags, course, tokenize='unicode61 remove_diacritics 2')"
+        )
+    elif vendor == "postgresql":
+        schema_editor.execute(
+            f"CREATE TABLE IF NOT EXISTS {TABLE} ("
+            "document_id bigint PRIMARY KEY REFERENCES courses_pdfdocument(id) ON DELETE CASCADE, "
+            "document tsvector NOT NULL)"
+        )
+        schema_editor.execute(f"CREATE INDEX IF NOT EXISTS {TABLE}_gin ON {TABLE} USING GIN (document)")
+
+
+def drop_schema(schema_editor) -> None:
+    if schema_editor.connection.vendor in ("sqlite", "postgresql"):
+        schema_editor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Indexing
+# ──────────────────────────────────────────────────────────────────────────────
+
+def _fields(document) -> tuple[str, str, str, str]:
+    tags = " ".join(t.name for t in document.tags.all())
+    course = document.course.name if document.course_id else ""
+    return document.title or "", document.description or "", tags, course
+
+
+def index_document(document) -> None:
+    """Insert or refresh the index row of *document*."""
+    if not is_supported():
+        return
+    title, description, tags, course = _fields(document)
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.execute(f"DELETE FROM {TABLE} WHERE rowid = %s", [document.pk])
+            cursor.execute(
+                f"INSERT INTO {TABLE} (rowid, title, description, tags, course) VALUES (%s, %s, %s, %s, %s)",
+                [document.pk, title, description, tags, course],
+            )
+        else:
+            cursor.execute(
+                f"INSERT INTO {TABLE} (document_id, document) VALUES (%s, "
+                f"setweight(to_tsvector('{PG_CONFIG}', %s), 'A') || "
+                f"setweight(to_tsvector('{PG_CONFIG}', %s), 'B') || "
+                f"setweight(to_tsvector('{PG_CONFIG}', %s), 'B') || "
+                f"setweight(to_tsvector('{PG_CONFIG}', %s), 'C')) "
+                "ON CONFLICT (document_id) DO UPDATE SET document = EXCLUDED.document",
+                [document.pk, title, tags, course, description],
+            )
+
+
+def unindex_document(document_id: int) -> None:
+    """Remove the index row of a deleted document (PostgreSQL cascades on its own)."""
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE} WHERE rowid = %s", [document_id])
+
+
+def reindex_documents(queryset) -> int:
+    """(Re)index every document of *queryset*; returns the number indexed."""
+    if not is_supported():
+        return 0
+    count = 0
+    for document in queryset.select_related("course").prefetch_related("tags").iterator(chunk_size=500):
+        index_document(document)
+        count += 1
+    return count
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Search
+# ──────────────────────────────────────────────────────────────────────────────
+
+def ordering(queryset: QuerySet) -> list[str]:
+    """Relevance first when the queryset went through search_documents(), newest first otherwise."""
+    if "search_rank" in queryset.query.annotations:
+        return ["-search_rank", "-created_at", "-id"]
+    return ["-created_at", "-id"]
+
+
+def _terms(search: str) -> list[str]:
+    return _TERM_RE.findall(search.lower())[:MAX_QUERY_TERMS]
+
+
+def _match_query(terms: list[str]) -> tuple[str, str, str]:
+    """(match SQL, rank SQL, query param) for the current backend; prefix match on every term."""
+    if connection.vendor == "sqlite":
+        query = " ".join(f'"{t}"*' for t in terms)
+        match_sql = f"SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s"
+        # bm25() is lower-is-better: negate so higher rank = more relevant
+        rank_sql = (
+            f"SELECT -bm25({TABLE}, 10.0, 2.0, 5.0, 5.0) FROM {TABLE} "
+            f"WHERE {TABLE} MATCH %s AND rowid = courses_pdfdocument.id"
+        )
+    else:
+        query = " & ".join(f"{t}:*" for t in terms)
+        match_sql = f"SELECT document_id FROM {TABLE} WHERE document @@ to_tsquery('{PG_CONFIG}', %s)"
+        rank_sql = (
+            f"SELECT ts_rank(document, to_tsquery('{PG_CONFIG}', %s)) FROM {TABLE} "
+            "WHERE document_id = courses_pdfdocument.id"
+        )
+    return match_sql, rank_sql, query
+
+
+def search_documents(queryset: QuerySet, search: str, fallback_fields: list[str]) -> QuerySet:
+    """
+    Filter a PDFDocument *queryset* on *search*, annotated with `search_rank`
+    (higher = more relevant). Without a full-text backend, falls back to an
+    icontains OR over *fallback_fields* (as a semi-join: no duplicate rows).
+    """
+    terms = _terms(search)
+    if not terms or not is_supported():
+        condition = Q()
+        for field in fallback_fields:
+            condition |= Q(**{f"{field}__icontains": search})
+        return queryset.filter(id__in=queryset.model.objects.filter(condition).values("id"))
+
+    match_sql, rank_sql, query = _match_query(terms)
+    return queryset.filter(id__in=RawSQL(match_sql, [query])).annotate(
+        search_rank=RawSQL(rank_sql, [query])
+    )
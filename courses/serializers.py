@@ -6,6 +6,7 @@ Developed by Marino ATOHOUN
 
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from django.urls import reverse
 import logging
 from .models import (
     Course,
@@ -18,6 +19,7 @@ from .models import (
     Advertisement,
     AdInteraction,
 )
+from . import thumbnails as page_images
 from .utils import encrypt_id
 
 logger = logging.getLogger("courses.serializers")
@@ -87,7 +89,11 @@ class CourseSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'domain', 'description', 'documents_count', 'created_at']
 
     def get_documents_count(self, obj):
-        return obj.documents.filter(is_active=True).count()
+        # Annotated by the views (with_documents_count); fallback for bare instances
+        count = getattr(obj, "active_documents_count", None)
+        if count is None:
+            count = obj.documents.filter(is_active=True).count()
+        return count
 
 
 class StudySubLevelSerializer(serializers.ModelSerializer):
@@ -149,7 +155,8 @@ class PDFDocumentSerializer(serializers.ModelSerializer):
         return obj.study_sublevel.name
 
     def get_tags(self, obj):
-        return [t.name for t in obj.tags.all().order_by("name")]
+        # Sorted in Python: .order_by() would bypass prefetch_related("tags")
+        return sorted(t.name for t in obj.tags.all())
 
     def _normalize_tag_key(self, value: str) -> str:
         return (
@@ -265,13 +272,14 @@ class PDFDocumentListSerializer(serializers.ModelSerializer):
     study_level = serializers.SerializerMethodField()
     study_sublevel = serializers.SerializerMethodField()
     tags = serializers.SerializerMethodField()
+    thumbnails = serializers.SerializerMethodField()
 
     class Meta:
         model = PDFDocument
         fields = [
             'id', 'encrypted_id', 'title', 'description', 'course_name', 'course_domain',
             'study_level', 'study_sublevel',
-            'tags',
+            'tags', 'thumbnails',
             'uploaded_by_username', 'file_size_mb', 'download_count', 'created_at'
         ]
 
@@ -289,7 +297,21 @@ class PDFDocumentListSerializer(serializers.ModelSerializer):
         return obj.study_sublevel.name
 
     def get_tags(self, obj):
-        return [t.name for t in obj.tags.all().order_by("name")]
+        # Sorted in Python: .order_by() would bypass prefetch_related("tags")
+        return sorted(t.name for t in obj.tags.all())
+
+    def get_thumbnails(self, obj):
+        """First-page image URL per width; `v` (content key) makes them cacheable forever."""
+        if not page_images.is_available():
+            return {}
+        path = reverse('courses:document_page', kwargs={'document_id': encrypt_id(obj.id), 'page': 1})
+        version = page_images.content_key(obj)[:16]
+        request = self.context.get('request')
+        urls = {}
+        for width in page_images.thumbnail_widths():
+            url = f"{path}?w={width}&v={version}"
+            urls[str(width)] = request.build_absolute_uri(url) if request else url
+        return urls
 
 
 class NewsletterSerializer(serializers.ModelSerializer):
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+Signal receivers — keep derived data in sync with documents.
+Developed by Marino ATOHOUN.
+"""
+
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from django.contrib.auth.models import User
+
+from courses import platform_stats, response_cache, search_index
+from courses.facets import invalidate_facets
+from courses.models import Course, PDFDocument, PdfBlob, StudyLevel, StudySubLevel, Tag
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Full-text search index
+# ──────────────────────────────────────────────────────────────────────────────
+
+# Saves that touch nothing indexed or counted (e.g. save(update_fields=["download_count"]))
+COUNTER_ONLY_FIELDS = frozenset({"download_count"})
+
+
+def _counter_only(update_fields) -> bool:
+    return bool(update_fields) and set(update_fields) <= COUNTER_ONLY_FIELDS
+
+
+@receiver(post_save, sender=PDFDocument)
+def index_saved_document(sender, instance, raw=False, update_fields=None, **kwargs):
+    if not raw and not _counter_only(update_fields):
+        search_index.index_document(instance)
+
+
+@receiver(post_delete, sender=PDFDocument)
+def unindex_deleted_document(sender, instance, **kwargs):
+    search_index.unindex_document(instance.pk)
+
+
+@receiver(m2m_changed, sender=PDFDocument.tags.through)
+def reindex_document_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        search_index.index_document(instance)
+    elif pk_set:
+        # tag.documents.add()/remove(); tag.documents.clear() carries no ids
+        search_index.reindex_documents(PDFDocument.objects.filter(pk__in=pk_set))
+
+
+@receiver(post_save, sender=Tag)
+def reindex_renamed_tag(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        search_index.reindex_documents(instance.documents.all())
+
+
+@receiver(post_save, sender=Course)
+def reindex_renamed_course(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        search_index.reindex_documents(instance.documents.all())
+
+
+@receiver(pre_delete, sender=Tag)
+def remember_tag_documents(sender, instance, **kwargs):
+    # The through rows are cascaded without m2m_changed: keep the ids for post_delete
+    instance._indexed_document_ids = list(instance.documents.values_list("pk", flat=True))
+
+
+@receiver(post_delete, sender=Tag)
+def reindex_deleted_tag(sender, instance, **kwargs):
+    ids = getattr(instance, "_indexed_document_ids", None)
+    if ids:
+        search_index.reindex_documents(PDFDocument.objects.filter(pk__in=ids))
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Cached facet counts
+# ──────────────────────────────────────────────────────────────────────────────
+
+@receiver(post_save, sender=PDFDocument)
+def invalidate_facets_on_document_save(sender, update_fields=None, **kwargs):
+    if not _counter_only(update_fields):
+        invalidate_facets()
+
+
+@receiver(post_delete, sender=PDFDocument)
+@receiver(m2m_changed, sender=PDFDocument.tags.through)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def invalidate_document_facets(sender, **kwargs):
+    invalidate_facets()
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Response cache versions
+# ──────────────────────────────────────────────────────────────────────────────
+
+@receiver(post_save, sender=PDFDocument)
+def bump_document_responses(sender, update_fields=None, **kwargs):
+    if _counter_only(update_fields):
+        # Download counters: only the totals of /api/stats/ move; list entries
+        # may show a download_count up to RESPONSE_CACHE_TIMEOUT old.
+        response_cache.bump("stats")
+    else:
+        response_cache.bump("courses", "documents", "stats")
+
+
+@receiver(post_delete, sender=PDFDocument)
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def bump_catalogue_responses(sender, **kwargs):
+    response_cache.bump("courses", "documents", "stats")
+
+
+@receiver(m2m_changed, sender=PDFDocument.tags.through)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def bump_tag_responses(sender, **kwargs):
+    response_cache.bump("documents")
+
+
+@receiver(post_save, sender=StudyLevel)
+@receiver(post_delete, sender=StudyLevel)
+@receiver(post_save, sender=StudySubLevel)
+@receiver(post_delete, sender=StudySubLevel)
+def bump_study_level_responses(sender, **kwargs):
+    response_cache.bump("study_levels", "documents")
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def bump_user_responses(sender, created=False, **kwargs):
+    # total_users only changes on sign-up / deletion, not on last_login updates
+    if created or kwargs.get("signal") is post_delete:
+        response_cache.bump("stats")
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Platform statistics counters
+# ──────────────────────────────────────────────────────────────────────────────
+
+@receiver(pre_save, sender=PDFDocument)
+def remember_document_activity(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Soft delete / restore flips is_active: keep the stored value to compute the delta
+    if raw or instance._state.adding or _counter_only(update_fields):
+        return
+    # Stored download_count too: buffered F() increments make the instance value stale
+    instance._stats_previous = (
+        PDFDocument.objects.filter(pk=instance.pk).values_list("is_active", "download_count").first()
+    )
+
+
+@receiver(post_save, sender=PDFDocument)
+def count_saved_document(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        if instance.is_active:
+            platform_stats.bump(**platform_stats.document_deltas(instance.download_count, +1))
+        return
+    previous = getattr(instance, "_stats_previous", None)
+    if previous is not None and previous[0] != instance.is_active:
+        sign = +1 if instance.is_active else -1
+        platform_stats.bump(**platform_stats.document_deltas(previous[1], sign))
+
+
+@receiver(post_delete, sender=PDFDocument)
+def count_deleted_document(sender, instance, **kwargs):
+    if instance.is_active:
+        platform_stats.bump(**platform_stats.document_deltas(instance.download_count, -1))
+
+
+@receiver(post_save, sender=Course)
+def count_created_course(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        platform_stats.bump(total_courses=1)
+
+
+@receiver(post_delete, sender=Course)
+def count_deleted_course(sender, instance, **kwargs):
+    platform_stats.bump(total_courses=-1)
+
+
+@receiver(post_save, sender=User)
+def count_registered_user(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        platform_stats.bump(total_users=1)
+
+
+@receiver(post_delete, sender=User)
+def count_deleted_user(sender, instance, **kwargs):
+    platform_stats.bump(total_users=-1)
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Content-addressed files
+# ──────────────────────────────────────────────────────────────────────────────
+
+@receiver(post_delete, sender=PDFDocument)
+def release_document_blob(sender, instance, **kwargs):
+    # The file goes away with the last document referencing it
+    if instance.blob_id:
+        PdfBlob.release(instance.blob_id)
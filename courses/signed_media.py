@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+Signed media URLs — expiring links served by nginx without Django.
+Developed by Marino ATOHOUN.
+
+With FILE_DELIVERY_BACKEND = "signed", download/preview answer with a 302
+to /secure-media/<mode>/<document id>/<storage name>?md5=…&expires=…&filename=…
+The signature is the one of nginx's secure_link module:
+
+    base64url(md5("<expires><uri><filename> <SIGNED_MEDIA_SECRET>"))
+
+so nginx checks it and sends the file itself (see frontend/nginx.conf);
+the same URL is served by Django (signed_media view) when nginx is not in
+front. Those transfers are logged by nginx (`edushare_media` log format)
+and counted afterwards by `python manage.py ingest_media_log`.
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
+from collections import Counter
+from datetime import datetime, timezone as dt_timezone
+from urllib.parse import quote, urlencode
+
+from django.conf import settings
+
+from courses.utils import decrypt_id, encrypt_id
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Configuration
+# ──────────────────────────────────────────────────────────────────────────────
+
+PREFIX = "/secure-media/"
+MODES = {"dl": True, "inline": False}   # mode → as_attachment
+DEFAULT_TTL = 300
+
+VALID, INVALID, EXPIRED = "valid", "invalid", "expired"
+
+
+def _secret() -> str:
+    return getattr(settings, "SIGNED_MEDIA_SECRET", None) or settings.SECRET_KEY
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Signing
+# ──────────────────────────────────────────────────────────────────────────────
+
+def signature(path: str, expires: int, filename: str) -> str:
+    """secure_link_md5 "$secure_link_expires$uri$arg_filename <secret>" (*filename* as sent, URL-encoded)."""
+    digest = hashlib.md5(f"{expires}{path}{filename} {_secret()}".encode("utf-8")).digest()
+    return base64.urlsafe_b64encode(digest).decode("ascii").rstrip("=")
+
+
+def media_path(document, as_attachment: bool) -> str:
+    mode = "dl" if as_attachment else "inline"
+    return f"{PREFIX}{mode}/{encrypt_id(document.id)}/{document.pdf_file.name}"
+
+
+def signed_url(document, as_attachment: bool = True, ttl: int | None = None) -> str:
+    """Expiring URL of the PDF of *document* (relative to the site root)."""
+    ttl = int(getattr(settings, "SIGNED_MEDIA_TTL", DEFAULT_TTL) if ttl is None else ttl)
+    expires = int(time.time()) + ttl
+    path = media_path(document, as_attachment)
+    # Already percent-encoded: nginx signs $arg_filename raw and puts it as is in filename*=
+    filename = quote(f"{(document.title or 'document').strip()}.pdf", safe="")
+    query = urlencode({"md5": signature(path, expires, filename), "expires": expires})
+    return f"{quote(path)}?{query}&filename={filename}"
+
+
+def verify(path: str, expires: str, filename: str, md5: str) -> str:
+    """VALID, INVALID (403) or EXPIRED (410) — what nginx's $secure_link reports."""
+    if not expires.isdigit() or not hmac.compare_digest(signature(path, int(expires), filename), md5 or ""):
+        return INVALID
+    return VALID if int(expires) >= time.time() else EXPIRED
+
+
+def parse_path(path: str) -> tuple[str, int, str] | None:
+    """(mode, document id, storage name) of a signed media path, None if it is not one."""
+    if not path.startswith(PREFIX):
+        return None
+    parts = path[len(PREFIX):].split("/", 2)
+    if len(parts) != 3 or parts[0] not in MODES or not parts[2]:
+        return None
+    document_id = decrypt_id(parts[1])
+    return (parts[0], document_id, parts[2]) if document_id else None
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Access log
+# ──────────────────────────────────────────────────────────────────────────────
+
+def parse_log_line(line: str) -> dict | None:
+    """
+    A line of the `edushare_media` nginx log format (escape=json,
+    tab-separated: $msec $status $request_method $http_range $uri).
+    """
+    fields = line.rstrip("\n").split("\t")
+    if len(fields) != 5:
+        return None
+    try:
+        msec, status, method, range_header, uri = (json.loads(f'"{f}"') for f in fields)
+        timestamp = datetime.fromtimestamp(float(msec), tz=dt_timezone.utc)
+        status = int(status)
+    except ValueError:
+        return None
+    return {"time": timestamp, "status": status, "method": method, "range": range_header, "path": uri}
+
+
+def count_transfers(lines) -> tuple[Counter, list[tuple[int, str, datetime]]]:
+    """
+    Downloads per document and (document id, mode, time) of every transfer
+    start in *lines* — same rule as counts_as_download: complete GETs or
+    ranges starting at byte 0.
+    """
+    from courses.file_delivery import parse_range
+
+    downloads, transfers = Counter(), []
+    for line in lines:
+        entry = parse_log_line(line)
+        if not entry or entry["method"] != "GET" or entry["status"] not in (200, 206):
+            continue
+        target = parse_path(entry["path"])
+        if not target:
+            continue
+        ranges = parse_range(entry["range"] or None, 2**63)
+        if ranges and min(start for start, _ in ranges) > 0:
+            continue
+        mode, document_id, _ = target
+        if mode == "dl":
+            downloads[document_id] += 1
+        transfers.append((document_id, mode, entry["time"]))
+    return downloads, transfers
+
+
+def ingest(lines) -> tuple[int, int]:
+    """
+    Count the transfers of *lines*: download counters (one flush) and the
+    event log (timestamped from the log). Returns (downloads, events).
+    """
+    from courses import download_counters
+    from courses.models import DocumentEvent, PDFDocument
+
+    downloads, transfers = count_transfers(lines)
+    known = set(PDFDocument.objects.filter(pk__in={t[0] for t in transfers}).values_list("pk", flat=True))
+    for document_id, count in downloads.items():
+        if document_id in known:
+            download_counters.record_download(document_id, count)
+    download_counters.flush()
+    events = [
+        DocumentEvent(
+            document_id=document_id,
+            kind=DocumentEvent.DOWNLOAD if mode == "dl" else DocumentEvent.PREVIEW,
+            created_at=created_at,
+        )
+        for document_id, mode, created_at in transfers
+        if document_id in known
+    ]
+    DocumentEvent.objects.bulk_create(events, batch_size=500)
+    return sum(downloads[d] for d in known), len(events)
+
+
+def read_new_lines(log_path: str, state_path: str) -> tuple[list[str], dict]:
+    """
+    Complete lines appended to *log_path* since the position saved in
+    *state_path* (restarted from 0 when the file was rotated), and the new
+    state to save once they are processed.
+    """
+    stat = os.stat(log_path)
+    state = {"inode": None, "offset": 0}
+    if os.path.exists(state_path):
+        with open(state_path, encoding="utf-8") as f:
+            state = json.load(f)
+    offset = state["offset"] if state.get("inode") == stat.st_ino and state["offset"] <= stat.st_size else 0
+    with open(log_path, "rb") as f:
+        f.seek(offset)
+        data = f.read()
+    complete = data[: data.rfind(b"\n") + 1]
+    lines = complete.decode("utf-8", "replace").splitlines()
+    return lines, {"inode": stat.st_ino, "offset": offset + len(complete)}
+
+
+def save_state(state_path: str, state: dict) -> None:
+    partial = f"{state_path}.part"
+    with open(partial, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(partial, state_path)
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+Content-addressed PDF storage.
+Developed by Marino ATOHOUN.
+
+A PDF is stored once per content, under its SHA-256 with two fan-out
+levels (pdfs/sha256/ab/cd/abcd….pdf): identical uploads share one file
+(PdfBlob, referenced by every PDFDocument holding it) and no directory
+grows past 256 entries. Digests are computed while the upload streams in
+(courses.upload_handlers); files from other sources are hashed here.
+"""
+
+import hashlib
+import os
+import re
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+
+CONTENT_ADDRESSED_PREFIX = "pdfs/sha256/"
+
+_NAME_RE = re.compile(r"^pdfs/sha256/[0-9a-f]{2}/[0-9a-f]{2}/([0-9a-f]{64})\.pdf$")
+
+
+def blob_name(sha256: str) -> str:
+    """Storage name of the blob with digest *sha256*."""
+    return f"{CONTENT_ADDRESSED_PREFIX}{sha256[:2]}/{sha256[2:4]}/{sha256}.pdf"
+
+
+def blob_digest(name: str) -> str | None:
+    """Digest encoded in a content-addressed storage *name* (None for legacy paths)."""
+    match = _NAME_RE.match(name or "")
+    return match.group(1) if match else None
+
+
+def file_digest(content) -> str:
+    """
+    SHA-256 of an uploaded / File object: the one computed during the upload
+    when available, otherwise one pass over its chunks (rewound afterwards).
+    """
+    digest = getattr(content, "sha256", None)
+    if digest:
+        return digest
+    sha = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        sha.update(chunk)
+    content.seek(0)
+    return sha.hexdigest()
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    FileSystemStorage where content-addressed names are never renamed: the
+    name *is* the content, so an existing file is reused as-is and a
+    concurrent writer of the same blob simply replaces it atomically.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        if blob_digest(name):
+            return name
+        return super().get_available_name(name, max_length=max_length)
+
+    def _save(self, name, content):
+        if not blob_digest(name):
+            return super()._save(name, content)
+        if self.exists(name):
+            return name
+        # Write under a unique temporary name, then rename into place
+        partial = super()._save(f"{name}.{uuid.uuid4().hex}.part", content)
+        os.replace(self.path(partial), self.path(name))
+        return name
+
+
+def pdf_storage() -> ContentAddressedStorage:
+    return ContentAddressedStorage()
@@ -1,3 +1,1367 @@
-from django.test import TestCase
+import gzip
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.http import QueryDict
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from courses import chat_sessions, document_events, download_counters, facets, groq_llm, groq_standin
+from courses import search_index, signed_media
+from courses import thumbnails as page_images
+from courses import utils_tracking
+from courses.models import (
+    APIKey,
+    APIPlan,
+    APIUsageDaily,
+    ChatConversation,
+    Course,
+    DocumentDailyStats,
+    DocumentEvent,
+    PDFDocument,
+    PDFDocumentText,
+    PdfBlob,
+    PlatformStats,
+    StudyLevel,
+    StudySubLevel,
+    Tag,
+    UserActivity,
+)
+from courses.buffered_writes import BufferedWriter
+from courses.document_chat import build_prompt, load_document_index, select_chunks
+from courses.extractive import COMPRESSION_GAP, compress_chunks
+from courses.pdf_text import PDFTextExtractionError
+from courses.platform_stats import reconcile
+from courses.prompt_packer import pack_prompt, prompt_token_budget, render_context
+from courses.rag_engine import BM25Index, Chunk, build_chunks
+from courses.storage import blob_name
+from courses.upload_handlers import HashingTemporaryFileUploadHandler
+from courses.utils import encrypt_id
+
+MEDIA_ROOT = tempfile.mkdtemp(prefix="edushare-tests-")
+
+
+def one_page_pdf() -> bytes:
+    """Smallest valid PDF: one blank A4 page."""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Resources << >> >>",
+    ]
+    pdf = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    pdf += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(pdf)
+
+
+def document_with_text(user, pages: list[str]) -> PDFDocument:
+    """A document whose extracted text (one string per page) is already cached."""
+    course = Course.objects.create(name="Biologie", domain="bio")
+    document = PDFDocument(title="Cellule", course=course, uploaded_by=user)
+    document.pdf_file.save("cellule.pdf", ContentFile(b"%PDF-1.4\n" + b"c" * 100), save=True)
+    path = document.pdf_file.path
+    PDFDocumentText.objects.create(
+        document=document,
+        pages=pages,
+        file_size=os.path.getsize(path),
+        file_mtime=os.path.getmtime(path),
+    )
+    return document
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, RESPONSE_CACHE_ENABLED=False)
+class QueryCountTests(TestCase):
+    """List/detail endpoints run a fixed number of queries, whatever the result size."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("alice", "alice@example.com", "password123")
+        level = StudyLevel.objects.create(key="lycee", name="Lycée")
+        cls.sublevel = StudySubLevel.objects.create(level=level, key="tle", name="Terminale")
+        cls.tags = [Tag.objects.create(key=f"tag{i}", name=f"Tag {i}") for i in range(3)]
+        cls.courses = [Course.objects.create(name=f"Cours {i}", domain=f"domaine{i}") for i in range(3)]
+
+    def setUp(self):
+        self.anonymous = APIClient()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _create_documents(self, n: int) -> None:
+        for i in range(n):
+            document = PDFDocument(
+                title=f"Document {PDFDocument.objects.count()}",
+                course=self.courses[i % len(self.courses)],
+                uploaded_by=self.user,
+                study_sublevel=self.sublevel,
+            )
+            document.pdf_file.save("doc.pdf", ContentFile(b"%PDF-1.4"), save=True)
+            document.tags.set(self.tags[: 1 + i % len(self.tags)])
+
+    def _query_count(self, url: str, client, params: dict) -> int:
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get(url, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return len(ctx.captured_queries)
+
+    def assertConstantQueries(self, url: str, client=None, **params) -> None:
+        client = client or self.client
+        # Warm-up: first-request bookkeeping (user activity, API usage row)
+        client.get(url, params)
+        self._create_documents(2)
+        small = self._query_count(url, client, params)
+        self._create_documents(10)
+        large = self._query_count(url, client, params)
+        self.assertEqual(small, large, f"{url}: {small} queries for 2 documents, {large} for 12")
+
+    def test_document_list(self):
+        self.assertConstantQueries("/api/documents/")
+
+    def test_document_list_search(self):
+        self.assertConstantQueries("/api/documents/", search="document")
+
+    def test_my_documents(self):
+        self.assertConstantQueries("/api/my-documents/")
+
+    def test_course_list(self):
+        self._create_documents(2)
+        with self.assertNumQueries(1):
+            response = self.anonymous.get("/api/courses/")
+        self.assertEqual(sum(c["documents_count"] for c in response.json()), 2)
+
+    def test_study_levels(self):
+        with self.assertNumQueries(2):
+            self.anonymous.get("/api/study-levels/")
+
+    def test_document_detail(self):
+        self._create_documents(3)
+        document = PDFDocument.objects.first()
+        # document + tags + course (with its documents count)
+        with self.assertNumQueries(3):
+            response = self.anonymous.get(f"/api/documents/{document.id}/")
+        self.assertEqual(response.json()["course"]["documents_count"], 1)
+
+    def test_facets(self):
+        # Each document change invalidates the cache: both calls compute the facets
+        self._create_documents(2)
+        small = self._query_count("/api/documents/facets/", self.anonymous, {"tag": "tag0"})
+        self._create_documents(10)
+        large = self._query_count("/api/documents/facets/", self.anonymous, {"tag": "tag0"})
+        self.assertEqual(small, large)
+
+    def test_data_document_list(self):
+        APIPlan.objects.update_or_create(
+            code="free",
+            defaults={"name": "Free", "daily_requests_limit": 1000, "daily_download_limit": 100, "max_page_size": 100},
+        )
+        plaintext, prefix, key_hash = APIKey.generate()
+        APIKey.objects.create(user=self.user, prefix=prefix, key_hash=key_hash)
+        client = APIClient()
+        client.credentials(HTTP_X_API_KEY=plaintext)
+        self.assertConstantQueries("/api/data/documents/", client)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, RESPONSE_CACHE_ENABLED=True)
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        Course.objects.create(name="Maths", domain="maths")
+
+    def test_hit_and_not_modified(self):
+        first = self.client.get("/api/courses/")
+        self.assertEqual(first["X-Cache"], "MISS")
+        with self.assertNumQueries(0):
+            second = self.client.get("/api/courses/")
+        self.assertEqual(second["X-Cache"], "HIT")
+        self.assertEqual(second.json(), first.json())
+
+        revalidated = self.client.get("/api/courses/", HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(revalidated.status_code, 304)
+
+    def test_if_none_match_list(self):
+        etag = self.client.get("/api/courses/")["ETag"]
+        for header in (f'"x", {etag}', etag.removeprefix("W/"), "*"):
+            self.assertEqual(self.client.get("/api/courses/", HTTP_IF_NONE_MATCH=header).status_code, 304, header)
+        for header in (f'W/"{etag[3:-1]}0"', f'"x{etag}"', ""):
+            self.assertEqual(self.client.get("/api/courses/", HTTP_IF_NONE_MATCH=header).status_code, 200, header)
+
+    @override_settings(ALLOWED_HOSTS=["a.example", "b.example"])
+    def test_entries_per_host(self):
+        first = self.client.get("/api/courses/", HTTP_HOST="a.example")
+        second = self.client.get("/api/courses/", HTTP_HOST="b.example")
+        self.assertEqual(second["X-Cache"], "MISS")
+        self.assertNotEqual(second["ETag"], first["ETag"])
+
+    def test_model_change_invalidates(self):
+        first = self.client.get("/api/courses/")
+        Course.objects.create(name="Physique", domain="physique")
+        second = self.client.get("/api/courses/", HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(second.status_code, 200)
+        self.assertNotEqual(second["ETag"], first["ETag"])
+        self.assertEqual(len(second.json()), 2)
+
+    def test_authenticated_document_list_bypasses_cache(self):
+        user = User.objects.create_user("bob", "bob@example.com", "password123")
+        self.client.force_authenticate(user)
+        response = self.client.get("/api/documents/")
+        self.assertNotIn("X-Cache", response)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, RESPONSE_CACHE_ENABLED=False, DOWNLOAD_COUNTER_FLUSH_SECONDS=0)
+class PlatformStatsTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user("carol", "carol@example.com", "password123")
+        self.course = Course.objects.create(name="Maths", domain="maths")
+
+    def _document(self) -> PDFDocument:
+        document = PDFDocument(title="Algèbre", course=self.course, uploaded_by=self.user)
+        document.pdf_file.save("doc.pdf", ContentFile(b"%PDF-1.4"), save=True)
+        return document
+
+    def _stats(self) -> dict:
+        with self.assertNumQueries(1):
+            return self.client.get("/api/stats/").json()
+
+    def test_counters_follow_changes(self):
+        reconcile()
+        document = self._document()
+        document.increment_download_count()
+        document.increment_download_count()
+        self.assertEqual(
+            self._stats(),
+            {"total_documents": 1, "total_courses": 1, "total_users": 1, "total_downloads": 2},
+        )
+
+        document.is_active = False
+        document.save(update_fields=["is_active"])
+        self.assertEqual(self._stats()["total_downloads"], 0)
+        document.delete()
+        self.course.delete()
+        self.assertEqual(self._stats(), {"total_documents": 0, "total_courses": 0, "total_users": 1, "total_downloads": 0})
+
+    def test_reconcile_fixes_drift(self):
+        reconcile()
+        PlatformStats.objects.update(total_users=42)
+        self.assertEqual(reconcile().total_users, 1)
+
+    def test_deleting_active_document(self):
+        reconcile()
+        document = self._document()
+        document.increment_download_count()
+        document.refresh_from_db()
+        document.delete()
+        self.assertEqual(self._stats(), {"total_documents": 0, "total_courses": 1, "total_users": 1, "total_downloads": 0})
+
+    def test_drifted_counter_does_not_block_delete(self):
+        reconcile()
+        document = self._document()
+        document.increment_download_count()
+        document.refresh_from_db()
+        PlatformStats.objects.update(total_documents=0, total_downloads=0, total_courses=0)
+        document.delete()
+        self.course.delete()
+        self.assertEqual(self._stats(), {"total_documents": 0, "total_courses": 0, "total_users": 1, "total_downloads": 0})
+
+
+@override_settings(
+    MEDIA_ROOT=MEDIA_ROOT,
+    RESPONSE_CACHE_ENABLED=False,
+    DOWNLOAD_COUNTER_FLUSH_SECONDS=0,
+    DOCUMENT_EVENTS_FLUSH_SECONDS=0,
+)
+class FileDeliveryTests(TestCase):
+    content = b"%PDF-1.4\n" + b"x" * 200_000
+
+    def setUp(self):
+        self.client = APIClient()
+        user = User.objects.create_user("dave", "dave@example.com", "password123")
+        course = Course.objects.create(name="Maths", domain="maths")
+        self.document = PDFDocument(title="Géométrie", course=course, uploaded_by=user)
+        self.document.pdf_file.save("geo.pdf", ContentFile(self.content), save=True)
+
+    def test_download_is_streamed(self):
+        response = self.client.get(f"/api/documents/{self.document.id}/download/")
+        self.assertTrue(response.streaming)
+        self.assertEqual(b"".join(response.streaming_content), self.content)
+        self.assertTrue(response["Content-Disposition"].startswith("attachment;"))
+        self.document.refresh_from_db()
+        self.assertEqual(self.document.download_count, 1)
+
+    @override_settings(FILE_DELIVERY_BACKEND="nginx", FILE_DELIVERY_ACCEL_PREFIX="/protected-media/")
+    def test_preview_offloaded_to_nginx(self):
+        response = self.client.get(f"/api/documents/{self.document.id}/preview/")
+        self.assertEqual(response["X-Accel-Redirect"], f"/protected-media/{self.document.pdf_file.name}")
+        self.assertEqual(response.content, b"")
+        self.assertTrue(response["Content-Disposition"].startswith("inline;"))
+
+    def _preview(self, **headers):
+        return self.client.get(f"/api/documents/{self.document.id}/preview/", **headers)
+
+    def test_single_range(self):
+        response = self._preview(HTTP_RANGE="bytes=0-1023")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], f"bytes 0-1023/{len(self.content)}")
+        self.assertEqual(b"".join(response.streaming_content), self.content[:1024])
+
+        suffix = self._preview(HTTP_RANGE="bytes=-10")
+        self.assertEqual(b"".join(suffix.streaming_content), self.content[-10:])
+
+    def test_multiple_ranges(self):
+        response = self._preview(HTTP_RANGE="bytes=0-4, 100-109")
+        self.assertEqual(response.status_code, 206)
+        self.assertTrue(response["Content-Type"].startswith("multipart/byteranges; boundary="))
+        body = b"".join(response.streaming_content)
+        self.assertEqual(len(body), int(response["Content-Length"]))
+        self.assertIn(b"Content-Range: bytes 0-4/", body)
+        self.assertIn(b"\r\n\r\n" + self.content[100:110] + b"\r\n--", body)
+
+    def test_unsatisfiable_range(self):
+        response = self._preview(HTTP_RANGE=f"bytes={len(self.content)}-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], f"bytes */{len(self.content)}")
+
+    def test_conditional_requests(self):
+        first = self._preview()
+        etag = first["ETag"]
+        self.assertFalse(etag.startswith("W/"))
+        self.assertEqual(first["Accept-Ranges"], "bytes")
+        self.assertEqual(self._preview(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self._preview(HTTP_IF_MODIFIED_SINCE=first["Last-Modified"]).status_code, 304)
+        # Stale If-Range validator: the whole file instead of the range
+        self.assertEqual(self._preview(HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE='"stale"').status_code, 200)
+        self.assertEqual(self._preview(HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE=etag).status_code, 206)
+
+    def test_partial_download_not_counted_twice(self):
+        url = f"/api/documents/{self.document.id}/download/"
+        self.client.get(url, HTTP_RANGE="bytes=0-99")
+        self.client.get(url, HTTP_RANGE="bytes=100-")
+        etag = self.client.head(url)["ETag"]
+        self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.document.refresh_from_db()
+        self.assertEqual(self.document.download_count, 1)
+
+
+@override_settings(
+    MEDIA_ROOT=MEDIA_ROOT,
+    RESPONSE_CACHE_ENABLED=False,
+    DOWNLOAD_COUNTER_FLUSH_SECONDS=0,
+    DOCUMENT_EVENTS_FLUSH_SECONDS=0,
+    FILE_DELIVERY_BACKEND="signed",
+    SIGNED_MEDIA_SECRET="s3cret",
+)
+class SignedMediaTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        user = User.objects.create_user("erin", "erin@example.com", "password123")
+        course = Course.objects.create(name="Maths", domain="maths")
+        self.document = PDFDocument(title="Géométrie", course=course, uploaded_by=user)
+        self.document.pdf_file.save("geo.pdf", ContentFile(b"%PDF-1.4 signed"), save=True)
+
+    def test_download_redirects_to_signed_link(self):
+        response = self.client.get(f"/api/documents/{self.document.id}/download/")
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response["Location"].startswith(f"/secure-media/dl/{encrypt_id(self.document.id)}/"))
+
+        served = self.client.get(response["Location"])
+        self.assertEqual(b"".join(served.streaming_content), b"%PDF-1.4 signed")
+        self.assertTrue(served["Content-Disposition"].startswith("attachment;"))
+        self.document.refresh_from_db()
+        self.assertEqual(self.document.download_count, 1)
+
+    def test_tampered_and_expired_links(self):
+        location = self.client.get(f"/api/documents/{self.document.id}/preview/")["Location"]
+        self.assertEqual(self.client.get(location.replace("/inline/", "/dl/")).status_code, 403)
+        expired = signed_media.signed_url(self.document, as_attachment=False, ttl=-10)
+        self.assertEqual(self.client.get(expired).status_code, 410)
+
+    def test_nginx_access_log_is_counted(self):
+        path = signed_media.media_path(self.document, as_attachment=True)
+        preview = signed_media.media_path(self.document, as_attachment=False)
+        lines = [
+            f"1760000000.123\t200\tGET\t\t{path}",
+            f"1760000001.000\t206\tGET\tbytes=0-1023\t{path}",
+            f"1760000002.000\t206\tGET\tbytes=1024-\t{path}",  # continuation: not counted
+            f"1760000003.000\t403\tGET\t\t{path}",
+            f"1760000004.000\t200\tGET\t\t{preview}",
+        ]
+        self.assertEqual(signed_media.ingest(lines), (2, 3))
+        self.document.refresh_from_db()
+        self.assertEqual(self.document.download_count, 2)
+        self.assertEqual(DocumentEvent.objects.filter(kind=DocumentEvent.PREVIEW).count(), 1)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, RESPONSE_CACHE_ENABLED=False, DOWNLOAD_COUNTER_FLUSH_SECONDS=60)
+class DownloadCounterTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user("erin", "erin@example.com", "password123")
+        course = Course.objects.create(name="Maths", domain="maths")
+        self.documents = []
+        for i in range(2):
+            document = PDFDocument(title=f"Doc {i}", course=course, uploaded_by=user)
+            document.pdf_file.save("doc.pdf", ContentFile(b"%PDF-1.4"), save=True)
+            self.documents.append(document)
+        reconcile()
+
+    def tearDown(self):
+        download_counters.flush()
+
+    def test_downloads_are_coalesced(self):
+        first, second = self.documents
+        with self.assertNumQueries(0):
+            for _ in range(50):
+                first.increment_download_count()
+            second.increment_download_count()
+        self.assertEqual(download_counters.pending_downloads(), {first.id: 50, second.id: 1})
+
+        # One UPDATE per document + platform counters, inside a transaction
+        with self.assertNumQueries(5):
+            self.assertEqual(download_counters.flush(), 51)
+        first.refresh_from_db()
+        self.assertEqual(first.download_count, 50)
+        self.assertEqual(PlatformStats.objects.get().total_downloads, 51)
+        self.assertEqual(download_counters.pending_downloads(), {})
+
+
+class BufferedWriterTests(SimpleTestCase):
+    def test_incomplete_writer_rejected(self):
+        class Unwritable(BufferedWriter):
+            def new_buffer(self):
+                return []
+
+            def add(self, buffer, item):
+                buffer.append(item)
+
+            def put_back(self, buffer, batch):
+                buffer[:0] = batch
+
+        with self.assertRaises(TypeError):
+            Unwritable(mock.Mock())
+
+
+@override_settings(
+    MEDIA_ROOT=MEDIA_ROOT,
+    RESPONSE_CACHE_ENABLED=False,
+    DOWNLOAD_COUNTER_FLUSH_SECONDS=0,
+    DOCUMENT_EVENTS_FLUSH_SECONDS=60,
+)
+class TrendingTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        user = User.objects.create_user("frank", "frank@example.com", "password123")
+        self.maths = Course.objects.create(name="Maths", domain="maths")
+        physics = Course.objects.create(name="Physique", domain="physique")
+        self.documents = []
+        for i, course in enumerate([self.maths, self.maths, physics]):
+            document = PDFDocument(title=f"Doc {i}", course=course, uploaded_by=user)
+            document.pdf_file.save("doc.pdf", ContentFile(b"%PDF-1.4"), save=True)
+            self.documents.append(document)
+
+    def tearDown(self):
+        document_events.flush()
+
+    def test_events_rollup_and_trending(self):
+        first, second, third = self.documents
+        for _ in range(3):
+            self.client.get(f"/api/documents/{second.id}/download/")
+        self.client.get(f"/api/documents/{first.id}/download/")
+        self.client.get(f"/api/documents/{third.id}/preview/")
+        self.assertEqual(DocumentEvent.objects.count(), 0)
+        self.assertEqual(document_events.flush(), 5)
+
+        # Old activity decays below a single fresh download
+        old = timezone.now() - timedelta(days=20)
+        DocumentEvent.objects.bulk_create(
+            [DocumentEvent(document=third, kind=DocumentEvent.DOWNLOAD, created_at=old) for _ in range(4)]
+        )
+        document_events.rollup(days=30)
+        daily = DocumentDailyStats.objects.get(document=third, date=timezone.localdate())
+        self.assertEqual((daily.downloads, daily.previews), (0, 1))
+
+        # Scores joined to the documents, then tags and courses: no raw event scan
+        with self.assertNumQueries(3):
+            response = self.client.get("/api/documents/trending/")
+        ids = [item["id"] for item in response.json()["results"]]
+        self.assertEqual(ids[:2], [second.id, first.id])
+
+        response = self.client.get("/api/documents/trending/", {"course": self.maths.id, "limit": 1})
+        self.assertEqual([item["id"] for item in response.json()["results"]], [second.id])
+
+    def test_events_of_deleted_document_dropped(self):
+        first, second, _ = self.documents
+        document_events.record(first.id, DocumentEvent.DOWNLOAD)
+        document_events.record(second.id, DocumentEvent.DOWNLOAD)
+        document_events.record(first.id, DocumentEvent.PREVIEW)
+        second.delete()
+        self.assertEqual(document_events.flush(), 2)
+        self.assertEqual(list(DocumentEvent.objects.values_list("document_id", flat=True)), [first.id, first.id])
+        self.assertEqual(document_events._writer.pending(), [])
+
+
+@override_settings(
+    MEDIA_ROOT=MEDIA_ROOT,
+    RESPONSE_CACHE_ENABLED=False,
+    DOWNLOAD_COUNTER_FLUSH_SECONDS=0,
+    DOCUMENT_EVENTS_FLUSH_SECONDS=0,
+)
+class ZipBundleTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user("grace", "grace@example.com", "password123")
+        self.plan, _ = APIPlan.objects.update_or_create(
+            code="free",
+            defaults={"name": "Free", "daily_requests_limit": 1000, "daily_download_limit": 3, "max_page_size": 100},
+        )
+        plaintext, prefix, key_hash = APIKey.generate()
+        self.api_key = APIKey.objects.create(user=user, prefix=prefix, key_hash=key_hash)
+        self.client = APIClient()
+        self.client.credentials(HTTP_X_API_KEY=plaintext)
+
+        course = Course.objects.create(name="Maths", domain="maths")
+        self.documents = []
+        for i in range(3):
+            document = PDFDocument(title=f"Chapitre {i}", course=course, uploaded_by=user)
+            document.pdf_file.save("doc.pdf", ContentFile(b"%PDF-1.4\n" + bytes([i]) * 100_000), save=True)
+            self.documents.append(document)
+
+    def _archive(self, response) -> zipfile.ZipFile:
+        self.assertEqual(response.status_code, 200, getattr(response, "content", b""))
+        self.assertEqual(response["Content-Type"], "application/zip")
+        return zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content)))
+
+    def test_bundle_by_ids(self):
+        ids = [encrypt_id(d.id) for d in self.documents[:2]]
+        archive = self._archive(self.client.post("/api/data/documents/bundle/", {"ids": ids}, format="json"))
+
+        manifest = json.loads(archive.read("manifest.json"))
+        self.assertEqual([entry["id"] for entry in manifest["documents"]], ids)
+        for entry, document in zip(manifest["documents"], self.documents):
+            self.assertEqual(archive.getinfo(entry["file"]).compress_type, zipfile.ZIP_STORED)
+            with document.pdf_file.open("rb") as f:
+                self.assertEqual(archive.read(entry["file"]), f.read())
+
+        self.assertEqual(APIUsageDaily.objects.get(api_key=self.api_key).downloads_count, 2)
+        self.documents[0].refresh_from_db()
+        self.assertEqual(self.documents[0].download_count, 1)
+
+    def test_bundle_by_filter_and_quota(self):
+        archive = self._archive(self.client.get("/api/data/documents/bundle/", {"domain": "maths", "limit": 2}))
+        self.assertEqual(len(archive.namelist()), 3)
+
+        # 2 of 3 downloads used: a 2-document bundle no longer fits
+        response = self.client.get("/api/data/documents/bundle/", {"domain": "maths", "limit": 2})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(APIUsageDaily.objects.get(api_key=self.api_key).downloads_count, 2)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, RESPONSE_CACHE_ENABLED=False)
+class DataTextTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user("heidi", "heidi@example.com", "password123")
+        APIPlan.objects.update_or_create(
+            code="free",
+            defaults={"name": "Free", "daily_requests_limit": 1000, "daily_text_limit": 3, "max_page_size": 100},
+        )
+        plaintext, prefix, key_hash = APIKey.generate()
+        self.api_key = APIKey.objects.create(user=user, prefix=prefix, key_hash=key_hash)
+        self.client = APIClient()
+        self.client.credentials(HTTP_X_API_KEY=plaintext)
+
+        course = Course.objects.create(name="Maths", domain="maths")
+        self.documents = []
+        for i in range(2):
+            document = PDFDocument(title=f"Chapitre {i}", course=course, uploaded_by=user)
+            document.pdf_file.save("doc.pdf", ContentFile(b"%PDF-1.4\n" + bytes([i]) * 1000), save=True)
+            # Text already extracted (as by the document chat)
+            path = document.pdf_file.path
+            PDFDocumentText.objects.create(
+                document=document,
+                pages=[f"Page un {i}", f"Page deux {i}"],
+                file_size=os.path.getsize(path),
+                file_mtime=os.path.getmtime(path),
+            )
+            self.documents.append(document)
+
+    def _usage(self):
+        return APIUsageDaily.objects.get(api_key=self.api_key)
+
+    def test_pages_as_json_or_text(self):
+        url = f"/api/data/documents/{encrypt_id(self.documents[0].id)}/text/"
+        data = self.client.get(url).json()
+        self.assertEqual(data["page_count"], 2)
+        self.assertEqual(data["pages"][1], {"page": 2, "text": "Page deux 0"})
+
+        response = self.client.get(url, {"format": "txt"})
+        self.assertEqual(response["Content-Type"], "text/plain; charset=utf-8")
+        self.assertEqual(response.content.decode(), "Page un 0\fPage deux 0")
+        self.assertEqual((self._usage().texts_count, self._usage().downloads_count), (2, 0))
+
+    def test_bulk_ndjson_gzipped(self):
+        ids = [encrypt_id(d.id) for d in self.documents]
+        response = self.client.post("/api/data/documents/text/", {"ids": ids}, format="json", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        lines = gzip.decompress(b"".join(response.streaming_content)).decode().splitlines()
+        self.assertEqual([json.loads(line)["id"] for line in lines], ids)
+        self.assertEqual(self._usage().texts_count, 2)
+
+        # Two more do not fit in the quota of 3
+        self.assertEqual(self.client.post("/api/data/documents/text/", {"ids": ids}, format="json").status_code, 429)
+
+    def test_bulk_charges_delivered_texts_only(self):
+        broken = self.documents[1]
+
+        def pages(document):
+            if document == broken:
+                raise PDFTextExtractionError("pdftotext failed")
+            return ["Page un"]
+
+        ids = [encrypt_id(d.id) for d in self.documents]
+        with mock.patch("courses.text_export.document_pages", side_effect=pages):
+            response = self.client.post("/api/data/documents/text/", {"ids": ids}, format="json")
+            lines = [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(lines[1], {"id": ids[1], "error": "Texte indisponible."})
+        self.assertEqual(self._usage().texts_count, 1)
+
+    def test_quota_checked_before_extraction(self):
+        APIUsageDaily.objects.update_or_create(api_key=self.api_key, date=timezone.localdate(), defaults={"texts_count": 3})
+        with mock.patch("courses.api_views.document_pages") as pages:
+            response = self.client.get(f"/api/data/documents/{encrypt_id(self.documents[0].id)}/text/")
+        self.assertEqual(response.status_code, 429)
+        pages.assert_not_called()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, RESPONSE_CACHE_ENABLED=False)
+class ContentAddressedStorageTests(TestCase):
+    content = b"%PDF-1.4\n" + b"identique" * 1000
+
+    def setUp(self):
+        self.user = User.objects.create_user("heidi", "heidi@example.com", "password123")
+        self.course = Course.objects.create(name="Maths", domain="maths")
+        level = StudyLevel.objects.create(key="lycee", name="Lycée")
+        self.sublevel = StudySubLevel.objects.create(level=level, key="tle", name="Terminale")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _upload(self, content: bytes, name: str = "cours.pdf") -> PDFDocument:
+        upload = SimpleUploadedFile(name, content, content_type="application/pdf")
+        response = self.client.post(
+            "/api/documents/", {"title": name, "course_id": self.course.id, "study_sublevel_id": self.sublevel.id, "pdf_file": upload}, format="multipart"
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        return PDFDocument.objects.latest("id")
+
+    def test_identical_uploads_share_one_blob(self):
+        first = self._upload(self.content, "a.pdf")
+        second = self._upload(self.content, "b.pdf")
+        digest = hashlib.sha256(self.content).hexdigest()
+
+        self.assertEqual(first.blob_id, digest)
+        self.assertEqual(first.pdf_file.name, f"pdfs/sha256/{digest[:2]}/{digest[2:4]}/{digest}.pdf")
+        self.assertEqual(second.pdf_file.name, first.pdf_file.name)
+        self.assertEqual(PdfBlob.objects.count(), 1)
+
+        # Reference-counted cleanup: the file goes with the last document
+        storage = first.pdf_file.storage
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(storage.exists(second.pdf_file.name))
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(storage.exists(second.pdf_file.name))
+        self.assertFalse(PdfBlob.objects.exists())
+
+    def test_every_save_path_is_content_addressed(self):
+        document = PDFDocument(title="Direct", course=self.course, uploaded_by=self.user)
+        document.pdf_file.save("direct.pdf", ContentFile(self.content), save=True)
+        digest = hashlib.sha256(self.content).hexdigest()
+        self.assertEqual((document.blob_id, document.pdf_file.name), (digest, blob_name(digest)))
+        self.assertEqual(document.file_size, len(self.content))
+
+        # Replacing the file releases the previous blob (last reference): row and file
+        storage = document.pdf_file.storage
+        document.pdf_file.save("autre.pdf", ContentFile(self.content + b"v2"), save=True)
+        self.assertFalse(storage.exists(blob_name(digest)))
+        self.assertEqual(list(PdfBlob.objects.values_list("sha256", flat=True)), [document.blob_id])
+
+    def test_blob_stored_again_after_release(self):
+        first = self._upload(self.content)
+        name = first.pdf_file.name
+        first.delete()
+        self.assertFalse(first.pdf_file.storage.exists(name))
+        second = self._upload(self.content)
+        self.assertEqual(second.pdf_file.name, name)
+        self.assertTrue(second.pdf_file.storage.exists(name))
+
+    def test_upload_hashed_while_streaming(self):
+        handler = HashingTemporaryFileUploadHandler()
+        handler.new_file("pdf_file", "x.pdf", "application/pdf", len(self.content))
+        handler.receive_data_chunk(self.content[:10], 0)
+        handler.receive_data_chunk(self.content[10:], 10)
+        uploaded = handler.file_complete(len(self.content))
+        self.assertEqual(uploaded.sha256, hashlib.sha256(self.content).hexdigest())
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, RESPONSE_CACHE_ENABLED=False, THUMBNAILS_ASYNC=False)
+class PageImageTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        user = User.objects.create_user("ivan", "ivan@example.com", "password123")
+        course = Course.objects.create(name="Maths", domain="maths")
+        self.document = PDFDocument(title="Géométrie", course=course, uploaded_by=user)
+        self.document.pdf_file.save("geo.pdf", ContentFile(one_page_pdf()), save=True)
+        self.url = f"/api/documents/{self.document.id}/pages/"
+        cache.clear()
+        self.addCleanup(page_images.delete_images, page_images.content_key(self.document))
+
+    @skipUnless(page_images.is_available(), "Pillow non installé")
+    def test_list_exposes_versioned_thumbnails(self):
+        item = self.client.get("/api/documents/").json()["results"][0]
+        self.assertEqual(set(item["thumbnails"]), {"160", "320", "640"})
+        self.assertIn(f"/pages/1.webp?w=320&v={page_images.content_key(self.document)[:16]}", item["thumbnails"]["320"])
+
+    def test_only_allowed_widths(self):
+        response = self.client.get(f"/api/documents/{self.document.id}/pages/1.webp", {"w": 123})
+        self.assertEqual(response.status_code, 400)
+
+    @skipUnless(page_images.is_available() and shutil.which("pdftoppm"), "pdftoppm / Pillow absents")
+    def test_page_rendered_once(self):
+        url = f"/api/documents/{self.document.id}/pages/1.webp"
+        response = self.client.get(url, {"w": 160, "v": page_images.content_key(self.document)[:16]})
+        self.assertEqual(response["Content-Type"], "image/webp")
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertEqual(self.client.get(url, {"w": 160}, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+
+    def test_pages_past_the_end_not_rendered(self):
+        path = self.document.pdf_file.path
+        PDFDocumentText.objects.create(
+            document=self.document, pages=["Page un"], file_size=os.path.getsize(path), file_mtime=os.path.getmtime(path)
+        )
+        with mock.patch.object(page_images, "render_page") as render:
+            self.assertEqual(self.client.get(f"{self.url}2.webp", {"w": 160}).status_code, 404)
+        render.assert_not_called()
+
+    def test_missing_page_remembered(self):
+        missing = page_images.PageNotFound("Page 5 inexistante")
+        with mock.patch.object(page_images, "render_page", side_effect=missing) as render:
+            for page in (5, 5, 9):
+                self.assertEqual(self.client.get(f"{self.url}{page}.webp", {"w": 160}).status_code, 404)
+        self.assertEqual(render.call_count, 1)
+
+    def test_concurrent_requests_render_once(self):
+        def slow_render(path, page, width):
+            time.sleep(0.2)
+            return b"RIFF"
+
+        with mock.patch.object(page_images, "render_page", side_effect=slow_render) as render:
+            threads = [threading.Thread(target=page_images.page_image, args=(self.document, 1, 320)) for _ in range(3)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(render.call_count, 1)
+
+
+class UserActivityTests(TransactionTestCase):
+    def setUp(self):
+        utils_tracking._recent.clear()
+        utils_tracking.reset_geoip()
+        self.user = User.objects.create_user("judy", "judy@example.com", "password123")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_geolocation_off_the_request_path(self):
+        lookups = []
+
+        def fake_lookup(ip):
+            lookups.append(threading.get_ident())
+            return SimpleNamespace(ok=True, city="Cotonou", country="BJ", latlng=[6.37, 2.39])
+
+        with mock.patch.object(utils_tracking.geocoder, "ip", side_effect=fake_lookup):
+            self.client.get("/api/profile/", REMOTE_ADDR="8.8.8.8", HTTP_USER_AGENT="Mozilla/5.0")
+            utils_tracking.wait_for_pending()
+            # Same client again: no new row, no lookup
+            self.client.get("/api/profile/", REMOTE_ADDR="8.8.8.8", HTTP_USER_AGENT="Mozilla/5.0")
+            utils_tracking.wait_for_pending()
+
+        self.assertEqual(len(lookups), 1)
+        self.assertNotEqual(lookups[0], threading.get_ident())
+        activity = UserActivity.objects.get(user=self.user)
+        self.assertEqual((activity.ip_address, activity.city), ("8.8.8.8", "Cotonou"))
+
+    @override_settings(GEOIP_DATABASE="", GEOIP_NETWORK_FALLBACK=True)
+    def test_lookups_cached_and_failures_retried(self):
+        answers = [RuntimeError("rate limited"), SimpleNamespace(ok=True, city="Paris", country="FR", latlng=[48.8, 2.3])]
+        with mock.patch.object(utils_tracking.geocoder, "ip", side_effect=answers) as lookup:
+            self.assertEqual(utils_tracking.locate_ip("8.8.4.4")["city"], "")
+            self.assertEqual(utils_tracking.locate_ip("8.8.4.4")["city"], "Paris")
+            self.assertEqual(utils_tracking.locate_ip("8.8.4.4")["country"], "FR")
+            self.assertEqual(utils_tracking.locate_ip("10.0.0.1")["city"], "")
+        self.assertEqual(lookup.call_count, 2)
+
+    @override_settings(GEOIP_DATABASE="", GEOIP_NETWORK_FALLBACK=False)
+    def test_offline_without_database(self):
+        with mock.patch.object(utils_tracking.geocoder, "ip") as lookup:
+            self.assertEqual(utils_tracking.locate_ip("1.1.1.1")["country"], "")
+        lookup.assert_not_called()
+
+
+@override_settings(GROQ_HEDGE_DEFAULT_DELAY=0.2, GROQ_HEDGE_MIN_DELAY=0.0, GROQ_HEDGE_MIN_SAMPLES=1000)
+class HedgingTests(SimpleTestCase):
+    def setUp(self):
+        groq_llm._hedge_tokens = groq_llm._HEDGE_TOKENS_MAX
+
+    def test_slow_model_is_hedged(self):
+        def call(model, token):
+            token.mark_started()
+            if model == "slow":
+                token._event.wait(5)
+                raise groq_llm.GroqCancelled("Groq call cancelled")
+            return {"model": model}
+
+        started = time.monotonic()
+        result = groq_llm._hedged_relay(["slow", "fast"], call)
+        self.assertEqual(result["model"], "fast")
+        self.assertTrue(result["hedged"])
+        self.assertLess(time.monotonic() - started, 2)
+
+    def test_queueing_does_not_count_toward_hedge_delay(self):
+        calls = []
+
+        def call(model, token):
+            calls.append(model)
+            time.sleep(0.3)  # waiting for an outbound slot
+            token.mark_started()
+            time.sleep(0.1)
+            return {"model": model}
+
+        result = groq_llm._hedged_relay(["first", "second"], call)
+        self.assertEqual(calls, ["first"])
+        self.assertFalse(result["hedged"])
+
+
+@override_settings(GROQ_API_KEY="test-key", GROQ_MODELS=["model-a"], GROQ_CIRCUIT_FAILURE_THRESHOLD=2, GROQ_CIRCUIT_COOLDOWN=60)
+class GroqLimiterTests(SimpleTestCase):
+    def setUp(self):
+        groq_llm._circuit_success()
+        self.addCleanup(groq_llm._circuit_success)
+        self.addCleanup(setattr, groq_llm, "_outbound", None)
+        groq_llm._outbound = threading.BoundedSemaphore(1)
+
+    def test_slot_wait_bounded_by_deadline(self):
+        groq_llm._outbound.acquire()
+        started = time.monotonic()
+        with mock.patch("urllib.request.urlopen") as urlopen:
+            with self.assertRaises(groq_llm.GroqDeadlineExceeded):
+                groq_llm.groq_chat_completion([{"role": "user", "content": "?"}], deadline=started + 0.3)
+        urlopen.assert_not_called()
+        self.assertLess(time.monotonic() - started, 1)
+        # Local saturation is not a Groq outage
+        self.assertFalse(groq_llm.circuit_is_open())
+
+    def test_deadline_spent_before_sending_not_an_outage(self):
+        with mock.patch("urllib.request.urlopen") as urlopen:
+            for _ in range(3):
+                with self.assertRaises(groq_llm.GroqDeadlineExceeded):
+                    groq_llm.groq_chat_completion([{"role": "user", "content": "?"}], deadline=time.monotonic())
+        urlopen.assert_not_called()
+        self.assertFalse(groq_llm.circuit_is_open())
+
+    def test_failure_before_deadline_spent_counted(self):
+        failure = groq_llm.GroqError("Service Unavailable", status=503)
+
+        def post(*args, deadline=None, **kwargs):
+            time.sleep(max(deadline - time.monotonic(), 0))
+            raise failure
+
+        with override_settings(GROQ_MODELS=["model-a", "model-b"]), mock.patch.object(groq_llm, "_post_json", post):
+            for _ in range(2):
+                with self.assertRaises(groq_llm.GroqDeadlineExceeded):
+                    groq_llm.groq_chat_completion([{"role": "user", "content": "?"}], deadline=time.monotonic() + 0.05)
+        self.assertTrue(groq_llm.circuit_is_open())
+
+    def test_circuit_opens_after_failures(self):
+        failure = groq_llm.GroqError("Service Unavailable", status=503)
+        with mock.patch.object(groq_llm, "_post_json", side_effect=failure) as post:
+            for _ in range(2):
+                with self.assertRaises(groq_llm.GroqError):
+                    groq_llm.groq_chat_completion([{"role": "user", "content": "?"}])
+            self.assertTrue(groq_llm.circuit_is_open())
+            with self.assertRaises(groq_llm.GroqUnavailable):
+                groq_llm.groq_chat_completion([{"role": "user", "content": "?"}])
+        self.assertEqual(post.call_count, 2)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, RESPONSE_CACHE_ENABLED=False)
+class DocumentChatTests(TestCase):
+    pages = [
+        "La photosynthèse transforme la lumière en énergie chimique. La chlorophylle capte la lumière.",
+        "La respiration cellulaire a lieu dans la mitochondrie. Elle libère l'énergie du glucose.",
+    ]
+
+    def setUp(self):
+        self.user = User.objects.create_user("kim", "kim@example.com", "password123")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.document = document_with_text(self.user, self.pages)
+        self.url = f"/api/documents/{self.document.id}/chat/"
+
+    def _ask(self, body, answer="Réponse (p. 1)."):
+        with mock.patch("courses.chat_views.groq_chat_completion", return_value={"content": answer, "model": "m"}) as llm:
+            response = self.client.post(self.url, body, format="json")
+        self.assertEqual(response.status_code, 200)
+        return response.json(), llm.call_args[0][0]
+
+    def test_conversation_continued_server_side(self):
+        first, _ = self._ask({"message": "Qu'est-ce que la photosynthèse ?"})
+        second, messages = self._ask({"message": "Et la chlorophylle ?", "conversation_id": first["conversation_id"]})
+        self.assertEqual(second["conversation_id"], first["conversation_id"])
+        self.assertIn("Qu'est-ce que la photosynthèse ?", [m["content"] for m in messages])
+        conversation = ChatConversation.objects.get()
+        self.assertEqual(conversation.messages.count(), 4)
+
+    def test_legacy_history_not_persisted(self):
+        data, messages = self._ask(
+            {"message": "Et ensuite ?", "history": [{"role": "user", "content": "Parle de la mitochondrie"}]}
+        )
+        self.assertNotIn("conversation_id", data)
+        self.assertIn("Parle de la mitochondrie", [m["content"] for m in messages])
+        self.assertFalse(ChatConversation.objects.exists())
+
+    def test_old_turns_folded_into_memo(self):
+        conversation = ChatConversation(user=self.user, document=self.document)
+        for i in range(5):
+            chat_sessions.record_turn(conversation, f"Question {i}", f"Réponse {i}. Détails (p. 2).", [])
+        self.assertEqual(conversation.summarized_count, 6)
+        self.assertEqual(len(conversation.summary.splitlines()), 3)
+        self.assertIn("Q : Question 0 → R : Réponse 0. (p. 2)", conversation.summary)
+        self.assertEqual(
+            [m["content"] for m in chat_sessions.recent_history(conversation)],
+            ["Question 3", "Réponse 3. Détails (p. 2).", "Question 4", "Réponse 4. Détails (p. 2)."],
+        )
+
+    def test_new_question_ranked_afresh(self):
+        index = load_document_index(self.document)
+        everything = [c.chunk_id for c in index.chunks]
+        chunks, reused = select_chunks(index, "Où a lieu la respiration cellulaire ?", everything)
+        self.assertFalse(reused)
+        self.assertEqual(chunks[0].page, 2)
+        # A follow-up without any document term keeps the previous chunks
+        self.assertEqual(select_chunks(index, "Et pourquoi ?", everything), ([c for c in index.chunks], True))
+
+    def _ask_failing(self, error):
+        with mock.patch("courses.chat_views.groq_chat_completion", side_effect=error):
+            return self.client.post(self.url, {"message": "Où a lieu la respiration cellulaire ?"}, format="json")
+
+    def test_extractive_answer_when_groq_unavailable(self):
+        response = self._ask_failing(groq_llm.GroqUnavailable("Groq circuit open", status=503))
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertTrue(data["degraded"])
+        self.assertEqual(data["model"], "extractive")
+        self.assertEqual(data["sources"][0]["page"], 2)
+        self.assertIn("mitochondrie", " ".join(data["sources"][0]["highlights"]))
+        self.assertIn("**(p. 2)**", data["answer"])
+
+    def test_configuration_error_not_degraded(self):
+        response = self._ask_failing(groq_llm.GroqError("invalid api key", status=401))
+        self.assertEqual(response.status_code, 503)
+        self.assertNotIn("degraded", response.json())
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, RESPONSE_CACHE_ENABLED=False)
+class ChatBatchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("lou", "lou@example.com", "password123")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.document = document_with_text(self.user, DocumentChatTests.pages)
+        self.url = f"/api/documents/{self.document.id}/chat/batch/"
+
+    @override_settings(CHAT_DEADLINE_SECONDS=1, CHAT_BATCH_CONCURRENCY=1)
+    def test_deadline_per_question(self):
+        budgets = []
+
+        def answer(messages, deadline):
+            budgets.append(deadline - time.monotonic())
+            time.sleep(0.1)
+            return {"content": "Réponse.", "model": "m"}
+
+        with mock.patch("courses.chat_views.groq_chat_completion", side_effect=answer):
+            response = self.client.post(self.url, {"questions": ["Un ?", "Deux ?", "Trois ?", "Quatre ?"]}, format="json")
+        self.assertEqual(response.status_code, 200)
+        # Questions started last still get the whole budget
+        self.assertEqual(len(budgets), 4)
+        self.assertGreater(min(budgets), 0.9)
+
+    def _post(self, body, answer):
+        def llm(messages, deadline):
+            return answer(messages[-1]["content"].rsplit("QUESTION :\n", 1)[1])
+
+        with mock.patch("courses.chat_views.groq_chat_completion", side_effect=llm):
+            response = self.client.post(self.url, body, format="json")
+            self.assertEqual(response.status_code, 200)
+            if response.streaming:
+                # The answers are computed while the stream is read
+                return [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+            return response.json()["results"]
+
+    @override_settings(CHAT_BATCH_MAX_QUESTIONS=2)
+    def test_invalid_questions(self):
+        for questions, detail in [
+            ("Une question ?", "questions doit être une liste."),
+            (["", "  "], "Au moins une question requise."),
+            (["Un ?", "Deux ?", "Trois ?"], "2 questions maximum par lot."),
+        ]:
+            response = self.client.post(self.url, {"questions": questions}, format="json")
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json()["detail"], detail)
+
+    def test_results_in_question_order(self):
+        def answer(question):
+            # The first question answers last
+            time.sleep(0.2 if question == "Photosynthèse ?" else 0)
+            return {"content": f"À propos de {question}", "model": "m"}
+
+        with mock.patch("courses.chat_views.load_document_index", wraps=load_document_index) as load:
+            results = self._post({"questions": ["Photosynthèse ?", "Mitochondrie ?", "Glucose ?"]}, answer)
+        load.assert_called_once()
+        self.assertEqual([r["index"] for r in results], [0, 1, 2])
+        self.assertEqual([r["answer"] for r in results], [f"À propos de {r['question']}" for r in results])
+        self.assertEqual(results[1]["sources"][0]["page"], 2)
+
+    def test_streamed_as_completed(self):
+        def answer(question):
+            time.sleep(0.2 if question == "Photosynthèse ?" else 0)
+            return {"content": "Réponse.", "model": "m"}
+
+        lines = self._post({"questions": ["Photosynthèse ?", "Mitochondrie ?"], "stream": True}, answer)
+        self.assertEqual([line["index"] for line in lines], [1, 0])
+        self.assertEqual({line["answer"] for line in lines}, {"Réponse."})
+
+    def test_failed_question(self):
+        def answer(question):
+            if question == "Photosynthèse ?":
+                raise groq_llm.GroqUnavailable("Groq circuit open", status=503)
+            if question == "Mitochondrie ?":
+                raise groq_llm.GroqError("invalid api key", status=401)
+            return {"content": "Réponse.", "model": "m"}
+
+        degraded, config_error, answered = self._post(
+            {"questions": ["Photosynthèse ?", "Mitochondrie ?", "Glucose ?"]}, answer
+        )
+        self.assertTrue(degraded["degraded"])
+        self.assertEqual(degraded["model"], "extractive")
+        self.assertIn("clé GROQ invalide", config_error["error"]["detail"])
+        self.assertNotIn("answer", config_error)
+        self.assertEqual(answered["answer"], "Réponse.")
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, RESPONSE_CACHE_ENABLED=False)
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        user = User.objects.create_user("leo", "leo@example.com", "password123")
+        course = Course.objects.create(name="Chimie", domain="chimie")
+        created_at = timezone.now().replace(microsecond=123000)
+        self.ids = []
+        # Same millisecond, different microseconds
+        for i in range(4):
+            document = PDFDocument(title=f"Chimie organique {i}", course=course, uploaded_by=user)
+            document.pdf_file.save("chimie.pdf", ContentFile(b"%PDF-1.4"), save=True)
+            PDFDocument.objects.filter(pk=document.pk).update(created_at=created_at + timedelta(microseconds=100 * i))
+            self.ids.append(document.id)
+
+    def _walk(self, params: dict) -> list[int]:
+        seen, url = [], "/api/documents/"
+        while url:
+            data = self.client.get(url, params).json()
+            seen += [item["id"] for item in data["results"]]
+            url, params = data["next"], {}
+        return seen
+
+    def test_rows_of_the_same_millisecond_not_skipped(self):
+        self.assertEqual(self._walk({"page_size": 1}), self.ids[::-1])
+        self.assertEqual(sorted(self._walk({"page_size": 1, "search": "organique"})), self.ids)
+
+    def test_paginated_by_default(self):
+        with mock.patch("courses.pagination.KeysetPagination.page_size", 3):
+            data = self.client.get("/api/documents/").json()
+        self.assertEqual([item["id"] for item in data["results"]], self.ids[:0:-1])
+        self.assertIn("cursor=", data["next"])
+
+    def test_sorted_pages(self):
+        PDFDocument.objects.filter(pk=self.ids[1]).update(download_count=5, title="Acides")
+        PDFDocument.objects.filter(pk=self.ids[2]).update(download_count=5)
+        self.assertEqual(
+            self._walk({"page_size": 1, "sort": "popular"}), [self.ids[2], self.ids[1], self.ids[3], self.ids[0]]
+        )
+        self.assertEqual(self._walk({"page_size": 2, "sort": "title"}), [self.ids[1], self.ids[0], self.ids[2], self.ids[3]])
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, RESPONSE_CACHE_ENABLED=False)
+class DataPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user("mia", "mia@example.com", "password123")
+        APIPlan.objects.update_or_create(
+            code="free", defaults={"name": "Free", "daily_requests_limit": 1000, "max_page_size": 100}
+        )
+        plaintext, prefix, key_hash = APIKey.generate()
+        APIKey.objects.create(user=user, prefix=prefix, key_hash=key_hash)
+        self.client = APIClient()
+        self.client.credentials(HTTP_X_API_KEY=plaintext)
+        course = Course.objects.create(name="Physique", domain="physique")
+        for i in range(3):
+            document = PDFDocument(title=f"Optique {i}", course=course, uploaded_by=user)
+            document.pdf_file.save("optique.pdf", ContentFile(b"%PDF-1.4"), save=True)
+
+    def _get(self, **params):
+        response = self.client.get("/api/data/documents/", {"page_size": 2, **params})
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_page_mode_by_default(self):
+        first = self._get()
+        self.assertEqual((first["count"], first["has_next"], first["previous"]), (3, True, None))
+        second = self.client.get(first["next"]).json()
+        self.assertEqual(len(second["results"]), 1)
+        self.assertIsNotNone(second["previous"])
+
+    def test_cursor_mode_without_count(self):
+        first = self._get(cursor="")
+        self.assertNotIn("count", first)
+        self.assertNotIn("previous", first)
+        self.assertIn("cursor=", first["next"])
+        second = self.client.get(first["next"]).json()
+        self.assertEqual((len(second["results"]), second["has_next"]), (1, False))
+
+    def test_estimated_count(self):
+        data = self._get(count="estimated")
+        self.assertEqual((data["count"], data["count_estimated"]), (3, True))
+        self.assertEqual(self.client.get("/api/data/documents/", {"count": "some"}).status_code, 400)
+
+
+class PromptPackerTests(SimpleTestCase):
+    def _chunk(self, chunk_id: int, page: int, words: int, word: str = "mot") -> Chunk:
+        text = " ".join(f"{word}{i}" for i in range(words))
+        return Chunk(chunk_id, page, text, text.split())
+
+    def test_best_chunks_then_recent_history_within_budget(self):
+        best, too_big, other = self._chunk(0, 1, 40), self._chunk(1, 2, 2000), self._chunk(2, 3, 40)
+        history = [{"role": "user", "content": f"question {i} " * 40} for i in range(6)]
+        packed = pack_prompt(
+            system="Système",
+            ranked_chunks=[best, too_big, other],
+            history=history,
+            render_user=lambda context: f"{context}\n\nQUESTION : ?",
+            budget=400,
+        )
+        self.assertEqual([c.chunk_id for c in packed.chunks], [0, 2])
+        self.assertLessEqual(packed.estimated_tokens, 400)
+        kept = [m["content"] for m in packed.messages[1:-1]]
+        self.assertTrue(kept)
+        self.assertEqual(kept, [m["content"] for m in history[-len(kept):]])
+
+    def test_adjacent_chunks_send_their_overlap_once(self):
+        first = Chunk(4, 2, "un deux trois quatre", ["un", "deux", "trois", "quatre"])
+        second = Chunk(5, 2, "trois quatre cinq six", ["trois", "quatre", "cinq", "six"])
+        self.assertEqual(render_context([second, first]), "[Page 2]\nun deux trois quatre cinq six")
+
+    @override_settings(GROQ_MODELS=["a", "b"], GROQ_PROMPT_TOKEN_BUDGETS={"a": 8000, "b": 3000})
+    def test_smallest_budget_without_model(self):
+        self.assertEqual(prompt_token_budget(), 3000)
+        self.assertEqual(prompt_token_budget("a"), 8000)
+
+
+class GroqStandinTests(SimpleTestCase):
+    def _serve(self, **options) -> str:
+        server = groq_standin.make_server("127.0.0.1", 0, groq_standin.StandinConfig(latency_ms=0, jitter_ms=0, seed=1, **options))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.addCleanup(groq_llm._circuit_success)
+        self.stats = server.RequestHandlerClass.stats
+        return f"http://127.0.0.1:{server.server_address[1]}/openai/v1"
+
+    def _complete(self, base_url: str) -> dict:
+        messages = [{"role": "user", "content": "[Page 3]\nLe théorème de Pythagore.\n\nQUESTION : ?"}]
+        with self.settings(GROQ_BASE_URL=base_url, GROQ_API_KEY="test-key", GROQ_MODELS=["model-a"]):
+            return groq_llm.groq_chat_completion(messages, hedge=False)
+
+    def test_answers_like_groq(self):
+        base_url = self._serve(disable_responses=True)
+        result = self._complete(base_url)
+        self.assertEqual(result["model"], "model-a")
+        self.assertIn("**(p. 3)**", result["content"])
+        # Responses API refused: relayed to chat completions
+        self.assertEqual(self.stats.snapshot(), {"calls_responses": 1, "status_404": 1, "calls_chat": 1, "status_200": 1})
+
+    def test_injected_errors(self):
+        base_url = self._serve(rate_5xx=1.0)
+        with self.assertRaises(groq_llm.GroqError) as raised:
+            self._complete(base_url)
+        self.assertEqual(raised.exception.status, 503)
+
+
+class ContextCompressionTests(SimpleTestCase):
+    pages = [
+        "La cellule est l'unité du vivant. Elle possède une membrane. Le noyau contient l'ADN. "
+        "La mitochondrie produit l'énergie. Le ribosome fabrique les protéines. "
+        "L'appareil de Golgi trie les protéines. Le réticulum transporte les molécules.",
+        "La photosynthèse a lieu dans le chloroplaste. Les plantes captent la lumière.",
+    ]
+
+    def setUp(self):
+        self.index = BM25Index(build_chunks(self.pages))
+
+    def test_best_sentences_and_neighbours_kept(self):
+        compressed = compress_chunks(self.index, self.index.chunks, "Que produit la mitochondrie ?")
+        self.assertEqual([(c.chunk_id, c.page) for c in compressed], [(0, 1), (1, 2)])
+        self.assertEqual(
+            compressed[0].text,
+            "Le noyau contient l'ADN. La mitochondrie produit l'énergie. Le ribosome fabrique les protéines.",
+        )
+
+    def test_removed_sentences_marked(self):
+        compressed = compress_chunks(self.index, self.index.chunks[:1], "cellule ribosome", neighbours=0)
+        self.assertEqual(
+            compressed[0].text,
+            f"La cellule est l'unité du vivant. {COMPRESSION_GAP} Le ribosome fabrique les protéines.",
+        )
+
+    def test_chunk_without_match_kept_whole(self):
+        compressed = compress_chunks(self.index, self.index.chunks, "Et pourquoi ?")
+        self.assertEqual([c.text for c in compressed], [c.text for c in self.index.chunks])
+
+    def test_overlapping_sentences_not_repeated(self):
+        chunk = self.index.chunks[0]
+        overlap = Chunk(1, chunk.page, chunk.text, chunk.tokens)
+        compressed = compress_chunks(self.index, [chunk, overlap], "Que produit la mitochondrie ?")
+        self.assertEqual([c.chunk_id for c in compressed], [0])
+
+    def test_prompt_compressed_sources_whole(self):
+        document = SimpleNamespace(title="Cellule", pk=1)
+        question = "Que produit la mitochondrie ?"
+        messages, sources = build_prompt(document, question, index=self.index, compress=True)
+        full_messages, full_sources = build_prompt(document, question, index=self.index, compress=False)
+        self.assertNotIn("réticulum", messages[-1]["content"])
+        self.assertIn("réticulum", full_messages[-1]["content"])
+        # Excerpts shown to the user come from the original chunks
+        self.assertEqual(sources, full_sources)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, RESPONSE_CACHE_ENABLED=False)
+class DocumentSearchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user("ada", "ada@example.com", "password123")
+        self.course = Course.objects.create(name="Mathématiques", domain="maths")
+
+    def _document(self, title, description=""):
+        document = PDFDocument(title=title, description=description, course=self.course, uploaded_by=self.user)
+        document.pdf_file.save("doc.pdf", ContentFile(b"%PDF-1.4\n" + title.encode()), save=True)
+        return document
+
+    def _search(self, search):
+        response = self.client.get("/api/documents/", {"search": search})
+        self.assertEqual(response.status_code, 200)
+        return [d["title"] for d in response.json()["results"]]
+
+    def test_ranked_by_relevance(self):
+        self._document("Exercices corrigés", "Applications du théorème de Pythagore")
+        self._document("Le théorème de Pythagore")
+        self._document("Fonctions dérivées")
+        # Prefix match, accents ignored, title weighted above description
+        self.assertEqual(self._search("theoreme pythag"), ["Le théorème de Pythagore", "Exercices corrigés"])
+
+    def test_index_follows_tags_and_course(self):
+        document = self._document("Chapitre 1")
+        self.assertEqual(self._search("géométrie"), [])
+        document.tags.add(Tag.objects.create(key="geo", name="Géométrie"))
+        self.assertEqual(self._search("géométrie"), ["Chapitre 1"])
+        self.course.name = "Algèbre"
+        self.course.save()
+        self.assertEqual(self._search("algebre"), ["Chapitre 1"])
+        self.assertEqual(self._search("mathématiques"), [])
+
+    @skipUnless(connection.vendor == "sqlite", "FTS5 index rows")
+    def test_deleted_document_unindexed(self):
+        document = self._document("Probabilités")
+        document.delete()
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT count(*) FROM {search_index.TABLE}")
+            self.assertEqual(cursor.fetchone()[0], 0)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, RESPONSE_CACHE_ENABLED=False)
+class DocumentFacetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user("noa", "noa@example.com", "password123")
+        self.maths = Course.objects.create(name="Maths", domain="maths")
+        self.physics = Course.objects.create(name="Physique", domain="physique")
+        self.exam = Tag.objects.create(key="examen", name="Examen")
+        self._document(self.maths, tagged=True)
+        self._document(self.maths)
+        self._document(self.physics, tagged=True)
+        self._document(self.physics, is_active=False)
+
+    def _document(self, course, tagged=False, is_active=True):
+        document = PDFDocument(title="Sujet", course=course, uploaded_by=self.user, is_active=is_active)
+        document.pdf_file.save("sujet.pdf", ContentFile(b"%PDF-1.4\n" + os.urandom(8)), save=True)
+        if tagged:
+            document.tags.add(self.exam)
+        return document
+
+    def _facets(self, **params):
+        response = self.client.get("/api/documents/facets/", params)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        return data["total"], {c["name"]: c["count"] for c in data["courses"]}, {t["key"]: t["count"] for t in data["tags"]}
+
+    def test_counts_active_documents(self):
+        self.assertEqual(self._facets(), (3, {"Maths": 2, "Physique": 1}, {"examen": 2}))
+
+    def test_menu_counted_without_its_own_filter(self):
+        total, courses, tags = self._facets(course=self.maths.id)
+        self.assertEqual(total, 2)
+        # The other courses stay selectable; tags follow the course filter
+        self.assertEqual(courses, {"Maths": 2, "Physique": 1})
+        self.assertEqual(tags, {"examen": 1})
+        self.assertEqual(self._facets(tag="examen"), (2, {"Maths": 1, "Physique": 1}, {"examen": 2}))
+
+    def test_cached_until_documents_change(self):
+        facets.document_facets()
+        with self.assertNumQueries(0):
+            self.assertEqual(facets.document_facets()["total"], 3)
+        self._document(self.physics)
+        self.assertEqual(facets.document_facets()["total"], 4)
+        self.exam.delete()
+        self.assertEqual(facets.document_facets()["tags"], [])
+
+    def test_estimated_count(self):
+        self.assertEqual(facets.estimate_count(QueryDict("domain=maths")), 2)
+        self.assertEqual(facets.estimate_count(QueryDict("domain=maths&tag=examen")), 1)
+        self.assertIsNone(facets.estimate_count(QueryDict("search=sujet")))
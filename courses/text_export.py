@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Text export — the extracted text of PDFs for the Data API.
+Developed by Marino ATOHOUN.
+
+The pages come from PDFDocumentText (the cache filled for the document
+chat; extracted with pdftotext on first use), so API consumers get the text
+without downloading the PDFs — typically ~10× smaller, less with gzip:
+
+  - one document : per-page JSON, or plain text (pages separated by \\f,
+                   like pdftotext) with Accept: text/plain / ?format=txt
+  - bulk         : NDJSON stream, one JSON line per document
+"""
+
+import json
+
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import BaseRenderer
+
+from courses.document_chat import ensure_document_text_cache
+from courses.pdf_text import PDFTextExtractionError
+from courses.utils import encrypt_id
+
+PAGE_SEPARATOR = "\f"
+
+
+class PlainTextRenderer(BaseRenderer):
+    media_type = "text/plain"
+    format = "txt"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            data = str(data.get("detail", data))
+        return data.encode(self.charset)
+
+
+class NDJSONRenderer(BaseRenderer):
+    """Errors of the bulk endpoint, as a single NDJSON line."""
+
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return (json.dumps(data, ensure_ascii=False) + "\n").encode(self.charset)
+
+
+def document_pages(document) -> list[str]:
+    """Extracted text of *document*, one string per page. Raises PDFTextExtractionError."""
+    return ensure_document_text_cache(document).pages or []
+
+
+def text_payload(document, pages: list[str]) -> dict:
+    return {
+        "id": encrypt_id(document.id),
+        "title": document.title,
+        "course": document.course.name if document.course_id else None,
+        "page_count": len(pages),
+        "pages": [{"page": number, "text": text} for number, text in enumerate(pages, start=1)],
+    }
+
+
+def plain_text(pages: list[str]) -> str:
+    return PAGE_SEPARATOR.join(pages)
+
+
+def _lines(documents, undelivered):
+    delivered = 0
+    try:
+        for document in documents:
+            try:
+                line = text_payload(document, document_pages(document))
+            except PDFTextExtractionError:
+                yield json.dumps({"id": encrypt_id(document.id), "error": "Texte indisponible."}, ensure_ascii=False) + "\n"
+                continue
+            yield json.dumps(line, ensure_ascii=False) + "\n"
+            delivered += 1
+    finally:
+        # Error lines and texts not sent (client gone) are not charged
+        if undelivered is not None and delivered < len(documents):
+            undelivered(len(documents) - delivered)
+
+
+def ndjson_response(documents, undelivered=None) -> StreamingHttpResponse:
+    """
+    Streaming NDJSON response with the text of *documents* (extracted on the
+    fly when not cached). *undelivered(n)* is called at the end of the stream
+    with the number of documents whose text was not sent.
+    """
+    documents = list(documents)
+    return StreamingHttpResponse(_lines(documents, undelivered), content_type="application/x-ndjson; charset=utf-8")
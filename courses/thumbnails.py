@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+Page images — first-page thumbnails and on-demand page previews (WebP).
+Developed by Marino ATOHOUN.
+
+Pages are rendered with `pdftoppm` (poppler, like pdftotext) and converted
+to WebP with Pillow, then kept under MEDIA_ROOT/thumbnails/<content key>/.
+The key is the PDF's SHA-256 (content-addressed storage), so a rendered
+file never changes and can be cached forever by clients and proxies.
+
+First-page thumbnails (THUMBNAIL_WIDTHS) are rendered in the background
+after an upload is committed; any other page / width is rendered on first
+request by the /documents/<id>/pages/<n>.webp endpoint. Pages past the end
+of the document (page count of the extracted text, or a page pdftoppm
+reported missing) are refused without running pdftoppm, and one image is
+rendered by one thread at a time.
+"""
+
+import io
+import logging
+import os
+import shutil
+import subprocess
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from courses.storage import pdf_storage
+
+try:
+    from PIL import Image
+except ImportError:  # optional: page images disabled without Pillow
+    Image = None
+
+logger = logging.getLogger("courses.thumbnails")
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Configuration
+# ──────────────────────────────────────────────────────────────────────────────
+
+THUMBNAILS_DIR = "thumbnails"
+DEFAULT_THUMBNAIL_WIDTHS = (160, 320, 640)
+DEFAULT_PAGE_WIDTH = 1024
+RENDER_TIMEOUT = 30
+WEBP_QUALITY = 80
+PAGE_COUNT_CACHE_PREFIX = "edushare:page-count:"
+PAGE_COUNT_TIMEOUT = 24 * 3600
+
+# Striped render locks: the same image is never rendered twice at once (in this process)
+_render_locks = [threading.Lock() for _ in range(64)]
+
+
+class ThumbnailError(RuntimeError):
+    pass
+
+
+class PageNotFound(ThumbnailError):
+    pass
+
+
+def thumbnail_widths() -> tuple[int, ...]:
+    return tuple(getattr(settings, "THUMBNAIL_WIDTHS", DEFAULT_THUMBNAIL_WIDTHS))
+
+
+def page_width() -> int:
+    return int(getattr(settings, "PAGE_IMAGE_WIDTH", DEFAULT_PAGE_WIDTH))
+
+
+def allowed_widths() -> set[int]:
+    # A fixed set: arbitrary widths would let clients fill the disk
+    return set(thumbnail_widths()) | {page_width()}
+
+
+def is_available() -> bool:
+    return Image is not None
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Rendering
+# ──────────────────────────────────────────────────────────────────────────────
+
+def content_key(document) -> str:
+    """Immutable cache key of the document's file (its digest; legacy files: id + size)."""
+    return document.blob_id or f"doc-{document.pk}-{document.file_size}"
+
+
+def image_name(document, page: int, width: int) -> str:
+    return f"{THUMBNAILS_DIR}/{content_key(document)}/p{page}-w{width}.webp"
+
+
+def render_page(pdf_path: str, page: int, width: int) -> bytes:
+    """WebP image of *page* (1-based) of a PDF, *width* pixels wide."""
+    if Image is None:
+        raise ThumbnailError("Pillow n'est pas installé")
+    try:
+        result = subprocess.run(
+            ["pdftoppm", "-f", str(page), "-l", str(page), "-singlefile", "-png", "-scale-to-x", str(width),
+             "-scale-to-y", "-1", pdf_path],
+            check=False,
+            capture_output=True,
+            timeout=RENDER_TIMEOUT,
+        )
+    except Exception as exc:
+        raise ThumbnailError(str(exc)) from exc
+    if result.returncode != 0 or not result.stdout:
+        stderr = result.stderr.decode("utf-8", "replace").strip()
+        if "Wrong page range" in stderr or (result.returncode == 99 and not result.stdout):
+            raise PageNotFound(f"Page {page} inexistante")
+        raise ThumbnailError(stderr or "pdftoppm failed")
+
+    output = io.BytesIO()
+    with Image.open(io.BytesIO(result.stdout)) as image:
+        image.save(output, "WEBP", quality=WEBP_QUALITY, method=4)
+    return output.getvalue()
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial = f"{path}.{uuid.uuid4().hex}.part"
+    with open(partial, "wb") as f:
+        f.write(data)
+    os.replace(partial, path)
+
+
+def page_count(document) -> int | None:
+    """
+    Known upper bound of the pages of *document*: its extracted text's page
+    count, lowered when pdftoppm reports a page missing (None: unknown).
+    """
+    from courses.models import PDFDocumentText
+
+    key = PAGE_COUNT_CACHE_PREFIX + content_key(document)
+    count = cache.get(key)
+    if count is None:
+        pages = PDFDocumentText.objects.filter(document=document).values_list("pages", flat=True).first()
+        if not pages:
+            return None
+        count = len(pages)
+        cache.set(key, count, PAGE_COUNT_TIMEOUT)
+    return count
+
+
+def _remember_missing(document, page: int) -> None:
+    count = page_count(document)
+    if count is None or count >= page:
+        cache.set(PAGE_COUNT_CACHE_PREFIX + content_key(document), page - 1, PAGE_COUNT_TIMEOUT)
+
+
+def page_image(document, page: int, width: int) -> str:
+    """Storage name of the page image, rendered and cached on first use."""
+    name = image_name(document, page, width)
+    storage = document.pdf_file.storage
+    if storage.exists(name):
+        return name
+    count = page_count(document)
+    if count is not None and page > count:
+        raise PageNotFound(f"Page {page} inexistante")
+    with _render_locks[hash(name) % len(_render_locks)]:
+        # Rendered by another request while we waited
+        if not storage.exists(name):
+            try:
+                data = render_page(document.pdf_file.path, page, width)
+            except PageNotFound:
+                _remember_missing(document, page)
+                raise
+            _write_atomic(storage.path(name), data)
+    return name
+
+
+def generate_thumbnails(document) -> None:
+    """Render the first-page thumbnails of *document* (every THUMBNAIL_WIDTHS)."""
+    for width in thumbnail_widths():
+        try:
+            page_image(document, 1, width)
+        except ThumbnailError as exc:
+            logger.warning("Thumbnail %s w=%s failed: %s", document.pk, width, exc)
+            return
+
+
+def delete_images(key: str) -> None:
+    """Remove every cached image of a content key (its PDF is gone)."""
+    shutil.rmtree(pdf_storage().path(f"{THUMBNAILS_DIR}/{key}"), ignore_errors=True)
+
+
+def schedule_thumbnails(document) -> None:
+    """After commit, render the thumbnails of a new upload (in a thread unless THUMBNAILS_ASYNC is off)."""
+    if Image is None:
+        return
+
+    def run():
+        if getattr(settings, "THUMBNAILS_ASYNC", True):
+            threading.Thread(target=generate_thumbnails, args=(document,), daemon=True).start()
+        else:
+            generate_thumbnails(document)
+
+    transaction.on_commit(run)
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""
+Upload handlers that hash files while they stream in.
+Developed by Marino ATOHOUN.
+
+Drop-in replacements for Django's memory / temporary-file handlers: each
+chunk also feeds a SHA-256, exposed as `uploaded_file.sha256`, so
+content-addressed storage (courses.storage) needs no second read pass.
+"""
+
+import hashlib
+
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+
+
+class _HashingMixin:
+    def new_file(self, *args, **kwargs):
+        self._sha256 = hashlib.sha256()
+        return super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        self._sha256.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        uploaded = super().file_complete(file_size)
+        if uploaded is not None:
+            uploaded.sha256 = self._sha256.hexdigest()
+        return uploaded
+
+
+class HashingMemoryFileUploadHandler(_HashingMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(_HashingMixin, TemporaryFileUploadHandler):
+    pass
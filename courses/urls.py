@@ -9,9 +9,7 @@ from rest_framework_simplejwt.views import TokenRefreshView
 from .email_auth import EmailTokenObtainPairView
 from . import views
 from . import api_views
-from .chat_views import DocumentChatView
-from django.conf import settings
-from django.conf.urls.static import static
+from .chat_views import DocumentChatBatchView, DocumentChatView
 
 app_name = 'courses'
 
@@ -31,10 +29,14 @@ urlpatterns = [
     
     # PDF Documents
     path('documents/', views.PDFDocumentListCreateView.as_view(), name='document_list_create'),
+    path('documents/facets/', views.document_facets, name='document_facets'),
+    path('documents/trending/', views.trending_documents, name='document_trending'),
     path('documents/<str:pk>/', views.PDFDocumentDetailView.as_view(), name='document_detail'),
     path('documents/<str:document_id>/download/', views.download_pdf, name='download_pdf'),
     path('documents/<str:document_id>/preview/', views.preview_pdf, name='preview_pdf'),
+    path('documents/<str:document_id>/pages/<int:page>.webp', views.document_page, name='document_page'),
     path('documents/<str:document_id>/chat/', DocumentChatView.as_view(), name='document_chat'),
+    path('documents/<str:document_id>/chat/batch/', DocumentChatBatchView.as_view(), name='document_chat_batch'),
     
     # Statistics
     path('stats/', views.stats, name='stats'),
@@ -57,11 +59,9 @@ urlpatterns = [
 
     # Data API (API key auth)
     path('data/documents/', api_views.DataDocumentListView.as_view(), name='data_document_list'),
+    path('data/documents/bundle/', api_views.DataDocumentBundleView.as_view(), name='data_document_bundle'),
+    path('data/documents/text/', api_views.DataDocumentTextBulkView.as_view(), name='data_document_text_bulk'),
     path('data/documents/<str:document_id>/download/', api_views.DataDocumentDownloadView.as_view(), name='data_document_download'),
+    path('data/documents/<str:document_id>/text/', api_views.DataDocumentTextView.as_view(), name='data_document_text'),
     path('data/whoami/', api_views.DataWhoAmIView.as_view(), name='data_whoami'),
 ]
-
-urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
-
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -1,102 +1,298 @@
+# -*- coding: utf-8 -*-
+"""
+User activity tracking — IP, device and location of authenticated users.
+Developed by Marino ATOHOUN.
+
+record_user_activity() only reads the client IP and User-Agent and queues
+them: parsing the User-Agent, the geolocation lookup and the UserActivity
+insert run in a background worker thread, so request latency never depends
+on the geolocation service. The queue is bounded (USER_ACTIVITY_QUEUE_SIZE,
+entries dropped when full) and drained at exit without geolocation.
+USER_ACTIVITY_ASYNC = False records inline.
+
+Geolocation reads a local MaxMind database (GEOIP_DATABASE, a GeoLite2 /
+GeoIP2 City .mmdb memory-mapped by `maxminddb`): no network, microseconds
+per lookup. The online geocoder (ip-api.com) is only a fallback for IPs
+missing from it, or when no database is installed
+(GEOIP_NETWORK_FALLBACK). Results are kept in an LRU cache
+(GEOIP_CACHE_SIZE) shared by all lookups of the process.
+"""
+
+import atexit
+import functools
+import ipaddress
+import logging
+import os
+import queue
+import threading
+
 import geocoder
+from django.conf import settings
+from django.db import connections, transaction
 from ipware import get_client_ip
 from user_agents import parse
+
 from .models import UserActivity
-import logging
-import ipaddress
+
+try:
+    import maxminddb
+except ImportError:  # optional: offline lookups disabled, network fallback only
+    maxminddb = None
 
 logger = logging.getLogger("courses.tracking")
 
-def get_user_activity_info(request):
-    """Extract IP, device and location info from request"""
-    # Get IP
-    ip, is_routable = get_client_ip(request)
-    if ip is None:
-        ip = '0.0.0.0'
-    
-    # Get User Agent info
-    ua_string = request.META.get('HTTP_USER_AGENT', '')
-    user_agent = parse(ua_string)
-    
-    device_type = "Mobile" if user_agent.is_mobile else "Tablet" if user_agent.is_tablet else "PC" if user_agent.is_pc else "Bot" if user_agent.is_bot else "Unknown"
-    os_info = f"{user_agent.os.family} {user_agent.os.version_string}"
-    browser_info = f"{user_agent.browser.family} {user_agent.browser.version_string}"
-    
-    # Get Location info
-    city = ""
-    country = ""
-    latitude = None
-    longitude = None
-    
+# ──────────────────────────────────────────────────────────────────────────────
+# Configuration
+# ──────────────────────────────────────────────────────────────────────────────
+
+DEFAULT_QUEUE_SIZE = 1000
+RECENT_USERS_MAX = 10000
+DEFAULT_GEOIP_CACHE_SIZE = 4096
+
+_queue: queue.Queue | None = None
+_worker: threading.Thread | None = None
+_worker_lock = threading.Lock()
+# user id → (ip, user agent) last recorded by the worker: unchanged clients skip the lookup
+_recent: dict[int, tuple[str, str]] = {}
+
+_geoip_lock = threading.Lock()
+_geoip_reader = None          # maxminddb.Reader, False when unavailable
+_cached_lookup = None         # LRU-cached _lookup, sized from GEOIP_CACHE_SIZE
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Activity info
+# ──────────────────────────────────────────────────────────────────────────────
+
+def client_info(request) -> tuple[str, str]:
+    """(IP address, User-Agent) of *request* — the only part done on the request path."""
+    ip, _is_routable = get_client_ip(request)
+    return ip or '0.0.0.0', request.META.get('HTTP_USER_AGENT', '')
+
+
+def is_public_ip(ip: str) -> bool:
     try:
-        # Skip geo lookup for local/private IPs (reduces latency + avoids noisy errors)
-        try:
-            ip_obj = ipaddress.ip_address(ip)
-            if ip_obj.is_private or ip_obj.is_loopback or ip_obj.is_link_local or ip_obj.is_reserved:
-                return {
-                    'ip_address': ip,
-                    'user_agent': ua_string,
-                    'device_type': device_type,
-                    'os': os_info,
-                    'browser': browser_info,
-                    'city': city,
-                    'country': country,
-                    'latitude': latitude,
-                    'longitude': longitude
-                }
-        except ValueError:
-            pass
+        ip_obj = ipaddress.ip_address(ip)
+    except ValueError:
+        return False
+    return not (ip_obj.is_private or ip_obj.is_loopback or ip_obj.is_link_local or ip_obj.is_reserved)
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Geolocation
+# ──────────────────────────────────────────────────────────────────────────────
+
+_NO_LOCATION = ("", "", None, None)
+
+
+def _reader():
+    global _geoip_reader
+    if _geoip_reader is None:
+        with _geoip_lock:
+            if _geoip_reader is None:
+                _geoip_reader = _open_reader()
+    return _geoip_reader
+
+
+def _open_reader():
+    path = getattr(settings, "GEOIP_DATABASE", "")
+    if not path or not os.path.exists(path):
+        return False
+    if maxminddb is None:
+        logger.warning("GEOIP_DATABASE is set but maxminddb is not installed")
+        return False
+    try:
+        return maxminddb.open_database(path, maxminddb.MODE_MMAP)
+    except (OSError, ValueError) as e:
+        logger.warning("Cannot open GeoIP database %s: %s", path, e)
+        return False
+
 
+def _from_database(ip: str) -> tuple | None:
+    reader = _reader()
+    if not reader:
+        return None
+    record = reader.get(ip)
+    if not record:
+        return None
+    location = record.get('location') or {}
+    return (
+        (record.get('city') or {}).get('names', {}).get('en', ""),
+        (record.get('country') or {}).get('iso_code', ""),
+        location.get('latitude'),
+        location.get('longitude'),
+    )
+
+
+class _LookupFailed(Exception):
+    """Network lookup failed (error, rate limit): the result is not cached."""
+
+
+def _from_network(ip: str) -> tuple:
+    try:
         # Use free ip-api.com via geocoder
         g = geocoder.ip(ip)
-        if g.ok:
-            city = g.city or ""
-            country = g.country or ""
-            if g.latlng:
-                latitude = g.latlng[0]
-                longitude = g.latlng[1]
     except Exception as e:
-        logger.warning("Error getting location for ip=%s: %s", ip, e)
-        
-    return {
+        raise _LookupFailed(e) from e
+    if not g.ok:
+        raise _LookupFailed(getattr(g, "status", "lookup failed"))
+    latlng = g.latlng or (None, None)
+    return g.city or "", g.country or "", latlng[0], latlng[1]
+
+
+def _lookup(ip: str) -> tuple:
+    found = _from_database(ip)
+    if found is not None:
+        return found
+    if getattr(settings, "GEOIP_NETWORK_FALLBACK", True):
+        return _from_network(ip)
+    return _NO_LOCATION
+
+
+def reset_geoip() -> None:
+    """Close the GeoIP database and empty the cache (database updated, settings changed)."""
+    global _geoip_reader, _cached_lookup
+    with _geoip_lock:
+        if _geoip_reader:
+            _geoip_reader.close()
+        _geoip_reader = None
+        _cached_lookup = None
+
+
+def locate_ip(ip: str) -> dict:
+    """City, country and coordinates of a public IP (empty for local/private ones or when unknown)."""
+    global _cached_lookup
+    # Skip geo lookup for local/private IPs (reduces latency + avoids noisy errors)
+    if not is_public_ip(ip):
+        city, country, latitude, longitude = _NO_LOCATION
+    else:
+        if _cached_lookup is None:
+            size = int(getattr(settings, "GEOIP_CACHE_SIZE", DEFAULT_GEOIP_CACHE_SIZE))
+            _cached_lookup = functools.lru_cache(maxsize=size)(_lookup)
+        try:
+            city, country, latitude, longitude = _cached_lookup(ip)
+        except _LookupFailed as e:
+            logger.warning("Error getting location for ip=%s: %s", ip, e)
+            city, country, latitude, longitude = _NO_LOCATION
+    return {'city': city, 'country': country, 'latitude': latitude, 'longitude': longitude}
+
+
+def describe_client(ip: str, ua_string: str, geolocate: bool = True) -> dict:
+    """UserActivity fields for an IP and a User-Agent string"""
+    user_agent = parse(ua_string)
+    device_type = "Mobile" if user_agent.is_mobile else "Tablet" if user_agent.is_tablet else "PC" if user_agent.is_pc else "Bot" if user_agent.is_bot else "Unknown"
+    info = {
         'ip_address': ip,
         'user_agent': ua_string,
         'device_type': device_type,
-        'os': os_info,
-        'browser': browser_info,
-        'city': city,
-        'country': country,
-        'latitude': latitude,
-        'longitude': longitude
+        'os': f"{user_agent.os.family} {user_agent.os.version_string}",
+        'browser': f"{user_agent.browser.family} {user_agent.browser.version_string}",
     }
+    if geolocate:
+        info.update(locate_ip(ip))
+    return info
+
+
+def get_user_activity_info(request):
+    """Extract IP, device and location info from request (synchronous, geolocation included)"""
+    return describe_client(*client_info(request))
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Persistence
+# ──────────────────────────────────────────────────────────────────────────────
+
+def save_user_activity(user_id: int, ip: str, ua_string: str, geolocate: bool = True) -> bool:
+    """Record an activity if IP or User-Agent changed since the last one; True when a row was added."""
+    if _recent.get(user_id) == (ip, ua_string):
+        return False
+
+    last_activity = UserActivity.objects.filter(user_id=user_id).first()
+    if last_activity and (last_activity.ip_address, last_activity.user_agent) == (ip, ua_string):
+        _remember(user_id, ip, ua_string)
+        return False
+
+    UserActivity.objects.create(user_id=user_id, **describe_client(ip, ua_string, geolocate))
+    _remember(user_id, ip, ua_string)
+    return True
+
+
+def _remember(user_id: int, ip: str, ua_string: str) -> None:
+    if len(_recent) >= RECENT_USERS_MAX:
+        _recent.clear()
+    _recent[user_id] = (ip, ua_string)
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Background worker
+# ──────────────────────────────────────────────────────────────────────────────
+
+def _get_queue() -> queue.Queue:
+    global _queue, _worker
+    with _worker_lock:
+        if _queue is None:
+            _queue = queue.Queue(maxsize=int(getattr(settings, "USER_ACTIVITY_QUEUE_SIZE", DEFAULT_QUEUE_SIZE)))
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_run, name="user-activity", daemon=True)
+            _worker.start()
+        return _queue
+
+
+def _run() -> None:
+    while True:
+        user_id, ip, ua_string = _queue.get()
+        try:
+            save_user_activity(user_id, ip, ua_string)
+        except Exception:
+            logger.exception("Error recording user activity")
+        finally:
+            _queue.task_done()
+            if _queue.empty():
+                # Idle: don't keep the worker's DB connection open
+                connections.close_all()
+
+
+def _enqueue(item: tuple[int, str, str]) -> None:
+    try:
+        _get_queue().put_nowait(item)
+    except queue.Full:
+        logger.warning("User activity queue full, activity of user %s dropped", item[0])
+
 
 def record_user_activity(user, request):
-    """Record user activity if it has changed since last time"""
+    """Queue the activity of *user* for recording (fire-and-forget, after the current transaction)"""
     if not user.is_authenticated:
         return
-        
-    try:
-        info = get_user_activity_info(request)
-    except Exception:
-        logger.exception("Error building user activity info")
+
+    ip, ua_string = client_info(request)
+    if not getattr(settings, "USER_ACTIVITY_ASYNC", True):
+        save_user_activity(user.pk, ip, ua_string)
         return
-    
-    # Get last activity
-    last_activity = UserActivity.objects.filter(user=user).first()
-    
-    should_record = False
-    if not last_activity:
-        should_record = True
-    else:
-        # Check if anything changed
-        if (last_activity.ip_address != info['ip_address'] or 
-            last_activity.user_agent != info['user_agent'] or
-            last_activity.city != info['city'] or
-            last_activity.country != info['country']):
-            should_record = True
-            
-    if should_record:
-        UserActivity.objects.create(
-            user=user,
-            **info
-        )
+    if _recent.get(user.pk) == (ip, ua_string):
+        return
+    # A user created in this transaction is only visible to the worker after commit
+    transaction.on_commit(lambda: _enqueue((user.pk, ip, ua_string)))
+
+
+def wait_for_pending() -> None:
+    """Block until every queued activity is recorded (tests, management commands)."""
+    if _queue is not None:
+        _queue.join()
+
+
+def _drain() -> None:
+    # At exit: record what is left without the (slow) geolocation lookup
+    if _queue is None:
+        return
+    while True:
+        try:
+            user_id, ip, ua_string = _queue.get_nowait()
+        except queue.Empty:
+            return
+        try:
+            save_user_activity(user_id, ip, ua_string, geolocate=False)
+        except Exception:
+            logger.exception("Error recording user activity at exit")
+
+
+atexit.register(_drain)
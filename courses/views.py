@@ -4,19 +4,30 @@ Views for PDF Course Sharing Platform
 Developed by Marino ATOHOUN
 """
 
+import logging
+from urllib.parse import quote
+
 from rest_framework import generics, status, permissions
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework_simplejwt.views import TokenObtainPairView
 from django.contrib.auth.models import User
-from django.http import HttpResponse, Http404, FileResponse
+from django.http import FileResponse, Http404, HttpResponseNotModified
 from django.shortcuts import get_object_or_404
-from django.db.models import Q
+from django.db.models import Count, Prefetch, Q
+from django.utils.http import parse_etags
 from django.views.decorators.clickjacking import xframe_options_exempt
-import os
 
-from .models import Course, PDFDocument, StudyLevel, UserProfile, Newsletter, Advertisement, AdInteraction
+from . import document_events, facets
+from . import signed_media as signed_media_urls
+from . import thumbnails as page_images
+from .file_delivery import counts_as_download, serve_pdf
+from .models import Course, DocumentEvent, PDFDocument, StudyLevel, UserProfile, Newsletter, Advertisement, AdInteraction
+from .pagination import KeysetPagination
+from .platform_stats import get_stats
+from .response_cache import cached_response
+from .search_index import ordering, search_documents
 from .serializers import (
     UserSerializer, UserRegistrationSerializer, UserProfileSerializer,
     CourseSerializer, PDFDocumentSerializer, PDFDocumentListSerializer,
@@ -25,6 +36,8 @@ from .serializers import (
 )
 from .utils import decrypt_id
 
+logger = logging.getLogger("courses.views")
+
 
 class UserRegistrationView(generics.CreateAPIView):
     """View for user registration"""
@@ -43,25 +56,112 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
         return profile
 
 
+def courses_with_documents_count():
+    """Courses annotated with their active documents count (read by CourseSerializer)."""
+    return Course.objects.annotate(
+        active_documents_count=Count("documents", filter=Q(documents__is_active=True))
+    )
+
+
+def documents_for_serializer():
+    """Active documents with every relation the document serializers read."""
+    return (
+        PDFDocument.objects.filter(is_active=True)
+        .select_related("uploaded_by", "study_sublevel", "study_sublevel__level")
+        .prefetch_related("tags", Prefetch("course", queryset=courses_with_documents_count()))
+    )
+
+
 class CourseListCreateView(generics.ListCreateAPIView):
     """View for listing and creating courses"""
-    queryset = Course.objects.all()
+    queryset = courses_with_documents_count()
     serializer_class = CourseSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
+    @cached_response("courses")
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
 
 class CourseDetailView(generics.RetrieveUpdateDestroyAPIView):
     """View for course details"""
-    queryset = Course.objects.all()
+    queryset = courses_with_documents_count()
     serializer_class = CourseSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
 
+def filter_documents(queryset, params, skip=None):
+    """
+    Apply the document list filters of *params* to *queryset*.
+
+    *skip* leaves out one facet dimension ('course', 'study_level',
+    'study_sublevel' or 'tag') — used by the facet counts.
+    """
+    # Filter by course / domain
+    if skip != 'course':
+        course_id = params.get('course', None)
+        if course_id:
+            queryset = queryset.filter(course_id=course_id)
+
+        domain = params.get('domain', None)
+        if domain:
+            queryset = queryset.filter(course__domain__icontains=domain)
+
+    # Full-text search (title, description, tags, course), ranked by relevance
+    search = params.get('search', None)
+    if search:
+        queryset = search_documents(
+            queryset, search, ['title', 'description', 'tags__name', 'course__name']
+        )
+
+    # Filter by study level/sublevel
+    study_level = params.get('study_level', None)
+    if study_level and skip != 'study_level':
+        if str(study_level).isdigit():
+            queryset = queryset.filter(study_sublevel__level_id=int(study_level))
+        else:
+            queryset = queryset.filter(
+                Q(study_sublevel__level__key=study_level) | Q(study_sublevel__level__name=study_level)
+            )
+
+    study_sublevel = params.get('study_sublevel', None)
+    if study_sublevel and skip != 'study_sublevel':
+        if str(study_sublevel).isdigit():
+            queryset = queryset.filter(study_sublevel_id=int(study_sublevel))
+        else:
+            queryset = queryset.filter(
+                Q(study_sublevel__key=study_sublevel) | Q(study_sublevel__name=study_sublevel)
+            )
+
+    tag = params.get('tag', None)
+    if tag and skip != 'tag':
+        queryset = queryset.filter(
+            id__in=PDFDocument.tags.through.objects.filter(
+                Q(tag__key=tag) | Q(tag__name__iexact=tag)
+            ).values('pdfdocument_id')
+        )
+
+    return queryset
+
+
+# ?sort= of the document list; each ordering ends with a unique key (keyset pages)
+CATALOGUE_SORTS = {
+    'recent': ('-created_at', '-id'),
+    'popular': ('-download_count', '-id'),
+    'title': ('title', 'id'),
+}
+
+
 class PDFDocumentListCreateView(generics.ListCreateAPIView):
     """View for listing and creating PDF documents"""
     serializer_class = PDFDocumentSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     parser_classes = [MultiPartParser, FormParser]
+    pagination_class = KeysetPagination
+
+    @cached_response("documents", anonymous_only=True)
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
 
     def get_queryset(self):
         queryset = (
@@ -69,50 +169,10 @@ class PDFDocumentListCreateView(generics.ListCreateAPIView):
             .select_related("course", "uploaded_by", "study_sublevel", "study_sublevel__level")
             .prefetch_related("tags")
         )
-        
-        # Filter by course
-        course_id = self.request.query_params.get('course', None)
-        if course_id:
-            queryset = queryset.filter(course_id=course_id)
-        
-        # Filter by domain
-        domain = self.request.query_params.get('domain', None)
-        if domain:
-            queryset = queryset.filter(course__domain__icontains=domain)
-        
-        # Search in title and description
-        search = self.request.query_params.get('search', None)
-        if search:
-            queryset = queryset.filter(
-                Q(title__icontains=search)
-                | Q(description__icontains=search)
-                | Q(tags__name__icontains=search)
-            )
-
-        # Filter by study level/sublevel
-        study_level = self.request.query_params.get('study_level', None)
-        if study_level:
-            if str(study_level).isdigit():
-                queryset = queryset.filter(study_sublevel__level_id=int(study_level))
-            else:
-                queryset = queryset.filter(
-                    Q(study_sublevel__level__key=study_level) | Q(study_sublevel__level__name=study_level)
-                )
-
-        study_sublevel = self.request.query_params.get('study_sublevel', None)
-        if study_sublevel:
-            if str(study_sublevel).isdigit():
-                queryset = queryset.filter(study_sublevel_id=int(study_sublevel))
-            else:
-                queryset = queryset.filter(
-                    Q(study_sublevel__key=study_sublevel) | Q(study_sublevel__name=study_sublevel)
-                )
-
-        tag = self.request.query_params.get('tag', None)
-        if tag:
-            queryset = queryset.filter(Q(tags__key=tag) | Q(tags__name__iexact=tag))
-        
-        return queryset.distinct().order_by('-created_at')
+        queryset = filter_documents(queryset, self.request.query_params)
+        # Explicit sort (catalogue menu), else relevance for searches, newest first
+        sort = CATALOGUE_SORTS.get(self.request.query_params.get('sort', ''))
+        return queryset.order_by(*(sort or ordering(queryset)))
 
     def get_serializer_class(self):
         if self.request.method == 'GET':
@@ -120,23 +180,59 @@ class PDFDocumentListCreateView(generics.ListCreateAPIView):
         return PDFDocumentSerializer
 
 
+@api_view(['GET'])
+@permission_classes([permissions.AllowAny])
+def document_facets(request):
+    """Document counts per course, study level, sub-level and tag for the current filters"""
+    params = request.query_params
+
+    def queryset_for(dimension):
+        # Each menu is counted without its own filter so its other options stay visible
+        return filter_documents(PDFDocument.objects.filter(is_active=True), params, skip=dimension)
+
+    return Response(facets.document_facets(params, queryset_for))
+
+
+@api_view(['GET'])
+@permission_classes([permissions.AllowAny])
+@cached_response("documents", "trending", anonymous_only=True)
+def trending_documents(request):
+    """Trending documents (precomputed time-decayed downloads/previews), optionally for one course"""
+    course = request.query_params.get('course')
+    if course is not None and not course.isdigit():
+        return Response({'detail': 'course doit être un identifiant numérique.'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        limit = max(1, min(int(request.query_params.get('limit', 20)), 100))
+    except ValueError:
+        limit = 20
+
+    documents = list(
+        document_events.trending_documents(documents_for_serializer(), int(course) if course else None)[:limit]
+    )
+    results = PDFDocumentListSerializer(documents, many=True).data
+    for item, document in zip(results, documents):
+        item['trending_score'] = round(document.trending_score, 4)
+    return Response({'results': results})
+
+
 class PDFDocumentDetailView(generics.RetrieveUpdateDestroyAPIView):
     """View for PDF document details"""
-    queryset = PDFDocument.objects.filter(is_active=True).select_related(
-        "course", "uploaded_by", "study_sublevel", "study_sublevel__level"
-    ).prefetch_related("tags")
     serializer_class = PDFDocumentSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
+    def get_queryset(self):
+        return documents_for_serializer()
+
     def get_object(self):
         pk = self.kwargs.get('pk')
         # Try to decrypt if it's not a digit
         if not str(pk).isdigit():
             decoded_id = decrypt_id(pk)
-            if decoded_id:
-                pk = decoded_id
+            if not decoded_id:
+                raise Http404("Document non trouvé")
+            pk = decoded_id
         
-        return get_object_or_404(PDFDocument, id=pk, is_active=True)
+        return get_object_or_404(self.get_queryset(), id=pk)
 
     def get_permissions(self):
         """Only the uploader can update/delete their documents"""
@@ -155,10 +251,11 @@ class PDFDocumentDetailView(generics.RetrieveUpdateDestroyAPIView):
         if instance.uploaded_by != self.request.user:
             raise permissions.PermissionDenied("Vous ne pouvez supprimer que vos propres documents.")
         instance.is_active = False
-        instance.save()
+        # Not a full save: would overwrite download_count with this instance's copy
+        instance.save(update_fields=['is_active', 'updated_at'])
 
 
-@api_view(['GET'])
+@api_view(['GET', 'HEAD'])
 @permission_classes([permissions.AllowAny])
 def download_pdf(request, document_id):
     """Download PDF file"""
@@ -173,17 +270,14 @@ def download_pdf(request, document_id):
                 
         document = get_object_or_404(PDFDocument, id=document_id, is_active=True)
         
-        # Increment download count
-        document.increment_download_count()
+        response = serve_pdf(request, document, as_attachment=True)
         
-        # Serve the file
-        if os.path.exists(document.pdf_file.path):
-            with open(document.pdf_file.path, 'rb') as pdf_file:
-                response = HttpResponse(pdf_file.read(), content_type='application/pdf')
-                response['Content-Disposition'] = f'attachment; filename="{document.title}.pdf"'
-                return response
-        else:
-            raise Http404("Fichier non trouvé")
+        # Increment download count (not for HEAD, 304s, nor resumed/partial transfers)
+        if counts_as_download(request, response):
+            document.increment_download_count()
+            document_events.record(document.id, DocumentEvent.DOWNLOAD)
+        
+        return response
     except PDFDocument.DoesNotExist:
         raise Http404("Document non trouvé")
 
@@ -205,24 +299,99 @@ def preview_pdf(request, document_id):
         document = get_object_or_404(PDFDocument, id=document_id, is_active=True)
         
         # Serve the file for preview
-        if os.path.exists(document.pdf_file.path):
-            response = FileResponse(open(document.pdf_file.path, 'rb'), content_type='application/pdf')
-            response['Content-Disposition'] = f'inline; filename="{document.title}.pdf"'
-            return response
-        else:
-            raise Http404("Fichier non trouvé")
+        response = serve_pdf(request, document, as_attachment=False)
+        if counts_as_download(request, response):
+            document_events.record(document.id, DocumentEvent.PREVIEW)
+        return response
     except PDFDocument.DoesNotExist:
         raise Http404("Document non trouvé")
 
 
+@api_view(['GET'])
+@permission_classes([permissions.AllowAny])
+def document_page(request, document_id, page):
+    """WebP image of one page (?w= one of the allowed widths), rendered once then cached"""
+    if not str(document_id).isdigit():
+        document_id = decrypt_id(document_id)
+        if not document_id:
+            raise Http404("Document non trouvé")
+    document = get_object_or_404(PDFDocument, id=document_id, is_active=True)
+
+    try:
+        width = int(request.query_params.get('w') or page_images.page_width())
+    except ValueError:
+        width = 0
+    if width not in page_images.allowed_widths():
+        allowed = ', '.join(map(str, sorted(page_images.allowed_widths())))
+        return Response({'detail': f'w doit valoir {allowed}.'}, status=status.HTTP_400_BAD_REQUEST)
+    if page < 1:
+        raise Http404("Page inexistante")
+
+    key = page_images.content_key(document)
+    etag = f'"{key[:16]}-p{page}-w{width}"'
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponseNotModified()
+    else:
+        try:
+            name = page_images.page_image(document, page, width)
+        except page_images.PageNotFound:
+            raise Http404("Page inexistante")
+        except page_images.ThumbnailError as exc:
+            logger.warning("Page image %s p%s failed: %s", document.id, page, exc)
+            return Response({'detail': "Aperçu indisponible."}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        response = FileResponse(document.pdf_file.storage.open(name, 'rb'), content_type='image/webp')
+
+    response['ETag'] = etag
+    # Versioned URL (v = content key): the image can never change
+    if request.query_params.get('v') == key[:16]:
+        response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    else:
+        response['Cache-Control'] = 'public, max-age=3600'
+    return response
+
+
+@api_view(['GET', 'HEAD'])
+@permission_classes([permissions.AllowAny])
+@xframe_options_exempt
+def signed_media(request, mode, document_id, name):
+    """Signed media URL served by Django when nginx is not in front (same checks as its secure_link)"""
+    check = signed_media_urls.verify(
+        request.path,
+        request.GET.get('expires', ''),
+        quote(request.GET.get('filename', ''), safe=''),
+        request.GET.get('md5', ''),
+    )
+    if check == signed_media_urls.EXPIRED:
+        return Response({'detail': "Lien expiré."}, status=status.HTTP_410_GONE)
+    if check != signed_media_urls.VALID:
+        return Response({'detail': "Lien invalide."}, status=status.HTTP_403_FORBIDDEN)
+
+    target = signed_media_urls.parse_path(request.path)
+    if not target:
+        raise Http404("Document non trouvé")
+    document = get_object_or_404(PDFDocument, id=target[1], is_active=True)
+    if document.pdf_file.name != name:
+        raise Http404("Fichier non trouvé")
+
+    as_attachment = signed_media_urls.MODES[mode]
+    response = serve_pdf(request, document, as_attachment=as_attachment, backend='django')
+    if counts_as_download(request, response):
+        if as_attachment:
+            document.increment_download_count()
+        document_events.record(document.id, DocumentEvent.DOWNLOAD if as_attachment else DocumentEvent.PREVIEW)
+    return response
+
+
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def user_documents(request):
     """Get documents uploaded by the current user"""
-    documents = PDFDocument.objects.filter(
-        uploaded_by=request.user,
-        is_active=True
-    ).order_by('-created_at')
+    documents = (
+        PDFDocument.objects.filter(uploaded_by=request.user, is_active=True)
+        .select_related("course", "uploaded_by", "study_sublevel", "study_sublevel__level")
+        .prefetch_related("tags")
+        .order_by('-created_at')
+    )
     
     serializer = PDFDocumentListSerializer(documents, many=True)
     return Response(serializer.data)
@@ -230,18 +399,16 @@ def user_documents(request):
 
 @api_view(['GET'])
 @permission_classes([permissions.AllowAny])
+@cached_response("stats")
 def stats(request):
     """Get platform statistics"""
-    total_documents = PDFDocument.objects.filter(is_active=True).count()
-    total_courses = Course.objects.count()
-    total_users = User.objects.count()
-    total_downloads = sum(doc.download_count for doc in PDFDocument.objects.filter(is_active=True))
+    platform = get_stats()
     
     return Response({
-        'total_documents': total_documents,
-        'total_courses': total_courses,
-        'total_users': total_users,
-        'total_downloads': total_downloads
+        'total_documents': platform.total_documents,
+        'total_courses': platform.total_courses,
+        'total_users': platform.total_users,
+        'total_downloads': platform.total_downloads
     })
 
 
@@ -276,6 +443,10 @@ class StudyLevelListView(generics.ListAPIView):
     serializer_class = StudyLevelSerializer
     permission_classes = [permissions.AllowAny]
 
+    @cached_response("study_levels")
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
     def get_queryset(self):
         return StudyLevel.objects.all().prefetch_related("sublevels")
 
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+ZIP bundles — several PDFs streamed as one ZIP archive.
+Developed by Marino ATOHOUN.
+
+The archive is produced while it is sent: zipfile writes into a sink that
+the response generator drains after every block, PDFs are stored as-is
+(ZIP_STORED, already compressed) with data descriptors, so there is no temp
+file and memory stays at one block whatever the bundle size. A
+manifest.json entry comes first.
+"""
+
+import io
+import json
+import zipfile
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.http import content_disposition_header
+from django.utils.text import slugify
+
+from courses.utils import encrypt_id
+
+DEFAULT_BLOCK_SIZE = 64 * 1024
+MANIFEST_NAME = "manifest.json"
+
+
+class _Sink(io.RawIOBase):
+    """Write-only, unseekable buffer: zipfile falls back to data descriptors."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: list[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def archive_name(document) -> str:
+    """Unique, filesystem-safe entry name of *document* in the archive."""
+    slug = slugify(document.title or "")[:80] or "document"
+    return f"{slug}-{document.id}.pdf"
+
+
+def manifest(documents, missing=()) -> dict:
+    return {
+        "generated_at": timezone.now().isoformat(),
+        "count": len(documents),
+        "documents": [
+            {
+                "id": encrypt_id(d.id),
+                "file": archive_name(d),
+                "title": d.title,
+                "course": d.course.name if d.course_id else None,
+                "size": d.file_size,
+                "created_at": d.created_at.isoformat() if d.created_at else None,
+            }
+            for d in documents
+        ],
+        "missing": [encrypt_id(d.id) for d in missing],
+    }
+
+
+def _stream(documents, missing):
+    block_size = int(getattr(settings, "FILE_DELIVERY_BLOCK_SIZE", DEFAULT_BLOCK_SIZE))
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        archive.writestr(
+            MANIFEST_NAME,
+            json.dumps(manifest(documents, missing), ensure_ascii=False, indent=2),
+            compress_type=zipfile.ZIP_DEFLATED,
+        )
+        yield sink.drain()
+        for document in documents:
+            info = zipfile.ZipInfo(archive_name(document), date_time=timezone.localtime(document.created_at).timetuple()[:6])
+            info.compress_type = zipfile.ZIP_STORED
+            with document.pdf_file.open("rb") as source, archive.open(info, "w", force_zip64=True) as entry:
+                while block := source.read(block_size):
+                    entry.write(block)
+                    yield sink.drain()
+            yield sink.drain()
+    yield sink.drain()
+
+
+def bundle_response(documents, missing=(), filename: str = "edushare-documents.zip") -> StreamingHttpResponse:
+    """Streaming ZIP response with the PDFs of *documents* (and a manifest listing *missing* ones)."""
+    response = StreamingHttpResponse(_stream(list(documents), list(missing)), content_type="application/zip")
+    response["Content-Disposition"] = content_disposition_header(True, filename)
+    return response
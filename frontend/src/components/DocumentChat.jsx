@@ -237,6 +237,7 @@ const DocumentChat = ({
   const [error, setError] = useState('');
   const [errorDebug, setErrorDebug] = useState('');
   const [lastModel, setLastModel] = useState('');
+  const [conversationId, setConversationId] = useState(null);
 
   // Scroll to bottom when messages change
   useEffect(() => {
@@ -267,6 +268,7 @@ const DocumentChat = ({
     setError('');
     setErrorDebug('');
     setLastModel('');
+    setConversationId(null);
   }, [documentId]);
 
   const send = async (text = draft) => {
@@ -283,12 +285,8 @@ const DocumentChat = ({
     inputRef.current?.focus();
 
     try {
-      const history = nextMessages
-        .filter((m) => m.role === 'user' || m.role === 'assistant')
-        .slice(-10)
-        .map((m) => ({ role: m.role, content: m.content }));
-
-      const res = await documentsAPI.chat(documentId, trimmed, history);
+      const res = await documentsAPI.chat(documentId, trimmed, conversationId);
+      if (res.conversation_id) setConversationId(res.conversation_id);
 
       setMessages((prev) => [
         ...prev,
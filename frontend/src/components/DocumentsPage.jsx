@@ -15,10 +15,14 @@ import { Search, Filter, Download, Eye, Calendar, User, FileText } from 'lucide-
 import { documentsAPI, coursesAPI } from '../lib/api';
 import AdDisplay from './AdDisplay';
 
+const PAGE_SIZE = 30;
+
 const DocumentsPage = () => {
   const [documents, setDocuments] = useState([]);
   const [courses, setCourses] = useState([]);
   const [loading, setLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [searchTerm, setSearchTerm] = useState('');
   const [selectedCourse, setSelectedCourse] = useState('');
   const [sortBy, setSortBy] = useState('recent');
@@ -52,32 +56,20 @@ const DocumentsPage = () => {
     }
   };
 
+  // Sorted server-side (keyset pages): the order holds across pages
+  const listParams = () => {
+    const params = { sort: sortBy, page_size: PAGE_SIZE };
+    if (searchTerm) params.search = searchTerm;
+    if (selectedCourse) params.course = selectedCourse;
+    return params;
+  };
+
   const loadDocuments = async () => {
     setLoading(true);
     try {
-      const params = {};
-      if (searchTerm) params.search = searchTerm;
-      if (selectedCourse) params.course = selectedCourse;
-
-      const documentsData = await documentsAPI.getAll(params);
-
-      // Sort documents
-      let sortedDocuments = [...documentsData];
-      switch (sortBy) {
-        case 'recent':
-          sortedDocuments.sort((a, b) => new Date(b.created_at) - new Date(a.created_at));
-          break;
-        case 'popular':
-          sortedDocuments.sort((a, b) => b.download_count - a.download_count);
-          break;
-        case 'title':
-          sortedDocuments.sort((a, b) => a.title.localeCompare(b.title));
-          break;
-        default:
-          break;
-      }
-
-      setDocuments(sortedDocuments);
+      const page = await documentsAPI.getPage(listParams());
+      setDocuments(page.results);
+      setNextCursor(page.cursor);
     } catch (error) {
       console.error('Error loading documents:', error);
     } finally {
@@ -85,6 +77,19 @@ const DocumentsPage = () => {
     }
   };
 
+  const loadMore = async () => {
+    setLoadingMore(true);
+    try {
+      const page = await documentsAPI.getPage(listParams(), nextCursor);
+      setDocuments((current) => [...current, ...page.results]);
+      setNextCursor(page.cursor);
+    } catch (error) {
+      console.error('Error loading documents:', error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const handleSearchChange = (e) => {
     setSearchTerm(e.target.value);
   };
@@ -259,7 +264,7 @@ const DocumentsPage = () => {
               {loading ? (
                 <Skeleton className="h-4 w-24" />
               ) : (
-                `${documents.length} document${documents.length > 1 ? 's' : ''} trouvé${documents.length > 1 ? 's' : ''}`
+                `${documents.length}${nextCursor ? '+' : ''} document${documents.length > 1 ? 's' : ''} trouvé${documents.length > 1 ? 's' : ''}`
               )}
             </div>
           </div>
@@ -289,6 +294,14 @@ const DocumentsPage = () => {
           </div>
         )}
       </div>
+
+      {!loading && nextCursor && (
+        <div className="flex justify-center">
+          <Button variant="outline" onClick={loadMore} disabled={loadingMore}>
+            {loadingMore ? 'Chargement...' : 'Charger plus de documents'}
+          </Button>
+        </div>
+      )}
     </div>
   );
 };
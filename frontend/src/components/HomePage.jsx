@@ -28,7 +28,7 @@ const HomePage = () => {
     try {
       const [statsData, documentsData, coursesData] = await Promise.all([
         statsAPI.getStats(),
-        documentsAPI.getAll({ limit: 6 }),
+        documentsAPI.getAll({ page_size: 6 }),
         coursesAPI.getAll()
       ]);
 
@@ -136,6 +136,16 @@ export const documentsAPI = {
     return unwrapList(response.data);
   },
 
+  // One keyset page: { results, cursor } — pass cursor back for the next page (null at the end)
+  getPage: async (params = {}, cursor = null) => {
+    const response = await api.get('/documents/', { params: cursor ? { ...params, cursor } : params });
+    const next = response.data?.next;
+    return {
+      results: unwrapList(response.data),
+      cursor: next ? new URL(next, window.location.origin).searchParams.get('cursor') : null,
+    };
+  },
+
   getById: async (id) => {
     const response = await api.get(`/documents/${id}/`);
     return response.data;
@@ -178,8 +188,10 @@ export const documentsAPI = {
     return unwrapList(response.data);
   },
 
-  chat: async (id, message, history = []) => {
-    const response = await api.post(`/documents/${id}/chat/`, { message, history });
+  chat: async (id, message, conversationId = null) => {
+    // History is kept server-side: send back the conversation_id of the first answer.
+    const body = conversationId ? { message, conversation_id: conversationId } : { message };
+    const response = await api.post(`/documents/${id}/chat/`, body);
     return response.data;
   },
 };